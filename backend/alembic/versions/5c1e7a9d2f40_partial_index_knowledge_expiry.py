@@ -0,0 +1,33 @@
+"""Partial index on employee_knowledge.data_expiracao for obtained links
+
+Revision ID: 5c1e7a9d2f40
+Revises: 22c8b5a6a4e3
+Create Date: 2026-10-19 09:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5c1e7a9d2f40"
+down_revision: Union[str, Sequence[str], None] = "22c8b5a6a4e3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_employee_knowledge_expiracao_obtido",
+        "employee_knowledge",
+        ["data_expiracao"],
+        postgresql_where=sa.text("status = 'OBTIDO'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_employee_knowledge_expiracao_obtido",
+        table_name="employee_knowledge",
+    )
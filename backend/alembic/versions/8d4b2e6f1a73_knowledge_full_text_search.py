@@ -0,0 +1,48 @@
+"""Full-text search column and GIN index on knowledge
+
+Revision ID: 8d4b2e6f1a73
+Revises: 5c1e7a9d2f40
+Create Date: 2026-10-19 11:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8d4b2e6f1a73"
+down_revision: Union[str, Sequence[str], None] = "5c1e7a9d2f40"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+SEARCH_VECTOR_EXPRESSION = (
+    "setweight(to_tsvector('portuguese', coalesce(nome, '')), 'A') || "
+    "setweight(to_tsvector('portuguese', coalesce(fornecedor, '') || ' ' || coalesce(codigo_certificacao, '')), 'B') || "
+    "setweight(to_tsvector('portuguese', coalesce(descricao, '')), 'C')"
+)
+
+
+def upgrade() -> None:
+    op.add_column(
+        "knowledge",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed(SEARCH_VECTOR_EXPRESSION, persisted=True),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        "ix_knowledge_search_vector",
+        "knowledge",
+        ["search_vector"],
+        postgresql_using="gin",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_knowledge_search_vector", table_name="knowledge")
+    op.drop_column("knowledge", "search_vector")
@@ -0,0 +1,31 @@
+"""Index on employee_knowledge.data_expiracao for the expiry worklist
+
+Revision ID: a3f9c1d7e254
+Revises: 8d4b2e6f1a73
+Create Date: 2026-10-19 12:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a3f9c1d7e254"
+down_revision: Union[str, Sequence[str], None] = "8d4b2e6f1a73"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_employee_knowledge_data_expiracao",
+        "employee_knowledge",
+        ["data_expiracao"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_employee_knowledge_data_expiracao",
+        table_name="employee_knowledge",
+    )
@@ -0,0 +1,24 @@
+"""Index employees.manager_id for manager scope lookups
+
+Revision ID: d2f7b9a4c618
+Revises: c4a8e1f6b205
+Create Date: 2026-10-19 16:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d2f7b9a4c618"
+down_revision: Union[str, Sequence[str], None] = "c4a8e1f6b205"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f("ix_employees_manager_id"), "employees", ["manager_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_employees_manager_id"), table_name="employees")
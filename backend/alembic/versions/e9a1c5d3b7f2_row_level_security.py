@@ -0,0 +1,117 @@
+"""Row-level security policies for manager-scoped tables
+
+Revision ID: e9a1c5d3b7f2
+Revises: d2f7b9a4c618
+Create Date: 2026-10-19 17:00:00.000000
+
+The policies only apply to the non-owner role used by app.core.row_security
+(DB_RLS_ROLE, default "gestao_rls"); the table owner keeps bypassing them.
+The role name and DB_ROW_LEVEL_SECURITY are read from the environment (or
+.env), the same source as the application settings; changing either later
+requires running this migration again (downgrade + upgrade) with the new value.
+
+With DB_ROW_LEVEL_SECURITY off the upgrade is a no-op, so the database stays as
+it was (no role, no policies, RLS disabled). With it on, RLS is enabled on the
+five tables and the owner plus DB_RLS_ROLE are the only roles that see rows;
+other logins (reporting users, read-only accounts) need their own policies.
+
+The visibility test is ``target = own id OR target = ANY (scope ids)``, with
+each setting read in a scalar sub-SELECT so Postgres evaluates it once per
+query (InitPlan) instead of once per row. Unrestricted users and
+``rls_bypass`` do not go through the policies: app.core.row_security simply
+does not switch to DB_RLS_ROLE for them.
+"""
+import os
+import re
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e9a1c5d3b7f2"
+down_revision: Union[str, Sequence[str], None] = "d2f7b9a4c618"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Mesmo valor de settings.DB_RLS_ROLE (o env.py do Alembic carrega o .env)
+RLS_ROLE = os.getenv("DB_RLS_ROLE", "gestao_rls")
+if not re.fullmatch(r"[a-z_][a-z0-9_]{0,62}", RLS_ROLE):
+    raise ValueError(f"DB_RLS_ROLE inválido para uso como identificador: {RLS_ROLE!r}")
+# Mesmo valor de settings.DB_ROW_LEVEL_SECURITY
+RLS_ENABLED = os.getenv("DB_ROW_LEVEL_SECURITY", "false").strip().lower() in ("1", "true", "yes", "on")
+
+# tabela -> coluna com o id do colaborador
+SCOPED_TABLES = {
+    "employees": "id",
+    "employee_knowledge": "employee_id",
+    "alerts": "employee_id",
+    "employee_pdi_logs": "employee_id",
+    "employee_one_on_ones": "employee_id",
+}
+
+# Sub-SELECTs escalares: viram InitPlan, avaliados uma vez por consulta. O
+# cast externo faz ``ANY (...)`` receber um array, e não uma subconsulta.
+_OWN_ID = "(SELECT nullif(current_setting('app.employee_id', true), '')::uuid)"
+_SCOPE_IDS = "(SELECT nullif(current_setting('app.scope_ids', true), '')::uuid[])::uuid[]"
+
+
+def upgrade() -> None:
+    if not RLS_ENABLED:
+        return
+    op.execute(
+        f"""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = '{RLS_ROLE}') THEN
+                CREATE ROLE {RLS_ROLE} NOLOGIN NOBYPASSRLS;
+            END IF;
+        END
+        $$;
+        """
+    )
+    # O usuário da aplicação precisa poder fazer SET ROLE
+    op.execute(f"GRANT {RLS_ROLE} TO CURRENT_USER")
+    op.execute(f"GRANT USAGE ON SCHEMA public TO {RLS_ROLE}")
+    op.execute(f"GRANT SELECT, INSERT, UPDATE, DELETE ON ALL TABLES IN SCHEMA public TO {RLS_ROLE}")
+    op.execute(f"GRANT USAGE, SELECT ON ALL SEQUENCES IN SCHEMA public TO {RLS_ROLE}")
+    op.execute(f"ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT SELECT, INSERT, UPDATE, DELETE ON TABLES TO {RLS_ROLE}")
+    op.execute(f"ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT USAGE, SELECT ON SEQUENCES TO {RLS_ROLE}")
+
+    for table, column in SCOPED_TABLES.items():
+        visible = f"({column} = {_OWN_ID} OR {column} = ANY ({_SCOPE_IDS}))"
+        if table == "alerts":
+            # Alertas sem colaborador (gerais) são visíveis a todos
+            visible = f"({column} IS NULL OR {visible})"
+        op.execute(f"ALTER TABLE {table} ENABLE ROW LEVEL SECURITY")
+        op.execute(f"CREATE POLICY {table}_scope_select ON {table} FOR SELECT TO {RLS_ROLE} USING ({visible})")
+        # A autorização de escrita continua nos routers; as políticas impedem
+        # gravar linhas fora do escopo (inclusive mover uma linha para fora dele)
+        op.execute(f"CREATE POLICY {table}_scope_insert ON {table} FOR INSERT TO {RLS_ROLE} WITH CHECK ({visible})")
+        op.execute(f"CREATE POLICY {table}_scope_update ON {table} FOR UPDATE TO {RLS_ROLE} USING ({visible}) WITH CHECK ({visible})")
+        op.execute(f"CREATE POLICY {table}_scope_delete ON {table} FOR DELETE TO {RLS_ROLE} USING ({visible})")
+
+
+def downgrade() -> None:
+    # Idempotente: também desfaz instalações feitas com a flag ligada quando
+    # ela já foi desligada (ou com a função app_rls_visible da versão anterior)
+    for table in SCOPED_TABLES:
+        for action in ("select", "insert", "update", "delete"):
+            op.execute(f"DROP POLICY IF EXISTS {table}_scope_{action} ON {table}")
+        op.execute(f"ALTER TABLE {table} DISABLE ROW LEVEL SECURITY")
+    op.execute("DROP FUNCTION IF EXISTS app_rls_visible(uuid)")
+    op.execute(
+        f"""
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = '{RLS_ROLE}') THEN
+                ALTER DEFAULT PRIVILEGES IN SCHEMA public REVOKE SELECT, INSERT, UPDATE, DELETE ON TABLES FROM {RLS_ROLE};
+                ALTER DEFAULT PRIVILEGES IN SCHEMA public REVOKE USAGE, SELECT ON SEQUENCES FROM {RLS_ROLE};
+                REVOKE ALL ON ALL TABLES IN SCHEMA public FROM {RLS_ROLE};
+                REVOKE ALL ON ALL SEQUENCES IN SCHEMA public FROM {RLS_ROLE};
+                REVOKE USAGE ON SCHEMA public FROM {RLS_ROLE};
+            END IF;
+        END
+        $$;
+        """
+    )
@@ -34,6 +34,21 @@ class Settings(BaseSettings):
     # Connection String PostgreSQL direto (opcional)
     DATABASE_URL: Optional[str] = None
 
+    # Pools por worker. Os engines síncrono (psycopg2) e async (asyncpg) dividem
+    # o orçamento de conexões: o teto por worker é a soma de size + overflow dos
+    # dois (padrão 30, como antes do engine async). A réplica, se configurada,
+    # usa os mesmos tamanhos no outro servidor.
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_ASYNC_POOL_SIZE: int = 5
+    DB_ASYNC_MAX_OVERFLOW: int = 10
+
+    # Réplica de leitura (opcional); pode apontar para o mesmo banco em desenvolvimento
+    DATABASE_REPLICA_URL: Optional[str] = None
+    REPLICA_MAX_LAG_SECONDS: float = 5.0  # Acima disso, as leituras voltam ao primário
+    REPLICA_CHECK_INTERVAL_SECONDS: float = 5.0
+    READ_YOUR_WRITES_SECONDS: float = 10.0  # Após escrever, o usuário lê do primário por este tempo
+
     @property
     def postgres_url(self) -> str:
         """URL do PostgreSQL extraída do Supabase"""
@@ -85,6 +100,24 @@ class Settings(BaseSettings):
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = 60
     RATE_LIMIT_PER_HOUR: int = 1000
+    RATE_LIMIT_LOGIN_PER_MINUTE: int = 10
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # memory (por worker) ou postgres (compartilhado)
+    # Proxies reversos (IPs ou CIDRs) cujo X-Forwarded-For é confiável
+    RATE_LIMIT_TRUSTED_PROXIES: list[str] = []
+    RATE_LIMIT_BY_USER: bool = True  # Requisições autenticadas contam por usuário, não por IP
+
+    # Hash de senhas (bcrypt) em executor dedicado
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 16  # Acima disso, login responde 429
+
+    # Intervalo de gravação em lote de last_login/login_count
+    LOGIN_STATS_FLUSH_SECONDS: int = 5
+
+    # Row-level security no Postgres (ver app.core.row_security); a migração
+    # e9a1c5d3b7f2 só cria o papel e as políticas com a flag ligada
+    DB_ROW_LEVEL_SECURITY: bool = False
+    DB_RLS_ROLE: str = "gestao_rls"  # Papel sem BYPASSRLS e sem posse das tabelas (lido também pela migração e9a1c5d3b7f2)
 
     # Session
     SESSION_SECRET: str
@@ -181,10 +214,44 @@ class Settings(BaseSettings):
     CACHE_ENABLED: bool = True
     CACHE_TTL_SECONDS: int = 300  # 5 minutos
 
+    # Propagação das invalidações entre workers (LISTEN/NOTIFY)
+    CACHE_SYNC_ENABLED: bool = True
+    CACHE_SYNC_CHANNEL: str = "gestao_cache"
+    CACHE_SYNC_DATABASE_URL: Optional[str] = None  # Conexão direta, se DATABASE_URL passar por pgbouncer
+
+    # Usuário autenticado em cache (evita consultar users a cada request)
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_CACHE_MAXSIZE: int = 4096
+
+    # ============================================================================
+    # HEALTH CHECKS
+    # ============================================================================
+    HEALTH_READY_CACHE_SECONDS: float = 5.0  # Resultado do SELECT 1 reaproveitado entre probes
+    HEALTH_POOL_SATURATION_THRESHOLD: float = 0.95  # Fração do pool (size + overflow) em uso
+
+    # ============================================================================
+    # MÉTRICAS (Prometheus)
+    # ============================================================================
+    METRICS_ENABLED: bool = True
+    PROMETHEUS_MULTIPROC_DIR: Optional[str] = None  # Obrigatório com WORKERS > 1
+    METRICS_REFRESH_SECONDS: int = 5  # Intervalo de atualização dos contadores de cache
+
     # ============================================================================
     # DEVELOPMENT / DEBUG
     # ============================================================================
-    SHOW_SQL_QUERIES: bool = False
+    SHOW_SQL_QUERIES: bool = False  # Contagem/tempo de SQL por requisição, Server-Timing e alerta de N+1
+    SQL_N_PLUS_ONE_THRESHOLD: int = 5  # Repetições do mesmo formato de consulta para alertar
+
+    # Consultas lentas (buffer em /admin/diagnostics/slow-queries)
+    SLOW_QUERY_LOG_ENABLED: bool = True
+    SLOW_QUERY_THRESHOLD_MS: int = 500
+    SLOW_QUERY_BUFFER_SIZE: int = 200
+    SLOW_QUERY_EXPLAIN: bool = True  # EXPLAIN (FORMAT JSON), sem ANALYZE, em segundo plano
+    SLOW_QUERY_EXPLAIN_TIMEOUT_MS: int = 2000
+
+    # Logs recentes em memória (/admin/logs)
+    LOG_BUFFER_SIZE: int = 500
+    LOG_BUFFER_LEVEL: str = "WARNING"
     ENABLE_PROFILER: bool = False
     MOCK_DATA: bool = False  # Nunca em produção!
 
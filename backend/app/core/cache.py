@@ -0,0 +1,362 @@
+"""
+Cache em memória do processo
+TTL/LRU com invalidação por tabela
+
+Cada worker mantém seus próprios caches. Os resultados derivados do banco
+ficam associados à "versão" das tabelas de origem: quando uma sessão faz
+commit de alterações em uma tabela, a versão local é incrementada e as
+entradas dependentes deixam de valer.
+
+Com CACHE_SYNC_ENABLED, cada flush publica as tabelas/chaves alteradas via
+NOTIFY na mesma transação (só é entregue se houver commit) e um listener por
+worker aplica as invalidações vindas dos demais. O TTL (CACHE_TTL_SECONDS)
+continua limitando o tempo de um valor antigo caso alguma notificação se perca.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import select
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from itertools import chain
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+# ============================================================================
+# TTL / LRU
+# ============================================================================
+
+class TTLCache:
+    """
+    Cache LRU com expiração por tempo, seguro para uso entre threads
+
+    Args:
+        name: Nome usado nas estatísticas
+        maxsize: Número máximo de entradas
+        ttl: Tempo de vida padrão em segundos (None = sem expiração)
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if not settings.CACHE_ENABLED:
+            return default
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at >= time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        if not settings.CACHE_ENABLED:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else float("inf")
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DatasetCache(TTLCache):
+    """
+    Cache de resultados derivados de tabelas
+
+    A entrada guarda a versão das tabelas de origem no momento do cálculo e
+    é descartada assim que qualquer uma delas for alterada.
+    """
+
+    def get_or_compute(self, key: Hashable, tables: Iterable[str], compute: Callable[[], Any]) -> Any:
+        tables = tuple(tables)
+        version = table_version(*tables)
+        entry = self.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        value = compute()
+        self.set(key, (version, value))
+        return value
+
+
+_registry: Dict[str, TTLCache] = {}
+
+
+def cache_stats() -> Dict[str, dict]:
+    """Estatísticas de uso dos caches deste processo"""
+    return {
+        name: {"size": len(cache), "hits": cache.hits, "misses": cache.misses}
+        for name, cache in _registry.items()
+    }
+
+
+# ============================================================================
+# VERSÕES POR TABELA
+# ============================================================================
+
+_versions: Dict[str, int] = defaultdict(int)
+_versions_lock = threading.Lock()
+_subscribers: Dict[str, List[Callable[[str, Optional[frozenset]], None]]] = defaultdict(list)
+
+
+def table_version(*tables: str) -> Tuple[int, ...]:
+    """Versão local das tabelas informadas"""
+    return tuple(_versions[table] for table in tables)
+
+
+def subscribe(table: str, callback: Callable[[str, Optional[frozenset]], None]) -> None:
+    """
+    Registra callback chamado quando a tabela for invalidada
+
+    O callback recebe o nome da tabela e as chaves primárias alteradas
+    (ou None quando a alteração não identifica linhas específicas).
+    """
+    _subscribers[table].append(callback)
+
+
+def invalidate_tables(*tables: str, keys: Optional[Iterable[Any]] = None, publish: bool = True) -> None:
+    """
+    Invalida os dados derivados das tabelas informadas
+
+    Deve ser chamada explicitamente após comandos em massa (UPDATE/INSERT
+    via Core) que não passam pelos eventos do ORM. Com ``publish`` a
+    invalidação também é enviada aos demais workers.
+    """
+    key_set = frozenset(str(k) for k in keys) if keys is not None else None
+    with _versions_lock:
+        for table in tables:
+            _versions[table] += 1
+    for table in tables:
+        for callback in _subscribers.get(table, ()):
+            try:
+                callback(table, key_set)
+            except Exception as exc:
+                logger.error(f"Erro ao invalidar cache da tabela {table}: {exc}")
+    if publish and _sync_active():
+        _publish_now({table: key_set for table in tables})
+
+
+def invalidate_all() -> None:
+    """Descarta todos os caches e versões conhecidos deste processo"""
+    for cache in list(_registry.values()):
+        cache.clear()
+    invalidate_tables(*set(_versions) | set(_subscribers), publish=False)
+
+
+# ============================================================================
+# EVENTOS DO ORM
+# ============================================================================
+
+_CHANGES_KEY = "cache_changes"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session: Session, flush_context) -> None:
+    changes = session.info.setdefault(_CHANGES_KEY, defaultdict(set))
+    flushed: Dict[str, set] = defaultdict(set)
+    for obj in chain(session.new, session.dirty, session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table:
+            key = getattr(obj, "id", None)
+            changes[table].add(key)
+            flushed[table].add(key)
+    if flushed:
+        publish_in_transaction(session, {
+            table: frozenset(str(k) for k in keys if k is not None)
+            for table, keys in flushed.items()
+        })
+
+
+def publish_in_transaction(session: Session, changes: Dict[str, Optional[frozenset]]) -> None:
+    """
+    Envia invalidações aos demais workers junto com a transação da sessão
+
+    NOTIFY é transacional: os outros workers só recebem após o commit (e
+    nada recebem se houver rollback).
+    """
+    if not _sync_active() or session.get_bind().dialect.name != "postgresql":
+        return
+    session.connection().execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": settings.CACHE_SYNC_CHANNEL, "payload": _encode_payload(changes)},
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session: Session) -> None:
+    changes = session.info.pop(_CHANGES_KEY, None)
+    if not changes:
+        return
+    for table, keys in changes.items():
+        invalidate_tables(table, keys=[k for k in keys if k is not None], publish=False)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session: Session) -> None:
+    session.info.pop(_CHANGES_KEY, None)
+
+
+# ============================================================================
+# SINCRONIZAÇÃO ENTRE WORKERS (LISTEN/NOTIFY)
+# ============================================================================
+
+# Identifica as notificações publicadas por este processo
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# Limite do payload do NOTIFY é 8000 bytes
+_MAX_PAYLOAD = 7500
+
+_listener: Optional["CacheSyncListener"] = None
+
+
+def _sync_active() -> bool:
+    return settings.CACHE_ENABLED and settings.CACHE_SYNC_ENABLED
+
+
+def _encode_payload(changes: Dict[str, Optional[frozenset]]) -> str:
+    message = {
+        "origin": WORKER_ID,
+        "tables": {table: sorted(keys) if keys else None for table, keys in changes.items()},
+    }
+    payload = json.dumps(message, separators=(",", ":"))
+    if len(payload) > _MAX_PAYLOAD:
+        # Chaves demais: os outros workers invalidam a tabela inteira
+        message["tables"] = {table: None for table in changes}
+        payload = json.dumps(message, separators=(",", ":"))
+    return payload
+
+
+def _publish_now(changes: Dict[str, Optional[frozenset]]) -> None:
+    """Publica invalidações feitas fora de uma transação do ORM"""
+    from app.database import engine
+
+    if engine.dialect.name != "postgresql":
+        return
+    try:
+        with engine.begin() as conn:
+            conn.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": settings.CACHE_SYNC_CHANNEL, "payload": _encode_payload(changes)},
+            )
+    except Exception as exc:
+        logger.error(f"Erro ao publicar invalidação de cache: {exc}")
+
+
+def _apply_remote(payload: str) -> None:
+    try:
+        message = json.loads(payload)
+    except ValueError:
+        logger.warning("Notificação de cache inválida ignorada")
+        return
+    if message.get("origin") == WORKER_ID:
+        return
+    for table, keys in (message.get("tables") or {}).items():
+        invalidate_tables(table, keys=keys, publish=False)
+
+
+class CacheSyncListener(threading.Thread):
+    """
+    Thread que escuta o canal de invalidação e aplica as notificações
+
+    Usa uma conexão psycopg2 própria, em autocommit. LISTEN não funciona
+    atrás de pgbouncer em modo transação; nesse caso aponte
+    CACHE_SYNC_DATABASE_URL para a conexão direta. Após reconectar, todos os
+    caches locais são descartados, já que notificações podem ter sido perdidas.
+    """
+
+    def __init__(self, dsn: str, channel: str):
+        super().__init__(name="cache-sync", daemon=True)
+        self.dsn = dsn.replace("+psycopg2", "")
+        self.channel = channel
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def run(self) -> None:
+        import psycopg2
+
+        first_connection = True
+        while not self._stop_event.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                if not first_connection:
+                    invalidate_all()
+                first_connection = False
+                logger.info(f"Sincronização de cache ativa no canal {self.channel}")
+                while not self._stop_event.is_set():
+                    if select.select([conn], [], [], 5.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        _apply_remote(conn.notifies.pop(0).payload)
+            except Exception as exc:
+                logger.error(f"Listener de cache desconectado: {exc}")
+                self._stop_event.wait(5.0)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+
+def start_cache_sync() -> None:
+    """Inicia o listener de invalidações deste worker (idempotente)"""
+    global _listener
+    if not _sync_active() or _listener is not None:
+        return
+    dsn = settings.CACHE_SYNC_DATABASE_URL or settings.DATABASE_URL
+    if not dsn or not dsn.startswith("postgres"):
+        return
+    _listener = CacheSyncListener(dsn, settings.CACHE_SYNC_CHANNEL)
+    _listener.start()
+
+
+def stop_cache_sync() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
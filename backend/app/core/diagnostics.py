@@ -0,0 +1,227 @@
+"""
+Diagnóstico operacional
+Consultas lentas (com EXPLAIN) e logs recentes, em buffers circulares na memória
+
+Consultas lentas:
+    Os eventos de cursor de ``sql_instrumentation`` chamam ``slow_queries.record``
+    quando uma consulta passa de SLOW_QUERY_THRESHOLD_MS. O registro guarda o SQL,
+    os parâmetros mascarados e a rota de origem; o ``EXPLAIN (FORMAT JSON)`` (sem
+    ANALYZE, nada é executado de novo) roda depois, em uma thread própria, para
+    não atrasar a requisição. Os valores reais dos parâmetros só ficam na fila até
+    o EXPLAIN e nunca são expostos.
+
+Logs recentes:
+    ``RecentLogHandler`` guarda os últimos registros a partir de LOG_BUFFER_LEVEL
+    (avisos de N+1, consultas lentas, erros) para o endpoint ``/admin/logs``.
+
+Os buffers são por processo: com vários workers, cada um mostra o que viu.
+"""
+from __future__ import annotations
+
+import itertools
+import logging
+import queue
+import re
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any, Deque, List, Optional, Tuple
+from uuid import UUID
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Só EXPLAIN de comandos que o planner aceita
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+# Valores de enum (status, tipo) não identificam ninguém e ajudam a ler o plano
+_ENUM_LIKE = re.compile(r"^[A-Z][A-Z0-9_]{0,39}$")
+# Placeholders posicionais do asyncpg
+_DOLLAR_PARAM = re.compile(r"\$(\d+)")
+
+
+def mask_parameter(value: Any) -> Any:
+    """
+    Máscara de um parâmetro de consulta
+
+    Mantém só o que não identifica pessoas (None, booleanos, inteiros, UUIDs,
+    valores de enum); textos viram ``<str:tamanho>`` e valores monetários e
+    datas, ``<tipo>``.
+    """
+    if value is None or isinstance(value, (bool, int)):
+        return value
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, str):
+        return value if _ENUM_LIKE.match(value) else f"<str:{len(value)}>"
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [mask_parameter(item) for item in value]
+    return f"<{type(value).__name__}>"
+
+
+def mask_parameters(parameters: Any, executemany: bool = False) -> Any:
+    if executemany and isinstance(parameters, (list, tuple)):
+        # Só o primeiro conjunto de um executemany
+        return {"executemany": len(parameters), "primeiro": mask_parameters(parameters[0]) if parameters else None}
+    if isinstance(parameters, dict):
+        return {key: mask_parameter(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [mask_parameter(value) for value in parameters]
+    return mask_parameter(parameters)
+
+
+def to_pyformat(statement: str, parameters: Any) -> Tuple[str, dict]:
+    """
+    Converte uma consulta do asyncpg (``$1``, ``$2`` e parâmetros posicionais)
+    para o formato do psycopg2 (``%(p1)s`` e dicionário)
+    """
+    values = list(parameters or ())
+    rewritten = _DOLLAR_PARAM.sub(lambda match: f"%(p{match.group(1)})s", statement.replace("%", "%%"))
+    return rewritten, {f"p{position}": value for position, value in enumerate(values, 1)}
+
+
+@dataclass
+class SlowQuery:
+    id: int
+    registrado_em: datetime
+    rota: Optional[str]
+    duracao_ms: float
+    sql: str
+    parametros: Any
+    plano: Optional[Any] = None
+    plano_erro: Optional[str] = None
+
+
+class SlowQueryRecorder:
+    """
+    Buffer circular das consultas lentas
+
+    ``record`` roda dentro do evento de cursor, então só copia os dados e
+    enfileira o EXPLAIN; a fila é limitada e, cheia, o plano é descartado.
+    O EXPLAIN usa o engine síncrono (psycopg2); consultas vindas do asyncpg
+    têm os placeholders ``$n`` reescritos com ``to_pyformat`` antes.
+    """
+
+    def __init__(self) -> None:
+        self._entries: Deque[SlowQuery] = deque(maxlen=settings.SLOW_QUERY_BUFFER_SIZE)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._explain_queue: "queue.Queue" = queue.Queue(maxsize=100)
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, statement: str, parameters: Any, elapsed: float, route: Optional[str],
+               paramstyle: str, executemany: bool = False) -> SlowQuery:
+        entry = SlowQuery(
+            id=next(self._ids),
+            registrado_em=datetime.now(timezone.utc),
+            rota=route,
+            duracao_ms=round(elapsed * 1000, 1),
+            sql=statement,
+            parametros=mask_parameters(parameters, executemany),
+        )
+        with self._lock:
+            self._entries.append(entry)
+        logger.warning(f"Consulta lenta ({entry.duracao_ms}ms) em {route or 'segundo plano'}: {statement[:200]}")
+
+        if not settings.SLOW_QUERY_EXPLAIN or not _EXPLAINABLE.match(statement):
+            return entry
+        if paramstyle == "numeric_dollar" and not executemany:
+            statement, parameters = to_pyformat(statement, parameters)
+        elif executemany or paramstyle not in ("pyformat", "format"):
+            entry.plano_erro = "EXPLAIN indisponível para executemany ou este driver"
+            return entry
+        try:
+            self._explain_queue.put_nowait((entry, statement, parameters))
+        except queue.Full:
+            entry.plano_erro = "Fila de EXPLAIN cheia"
+            return entry
+        self._ensure_started()
+        return entry
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="slow-query-explain", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            entry, statement, parameters = self._explain_queue.get()
+            try:
+                entry.plano = self._explain(statement, parameters)
+            except Exception as exc:
+                entry.plano_erro = str(exc).splitlines()[0][:300]
+            finally:
+                self._explain_queue.task_done()
+
+    @staticmethod
+    def _explain(statement: str, parameters: Any) -> Any:
+        from app.database import engine
+
+        with engine.connect() as conn:
+            # Só leitura e com limite de tempo: o plano não pode pesar no banco
+            conn.exec_driver_sql("SET TRANSACTION READ ONLY")
+            conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(settings.SLOW_QUERY_EXPLAIN_TIMEOUT_MS)}")
+            plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters or {}).scalar()
+            conn.rollback()
+        return plan
+
+    def entries(self, limit: Optional[int] = None) -> List[dict]:
+        """Registros mais recentes primeiro"""
+        with self._lock:
+            entries = list(reversed(self._entries))
+        return [asdict(entry) for entry in entries[:limit]]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class RecentLogHandler(logging.Handler):
+    """Handler de logging que mantém os últimos registros na memória"""
+
+    def __init__(self, capacity: int, level: int = logging.WARNING) -> None:
+        super().__init__(level)
+        self._records: Deque[dict] = deque(maxlen=capacity)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            entry = {
+                "registrado_em": datetime.fromtimestamp(record.created, tz=timezone.utc),
+                "nivel": record.levelname,
+                "origem": record.name,
+                "mensagem": record.getMessage(),
+            }
+            if record.exc_info:
+                entry["excecao"] = logging.Formatter().formatException(record.exc_info)
+            self._records.append(entry)
+        except Exception:
+            self.handleError(record)
+
+    def records(self, skip: int = 0, limit: int = 50, level: Optional[str] = None) -> List[dict]:
+        """Registros mais recentes primeiro, opcionalmente a partir de um nível"""
+        minimum = logging.getLevelName(level.upper()) if level else 0
+        if not isinstance(minimum, int):
+            minimum = 0
+        records = [
+            record for record in reversed(self._records)
+            if logging.getLevelName(record["nivel"]) >= minimum
+        ]
+        return records[skip:skip + limit]
+
+
+slow_queries = SlowQueryRecorder()
+recent_logs = RecentLogHandler(settings.LOG_BUFFER_SIZE, logging.getLevelName(settings.LOG_BUFFER_LEVEL.upper()))
+
+
+def install_log_buffer() -> None:
+    """Anexa o buffer de logs recentes ao logger raiz (uma vez)"""
+    root = logging.getLogger()
+    if recent_logs not in root.handlers:
+        root.addHandler(recent_logs)
@@ -0,0 +1,235 @@
+"""
+Métricas Prometheus
+Latência por rota, requisições em andamento, pool de conexões, recálculo de
+alertas e caches, expostos em ``/metrics``
+
+Vários workers:
+    Com PROMETHEUS_MULTIPROC_DIR (variável de ambiente ou setting), o
+    prometheus_client grava as métricas de cada processo em arquivos nesse
+    diretório e ``/metrics`` agrega todos eles, qualquer que seja o worker que
+    atender a coleta. O diretório precisa existir, ser exclusivo da aplicação e
+    ser esvaziado a cada deploy, antes de subir os workers. Sem ele, cada
+    processo expõe só as próprias métricas.
+
+Gauges usam ``livesum``: somam os processos vivos (conexões em uso, em
+andamento). Os contadores de cache recebem o delta de ``cache_stats()`` no fim
+das requisições, no máximo a cada METRICS_REFRESH_SECONDS; a taxa de acerto é
+``rate(gestao_cache_hits_total) / (rate(gestao_cache_hits_total) +
+rate(gestao_cache_misses_total))``.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Dict, Tuple
+
+from app.config import settings
+
+# O prometheus_client escolhe o modo (um ou vários processos) ao ser importado
+if settings.PROMETHEUS_MULTIPROC_DIR:
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", settings.PROMETHEUS_MULTIPROC_DIR)
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError  # noqa: E402
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool  # noqa: E402
+from starlette.types import ASGIApp, Receive, Scope, Send  # noqa: E402
+
+from app.core.cache import cache_stats  # noqa: E402
+
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+HTTP_REQUEST_DURATION = Histogram(
+    "gestao_http_request_duration_seconds",
+    "Duração das requisições HTTP por rota",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "gestao_http_requests_in_progress",
+    "Requisições HTTP em andamento",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+
+DB_POOL_CHECKED_OUT = Gauge(
+    "gestao_db_pool_checked_out",
+    "Conexões do pool em uso",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "gestao_db_pool_overflow",
+    "Conexões abertas além de pool_size (negativo: pool ainda não preenchido)",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_SIZE = Gauge(
+    "gestao_db_pool_size",
+    "pool_size configurado",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_WAIT = Histogram(
+    "gestao_db_pool_wait_seconds",
+    "Tempo para obter uma conexão do pool",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+DB_POOL_TIMEOUTS = Counter(
+    "gestao_db_pool_timeouts_total",
+    "Esperas por conexão que estouraram pool_timeout",
+    ["pool"],
+)
+
+ALERT_REFRESH_DURATION = Histogram(
+    "gestao_alert_refresh_seconds",
+    "Duração do recálculo de alertas",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+CACHE_HITS = Counter("gestao_cache_hits", "Acertos de cache", ["cache"])
+CACHE_MISSES = Counter("gestao_cache_misses", "Faltas de cache", ["cache"])
+CACHE_SIZE = Gauge("gestao_cache_entries", "Entradas em cache", ["cache"], multiprocess_mode="livesum")
+
+
+# ============================================================================
+# POOL DE CONEXÕES
+# ============================================================================
+
+class _PoolMetricsMixin:
+    """Mede a espera em ``_do_get`` e atualiza os gauges a cada checkout/checkin"""
+
+    metrics_label: str
+
+    def _report_usage(self) -> None:
+        DB_POOL_CHECKED_OUT.labels(self.metrics_label).set(self.checkedout())
+        DB_POOL_OVERFLOW.labels(self.metrics_label).set(self.overflow())
+        DB_POOL_SIZE.labels(self.metrics_label).set(self.size())
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_TIMEOUTS.labels(self.metrics_label).inc()
+            raise
+        finally:
+            DB_POOL_WAIT.labels(self.metrics_label).observe(time.perf_counter() - started)
+        self._report_usage()
+        return connection
+
+    def _do_return_conn(self, record) -> None:
+        super()._do_return_conn(record)
+        self._report_usage()
+
+
+class InstrumentedQueuePool(_PoolMetricsMixin, QueuePool):
+    metrics_label = "primary"
+
+
+class InstrumentedAsyncQueuePool(_PoolMetricsMixin, AsyncAdaptedQueuePool):
+    metrics_label = "primary_async"
+
+
+class InstrumentedReplicaQueuePool(_PoolMetricsMixin, QueuePool):
+    metrics_label = "replica"
+
+
+class InstrumentedReplicaAsyncQueuePool(_PoolMetricsMixin, AsyncAdaptedQueuePool):
+    metrics_label = "replica_async"
+
+
+# ============================================================================
+# CACHES
+# ============================================================================
+
+_cache_lock = threading.Lock()
+_cache_reported: Dict[str, Tuple[int, int]] = {}
+_cache_refreshed_at = 0.0
+
+
+def refresh_cache_metrics(force: bool = False) -> None:
+    """Repassa aos contadores o que os caches deste processo acumularam"""
+    global _cache_refreshed_at
+    now = time.monotonic()
+    if not force and now - _cache_refreshed_at < settings.METRICS_REFRESH_SECONDS:
+        return
+    with _cache_lock:
+        _cache_refreshed_at = now
+        for name, stats in cache_stats().items():
+            hits, misses = _cache_reported.get(name, (0, 0))
+            # Contadores do cache zerados (ex.: clear) recomeçam a contagem
+            if stats["hits"] < hits or stats["misses"] < misses:
+                hits, misses = 0, 0
+            CACHE_HITS.labels(name).inc(stats["hits"] - hits)
+            CACHE_MISSES.labels(name).inc(stats["misses"] - misses)
+            CACHE_SIZE.labels(name).set(stats["size"])
+            _cache_reported[name] = (stats["hits"], stats["misses"])
+
+
+# ============================================================================
+# HTTP
+# ============================================================================
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI com a latência por rota (template, ex.: /employees/{employee_id})
+
+    Requisições sem rota correspondente entram como ``unmatched`` para não
+    criar uma série por URL.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope.get("method", "")
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUEST_DURATION.labels(method, route, str(status_code)).observe(time.perf_counter() - started)
+            refresh_cache_metrics()
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Texto no formato Prometheus (agregado entre processos, se for o caso)"""
+    refresh_cache_metrics(force=True)
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead() -> None:
+    """Remove os gauges ``live*`` deste processo ao encerrar o worker"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,343 @@
+"""
+Rate limiting
+Janela deslizante aproximada (sliding window counter) por chave
+
+Cada chave guarda só o contador da janela atual e o da anterior; a contagem
+estimada é ``anterior * (1 - fração decorrida) + atual``. Isso mantém memória
+O(1) por chave, ao contrário de guardar o timestamp de cada requisição.
+
+Backends:
+    memory: por processo (o limite efetivo multiplica pelo número de workers)
+    postgres: contadores compartilhados na tabela UNLOGGED rate_limit_counters
+
+Chaves:
+    Requisições com um access token válido contam por usuário
+    (RATE_LIMIT_BY_USER), para que um escritório atrás de um único IP de NAT
+    não divida o mesmo limite. As demais contam por IP do cliente: o IP da
+    conexão ou, se ele estiver em RATE_LIMIT_TRUSTED_PROXIES, o primeiro IP
+    não confiável de X-Forwarded-For, lido da direita para a esquerda.
+"""
+from __future__ import annotations
+
+import ipaddress
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from anyio import to_thread
+from jose import JWTError, jwt
+from sqlalchemy import text
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+@dataclass(frozen=True)
+class Limit:
+    requests: int
+    window: int  # segundos
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: int
+
+
+def _estimate(previous: int, current: int, window: int, now: float, window_start: int) -> float:
+    elapsed = (now - window_start) / window
+    return previous * max(0.0, 1.0 - elapsed) + current
+
+
+def _decide(limits: Sequence[Limit], counts: Dict[int, Tuple[int, int]], now: float) -> Decision:
+    """Combina as janelas: bloqueia se qualquer uma estourar"""
+    allowed = True
+    remaining = None
+    tightest = limits[0]
+    retry_after = 0
+    for limit in limits:
+        previous, current = counts[limit.window]
+        window_start = int(now // limit.window) * limit.window
+        estimated = _estimate(previous, current, limit.window, now, window_start)
+        left = limit.requests - math.ceil(estimated)
+        if remaining is None or left < remaining:
+            remaining = left
+            tightest = limit
+        if estimated > limit.requests:
+            allowed = False
+            retry_after = max(retry_after, int(window_start + limit.window - now) + 1)
+    return Decision(allowed, tightest.requests, max(0, remaining or 0), retry_after)
+
+
+class MemoryBackend:
+    """
+    Contadores no processo, com despejo das chaves ociosas
+
+    As entradas ficam em ordem de último acesso; a cada chamada, as mais
+    antigas sem uso há ``idle_seconds`` são removidas (O(1) amortizado).
+    """
+
+    def __init__(self, maxsize: int = 100_000, idle_seconds: int = 2 * 3600):
+        self.maxsize = maxsize
+        self.idle_seconds = idle_seconds
+        # (chave, janela) -> [início da janela, anterior, atual, último acesso]
+        self._entries: "OrderedDict[Tuple[str, int], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limits: Sequence[Limit], now: Optional[float] = None) -> Decision:
+        now = time.time() if now is None else now
+        counts: Dict[int, Tuple[int, int]] = {}
+        with self._lock:
+            for limit in limits:
+                window_start = int(now // limit.window) * limit.window
+                entry = self._entries.get((key, limit.window))
+                if entry is None:
+                    entry = [window_start, 0, 0, now]
+                    self._entries[(key, limit.window)] = entry
+                elif entry[0] != window_start:
+                    # Janela nova: a atual vira anterior só se for a imediatamente anterior
+                    entry[1] = entry[2] if entry[0] == window_start - limit.window else 0
+                    entry[0], entry[2] = window_start, 0
+                entry[2] += 1
+                entry[3] = now
+                self._entries.move_to_end((key, limit.window))
+                counts[limit.window] = (int(entry[1]), int(entry[2]))
+            self._evict(now)
+        return _decide(limits, counts, now)
+
+    def _evict(self, now: float) -> None:
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if len(self._entries) <= self.maxsize and now - entry[3] < self.idle_seconds:
+                break
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class PostgresBackend:
+    """
+    Contadores compartilhados entre workers em rate_limit_counters
+
+    Um único round trip por requisição: incrementa as janelas atuais e lê
+    as anteriores. Linhas antigas são removidas periodicamente.
+    """
+
+    PURGE_EVERY = 1000
+
+    _HIT_SQL = text(
+        """
+        WITH hit AS (
+            INSERT INTO rate_limit_counters (key, window_seconds, window_start, count)
+            SELECT :key, w.window_seconds, w.window_start, 1
+            FROM unnest(CAST(:windows AS integer[]), CAST(:starts AS bigint[])) AS w(window_seconds, window_start)
+            ON CONFLICT (key, window_seconds, window_start)
+            DO UPDATE SET count = rate_limit_counters.count + 1
+            RETURNING window_seconds, window_start, count
+        )
+        SELECT hit.window_seconds, hit.count, COALESCE(prev.count, 0)
+        FROM hit
+        LEFT JOIN rate_limit_counters prev
+          ON prev.key = :key
+         AND prev.window_seconds = hit.window_seconds
+         AND prev.window_start = hit.window_start - hit.window_seconds
+        """
+    )
+
+    _PURGE_SQL = text(
+        "DELETE FROM rate_limit_counters WHERE window_start + 2 * window_seconds < :now"
+    )
+
+    def __init__(self):
+        self._calls = 0
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limits: Sequence[Limit], now: Optional[float] = None) -> Decision:
+        from app.database import engine
+
+        now = time.time() if now is None else now
+        starts = [int(now // limit.window) * limit.window for limit in limits]
+        with engine.begin() as conn:
+            rows = conn.execute(
+                self._HIT_SQL,
+                {
+                    "key": key[:200],
+                    "windows": [limit.window for limit in limits],
+                    "starts": starts,
+                },
+            ).all()
+            with self._lock:
+                self._calls += 1
+                purge = self._calls % self.PURGE_EVERY == 0
+            if purge:
+                conn.execute(self._PURGE_SQL, {"now": int(now)})
+        counts = {window: (int(previous), int(current)) for window, current, previous in rows}
+        return _decide(limits, counts, now)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if settings.RATE_LIMIT_BACKEND == "postgres":
+                _backend = PostgresBackend()
+            else:
+                _backend = MemoryBackend()
+        return _backend
+
+
+def default_limits() -> List[Limit]:
+    return [
+        Limit(settings.RATE_LIMIT_PER_MINUTE, 60),
+        Limit(settings.RATE_LIMIT_PER_HOUR, 3600),
+    ]
+
+
+def route_limits() -> List[Tuple[str, List[Limit]]]:
+    """Limites por prefixo de rota (o primeiro prefixo que casar vale)"""
+    return [
+        ("/auth/login", [Limit(settings.RATE_LIMIT_LOGIN_PER_MINUTE, 60), Limit(settings.RATE_LIMIT_PER_HOUR, 3600)]),
+        ("/", default_limits()),
+    ]
+
+
+@lru_cache(maxsize=1)
+def _trusted_networks(proxies: Tuple[str, ...]) -> Tuple[IPNetwork, ...]:
+    networks = []
+    for proxy in proxies:
+        try:
+            networks.append(ipaddress.ip_network(proxy.strip(), strict=False))
+        except ValueError:
+            logger.error(f"RATE_LIMIT_TRUSTED_PROXIES: endereço inválido ignorado: {proxy}")
+    return tuple(networks)
+
+
+def _is_trusted(address: str, networks: Sequence[IPNetwork]) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+
+def client_ip(scope: Scope) -> str:
+    """IP do cliente, atravessando só os proxies de RATE_LIMIT_TRUSTED_PROXIES"""
+    client = scope.get("client")
+    peer = client[0] if client else "desconhecido"
+    networks = _trusted_networks(tuple(settings.RATE_LIMIT_TRUSTED_PROXIES))
+    if not networks or not _is_trusted(peer, networks):
+        return peer
+    forwarded = [
+        value.decode("latin-1")
+        for name, value in scope.get("headers", [])
+        if name == b"x-forwarded-for"
+    ]
+    hops = [hop.strip() for header in forwarded for hop in header.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted(hop, networks):
+            return hop
+    return hops[0] if hops else peer
+
+
+def _token_subject(scope: Scope) -> Optional[str]:
+    """``sub`` de um access token válido no header Authorization"""
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                return None
+            try:
+                payload = jwt.decode(token.strip(), settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+            except JWTError:
+                return None
+            return payload.get("sub") if payload.get("type") == "access" else None
+    return None
+
+
+def client_key(scope: Scope) -> str:
+    """Chave de contagem: ``user:<id>`` para requisições autenticadas, senão o IP"""
+    if settings.RATE_LIMIT_BY_USER:
+        subject = _token_subject(scope)
+        if subject:
+            return f"user:{subject}"
+    return client_ip(scope)
+
+
+EXEMPT_PREFIXES = ("/health", "/docs", "/redoc", "/openapi.json", "/static", "/metrics")
+
+
+class RateLimitMiddleware:
+    """
+    Middleware ASGI que aplica os limites por cliente (usuário ou IP) e grupo de rota
+
+    Responde 429 com Retry-After quando o limite é excedido e acrescenta
+    X-RateLimit-Limit / X-RateLimit-Remaining nas demais respostas.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.routes = route_limits()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.RATE_LIMIT_ENABLED or scope.get("method") == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        path = scope.get("path", "")
+        if path.startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        prefix, limits = next((item for item in self.routes if path.startswith(item[0])))
+        key = f"{client_key(scope)}:{prefix}"
+
+        backend = get_backend()
+        try:
+            if isinstance(backend, MemoryBackend):
+                decision = backend.hit(key, limits)
+            else:
+                decision = await to_thread.run_sync(backend.hit, key, limits)
+        except Exception as exc:
+            # Falha no backend não derruba a API
+            logger.error(f"Rate limiter indisponível: {exc}")
+            await self.app(scope, receive, send)
+            return
+
+        if not decision.allowed:
+            response = JSONResponse(
+                status_code=429,
+                content={"error": "Limite de requisições excedido. Tente novamente mais tarde."},
+                headers={
+                    "Retry-After": str(decision.retry_after),
+                    "X-RateLimit-Limit": str(decision.limit),
+                    "X-RateLimit-Remaining": "0",
+                },
+            )
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-ratelimit-limit", str(decision.limit).encode()))
+                headers.append((b"x-ratelimit-remaining", str(decision.remaining).encode()))
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,290 @@
+"""
+Réplica de leitura
+Roteia leituras seguras para DATABASE_REPLICA_URL, com read-your-writes e fallback
+
+Uma leitura vai para a réplica quando:
+    - DATABASE_REPLICA_URL está configurada;
+    - a última verificação (thread ``replica-monitor``, a cada
+      REPLICA_CHECK_INTERVAL_SECONDS) achou a réplica acessível e com atraso
+      de replicação até REPLICA_MAX_LAG_SECONDS;
+    - o usuário não escreveu nada nos últimos READ_YOUR_WRITES_SECONDS.
+
+Escritas são detectadas nas sessões do ORM (flush ou INSERT/UPDATE/DELETE via
+``Session.execute``) da requisição autenticada e propagadas aos demais workers
+pelo barramento de cache (LISTEN/NOTIFY), na pseudo-tabela ``user_writes``,
+junto com o commit. Conexões que falham ao abrir ou caem durante o uso tiram a
+réplica de rotação até a próxima verificação; a requisição que encontrou a
+falha na abertura é atendida pelo primário.
+
+Apenas leituras sem cache derivado devem usar estas sessões: um dataset
+recalculado a partir de uma réplica atrasada ficaria em cache desatualizado
+até a próxima invalidação.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import AsyncGenerator, Callable, Dict, Generator, Optional
+
+from fastapi import Depends
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import database
+from app.config import settings
+from app.core.cache import publish_in_transaction, subscribe
+from app.core.security import get_current_user, request_user_id
+
+logger = logging.getLogger(__name__)
+
+WRITES_TABLE = "user_writes"
+_WROTE_KEY = "replica_user_write"
+
+_LAG_SQL = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """
+)
+
+
+class ReplicaRouter:
+    """Estado do roteamento neste processo"""
+
+    def __init__(self) -> None:
+        self._last_write: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._available = False
+        self._lag: Optional[float] = None
+        self._checked_at: Optional[float] = None
+        self._error: Optional[str] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return database.replica_engine is not None
+
+    # ------------------------------------------------------------------
+    # Read-your-writes
+    # ------------------------------------------------------------------
+
+    def record_write(self, user_id: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._last_write[user_id] = now
+            if len(self._last_write) > 10_000:
+                horizon = now - settings.READ_YOUR_WRITES_SECONDS
+                self._last_write = {uid: at for uid, at in self._last_write.items() if at >= horizon}
+
+    def wrote_recently(self, user_id: Optional[str]) -> bool:
+        if user_id is None:
+            return False
+        last = self._last_write.get(user_id)
+        return last is not None and time.monotonic() - last < settings.READ_YOUR_WRITES_SECONDS
+
+    # ------------------------------------------------------------------
+    # Disponibilidade
+    # ------------------------------------------------------------------
+
+    def use_replica(self, user_id: Optional[str]) -> bool:
+        if not self.enabled:
+            return False
+        self._ensure_started()
+        return self._available and not self.wrote_recently(user_id)
+
+    def mark_unavailable(self, error: Exception) -> None:
+        if self._available:
+            logger.warning(f"Réplica fora de rotação até a próxima verificação: {error}")
+        self._available = False
+        self._error = str(error).splitlines()[0][:300] if str(error) else type(error).__name__
+
+    def check(self) -> None:
+        """Mede o atraso da réplica e atualiza a disponibilidade"""
+        try:
+            with database.replica_engine.connect() as conn:
+                lag = float(conn.execute(_LAG_SQL).scalar() or 0.0)
+        except Exception as exc:
+            self._lag = None
+            self._checked_at = time.time()
+            self.mark_unavailable(exc)
+            return
+        available = lag <= settings.REPLICA_MAX_LAG_SECONDS
+        if available != self._available:
+            if available:
+                logger.info(f"Réplica em rotação (atraso {lag:.1f}s)")
+            else:
+                logger.warning(f"Réplica atrasada {lag:.1f}s; leituras no primário")
+        self._lag = lag
+        self._checked_at = time.time()
+        self._error = None if available else f"Atraso de {lag:.1f}s"
+        self._available = available
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop_event.clear()
+                self._thread = threading.Thread(target=self._run, name="replica-monitor", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self.check()
+            if self._stop_event.wait(settings.REPLICA_CHECK_INTERVAL_SECONDS):
+                return
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=settings.REPLICA_CHECK_INTERVAL_SECONDS + 5)
+            self._thread = None
+
+    def status(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "available": self._available,
+            "lag_seconds": self._lag,
+            "checked_at": self._checked_at,
+            "error": self._error,
+        }
+
+
+replica_router = ReplicaRouter()
+
+
+# ============================================================================
+# DETECÇÃO DE ESCRITAS
+# ============================================================================
+
+def _mark_write(session: Session) -> None:
+    if not replica_router.enabled or _WROTE_KEY in session.info:
+        return
+    user_id = request_user_id()
+    if user_id is None:
+        return
+    session.info[_WROTE_KEY] = user_id
+    # Os outros workers só recebem após o commit
+    publish_in_transaction(session, {WRITES_TABLE: frozenset({user_id})})
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session: Session, flush_context) -> None:
+    _mark_write(session)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _on_execute(orm_execute_state) -> None:
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _mark_write(orm_execute_state.session)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session) -> None:
+    user_id = session.info.pop(_WROTE_KEY, None)
+    if user_id is not None:
+        replica_router.record_write(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session: Session) -> None:
+    session.info.pop(_WROTE_KEY, None)
+
+
+def _remote_writes(table: str, keys: Optional[frozenset]) -> None:
+    for user_id in keys or ():
+        replica_router.record_write(user_id)
+
+
+subscribe(WRITES_TABLE, _remote_writes)
+
+
+def _on_replica_error(context) -> None:
+    if context.is_disconnect:
+        replica_router.mark_unavailable(context.original_exception)
+
+
+if database.replica_engine is not None:
+    event.listen(database.replica_engine, "handle_error", _on_replica_error)
+    event.listen(database.async_replica_engine.sync_engine, "handle_error", _on_replica_error)
+
+
+# ============================================================================
+# SESSÕES DE LEITURA
+# ============================================================================
+
+def open_read_session(current_user, prepare: Optional[Callable[[Session], None]] = None) -> Session:
+    """
+    Sessão para leitura: réplica quando possível, senão o primário
+
+    Args:
+        current_user: Usuário autenticado (define o read-your-writes)
+        prepare: Chamado com a sessão antes da primeira conexão (ex.: RLS)
+    """
+    if replica_router.use_replica(str(current_user.id)):
+        db = database.ReplicaSessionLocal()
+        if prepare is not None:
+            prepare(db)
+        try:
+            # Abre a conexão já aqui (pre-ping) para cair no primário se falhar
+            db.connection()
+            return db
+        except Exception as exc:
+            db.close()
+            replica_router.mark_unavailable(exc)
+    db = database.SessionLocal()
+    if prepare is not None:
+        prepare(db)
+    return db
+
+
+async def open_read_async_session(current_user, prepare: Optional[Callable[[Session], None]] = None) -> AsyncSession:
+    """Versão async de ``open_read_session`` (``prepare`` recebe a Session síncrona)"""
+    if replica_router.use_replica(str(current_user.id)):
+        db = database.AsyncReplicaSessionLocal()
+        if prepare is not None:
+            prepare(db.sync_session)
+        try:
+            await db.connection()
+            return db
+        except Exception as exc:
+            await db.close()
+            replica_router.mark_unavailable(exc)
+    db = database.AsyncSessionLocal()
+    if prepare is not None:
+        prepare(db.sync_session)
+    return db
+
+
+def get_read_db(current_user=Depends(get_current_user)) -> Generator[Session, None, None]:
+    """Dependency para endpoints GET sem efeitos colaterais"""
+    db = open_read_session(current_user)
+    try:
+        yield db
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Database error: {e}")
+        raise
+    finally:
+        db.close()
+
+
+async def get_read_async_db(current_user=Depends(get_current_user)) -> AsyncGenerator[AsyncSession, None]:
+    """Versão async de ``get_read_db``"""
+    db = await open_read_async_session(current_user)
+    try:
+        yield db
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Database error: {e}")
+        raise
+    finally:
+        await db.close()
@@ -0,0 +1,185 @@
+"""
+Row-level security (RLS) do Postgres
+Contexto do usuário por transação para as políticas das tabelas de colaboradores
+
+Com DB_ROW_LEVEL_SECURITY, as sessões obtidas por ``get_scoped_db`` executam,
+no início de cada transação:
+
+    SET LOCAL ROLE <DB_RLS_ROLE>
+    set_config('app.user_id' | 'app.user_role' | 'app.employee_id' |
+               'app.scope_ids', …, true)
+
+O papel DB_RLS_ROLE não é dono das tabelas, então as políticas criadas na
+migração e9a1c5d3b7f2 valem para ele: employees, employee_knowledge, alerts,
+employee_pdi_logs e employee_one_on_ones só devolvem as linhas do próprio
+colaborador e dos colaboradores no escopo de gestão (ManagerScope). Tudo é
+``LOCAL``: ao fim da transação a conexão volta ao pool sem contexto.
+
+Usuários sem restrição de escopo (admin/diretoria) e blocos ``rls_bypass`` não
+trocam de papel: continuam como dono das tabelas, então as políticas ficam só
+com o teste de escopo (avaliado uma vez por consulta) e não precisam de flags.
+
+``get_scoped_read_db``/``get_scoped_read_async_db`` aplicam o mesmo contexto às
+sessões de leitura, que podem ir para a réplica (ver app.core.replica).
+
+Conexões fora de ``get_scoped_db`` (jobs, scripts, rate limiter) continuam
+com o papel dono das tabelas e não são afetadas.
+"""
+from __future__ import annotations
+
+import logging
+from contextlib import contextmanager
+from functools import partial
+from typing import AsyncGenerator, Generator, Iterator
+
+from fastapi import Depends
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.replica import open_read_async_session, open_read_session
+from app.core.security import get_current_user
+from app.database import AsyncSessionLocal, SessionLocal
+from app.services.manager_scope import ManagerScope, ManagerScopeService
+
+logger = logging.getLogger(__name__)
+
+_CONTEXT_KEY = "rls_context"
+_BYPASS_KEY = "rls_bypass"
+
+_SET_CONTEXT_SQL = text(
+    """
+    SELECT set_config('app.user_id', :user_id, true),
+           set_config('app.user_role', :user_role, true),
+           set_config('app.employee_id', :employee_id, true),
+           set_config('app.scope_ids', :scope_ids, true)
+    """
+)
+
+
+def _context_params(current_user, scope: ManagerScope) -> dict:
+    return {
+        "user_id": str(current_user.id),
+        "user_role": current_user.role or "",
+        "employee_id": str(scope.own_employee_id or ""),
+        "scope_ids": "{" + ",".join(str(employee_id) for employee_id in scope.employee_ids) + "}",
+    }
+
+
+def _set_rls_role(session: Session) -> None:
+    role = session.get_bind().dialect.identifier_preparer.quote(settings.DB_RLS_ROLE)
+    session.execute(text(f"SET LOCAL ROLE {role}"))
+
+
+def _apply_context(session: Session, transaction, connection) -> None:
+    params = session.info.get(_CONTEXT_KEY)
+    if params is None:
+        return
+    connection.execute(_SET_CONTEXT_SQL, params)
+    if not session.info.get(_BYPASS_KEY):
+        role = connection.dialect.identifier_preparer.quote(settings.DB_RLS_ROLE)
+        connection.exec_driver_sql(f"SET LOCAL ROLE {role}")
+
+
+def bind_row_security(session: Session, current_user, scope: ManagerScope) -> None:
+    """Associa o contexto do usuário à sessão (aplicado a cada nova transação)"""
+    if scope.unrestricted:
+        # Vê todas as linhas: fica com o papel dono das tabelas
+        return
+    session.info[_CONTEXT_KEY] = _context_params(current_user, scope)
+    event.listen(session, "after_begin", _apply_context)
+
+
+@contextmanager
+def rls_bypass(session: Session) -> Iterator[Session]:
+    """
+    Desliga as políticas de RLS dentro do bloco
+
+    Para rotinas de sistema que precisam de todas as linhas (ex.: o recálculo
+    de alertas): volta ao papel dono das tabelas durante o bloco. Sem contexto
+    de RLS na sessão, não faz nada.
+    """
+    if _CONTEXT_KEY not in session.info:
+        yield session
+        return
+
+    session.info[_BYPASS_KEY] = True
+    if session.in_transaction():
+        session.execute(text("SET LOCAL ROLE NONE"))
+    try:
+        yield session
+    finally:
+        session.info.pop(_BYPASS_KEY, None)
+        if session.in_transaction():
+            _set_rls_role(session)
+
+
+def get_scoped_db(current_user=Depends(get_current_user)) -> Generator[Session, None, None]:
+    """
+    Dependency para sessões sujeitas ao RLS
+
+    Com DB_ROW_LEVEL_SECURITY desligado, equivale a ``get_db``.
+    """
+    db = SessionLocal()
+    if settings.DB_ROW_LEVEL_SECURITY:
+        # Escopo resolvido fora desta sessão (normalmente vem do cache)
+        bind_row_security(db, current_user, ManagerScopeService.resolve(None, current_user))
+    try:
+        yield db
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Database error: {e}")
+        raise
+    finally:
+        db.close()
+
+
+async def get_scoped_async_db(current_user=Depends(get_current_user)) -> AsyncGenerator[AsyncSession, None]:
+    """Versão async de ``get_scoped_db`` (equivale a ``get_async_db`` sem RLS)"""
+    async with AsyncSessionLocal() as db:
+        if settings.DB_ROW_LEVEL_SECURITY:
+            scope = await run_in_threadpool(ManagerScopeService.resolve, None, current_user)
+            # Os eventos de sessão ficam na Session síncrona encapsulada
+            bind_row_security(db.sync_session, current_user, scope)
+        try:
+            yield db
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Database error: {e}")
+            raise
+
+
+def get_scoped_read_db(current_user=Depends(get_current_user)) -> Generator[Session, None, None]:
+    """``get_scoped_db`` para leituras: usa a réplica quando disponível (ver app.core.replica)"""
+    prepare = None
+    if settings.DB_ROW_LEVEL_SECURITY:
+        scope = ManagerScopeService.resolve(None, current_user)
+        prepare = partial(bind_row_security, current_user=current_user, scope=scope)
+    db = open_read_session(current_user, prepare)
+    try:
+        yield db
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Database error: {e}")
+        raise
+    finally:
+        db.close()
+
+
+async def get_scoped_read_async_db(current_user=Depends(get_current_user)) -> AsyncGenerator[AsyncSession, None]:
+    """Versão async de ``get_scoped_read_db``"""
+    prepare = None
+    if settings.DB_ROW_LEVEL_SECURITY:
+        scope = await run_in_threadpool(ManagerScopeService.resolve, None, current_user)
+        prepare = partial(bind_row_security, current_user=current_user, scope=scope)
+    db = await open_read_async_session(current_user, prepare)
+    try:
+        yield db
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Database error: {e}")
+        raise
+    finally:
+        await db.close()
@@ -2,15 +2,26 @@
 Módulo de Segurança
 JWT, Hash de Senhas, RBAC, Auditoria
 """
-from datetime import datetime, timedelta
-from typing import Optional, Union
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Mapping, Optional, Union
+from uuid import UUID, uuid4
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import logging
 from app.config import settings
-from app.database import get_db
+from app.core.cache import TTLCache, subscribe, table_version
+from app.core.token_revocation import RevocationUnavailable, revocation_store
+from app.database import get_async_db
 
 logger = logging.getLogger(__name__)
 
@@ -59,6 +70,58 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     except Exception:
         return False
 
+
+# Executor dedicado: o bcrypt (~200 ms com 12 rounds) não pode rodar no event loop
+_password_executor: Optional[ThreadPoolExecutor] = None
+_password_pending = 0
+_password_lock = threading.Lock()
+
+
+def _get_password_executor() -> ThreadPoolExecutor:
+    global _password_executor
+    with _password_lock:
+        if _password_executor is None:
+            _password_executor = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                thread_name_prefix="bcrypt",
+            )
+        return _password_executor
+
+
+async def _run_password_task(func, *args):
+    """
+    Executa hash/verificação no executor do bcrypt
+
+    Com PASSWORD_HASH_MAX_PENDING tarefas em execução ou na fila, responde
+    429 imediatamente em vez de enfileirar mais (rajadas de login).
+    """
+    global _password_pending
+    with _password_lock:
+        if _password_pending >= settings.PASSWORD_HASH_MAX_PENDING:
+            logger.warning("Fila de verificação de senhas saturada")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Muitas autenticações simultâneas. Tente novamente em instantes.",
+                headers={"Retry-After": "1"},
+            )
+        _password_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_password_executor(), func, *args)
+    finally:
+        with _password_lock:
+            _password_pending -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    """Versão de hash_password para endpoints async (roda fora do event loop)"""
+    return await _run_password_task(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Versão de verify_password para endpoints async (roda fora do event loop)"""
+    return await _run_password_task(verify_password, plain_password, hashed_password)
+
 # ============================================================================
 # JWT TOKENS
 # ============================================================================
@@ -90,6 +153,7 @@ def create_access_token(
     to_encode.update({
         "exp": expire,
         "iat": datetime.utcnow(),
+        "jti": uuid4().hex,
         "type": "access"
     })
 
@@ -118,6 +182,7 @@ def create_refresh_token(user_id: str) -> str:
         "sub": user_id,
         "exp": expire,
         "iat": datetime.utcnow(),
+        "jti": uuid4().hex,
         "type": "refresh"
     }
 
@@ -159,14 +224,140 @@ def decode_token(token: str) -> dict:
         )
 
 
+# ============================================================================
+# PRINCIPAL (USUÁRIO AUTENTICADO EM CACHE)
+# ============================================================================
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    Usuário autenticado, desacoplado da sessão do ORM
+
+    Traz apenas o que os routers consultam (role, employee_id, flags), para
+    que possa ficar em cache entre requisições.
+    """
+    id: UUID
+    username: str
+    email: str
+    role: str
+    is_active: bool
+    is_admin: bool
+    employee_id: Optional[UUID]
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            role=user.role,
+            is_active=bool(user.is_active),
+            is_admin=bool(user.is_admin),
+            employee_id=user.employee_id,
+        )
+
+
+_principal_cache = TTLCache(
+    "principals",
+    maxsize=settings.PRINCIPAL_CACHE_MAXSIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+
+def _on_users_invalidated(table: str, keys: Optional[frozenset]) -> None:
+    if keys is None:
+        _principal_cache.clear()
+        return
+    for user_id in keys:
+        _principal_cache.pop(user_id)
+
+
+# Alterações em users (neste ou em outro worker) derrubam a entrada
+subscribe("users", _on_users_invalidated)
+
+
+def invalidate_principal(user_id) -> None:
+    """Remove o usuário do cache de autenticação deste worker"""
+    _principal_cache.pop(str(user_id))
+
+
+def load_principal(db: Session, user_id: str) -> Optional[Principal]:
+    """
+    Obtém o usuário autenticado, consultando o banco só em cache miss
+
+    Args:
+        db: Sessão do banco
+        user_id: Valor do claim ``sub``
+
+    Returns:
+        Principal ou None se o usuário não existir
+    """
+    principal = _principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+
+    from app.models.user import User
+    version = table_version("users")
+    user = db.query(User).filter(User.id == user_id).first()
+    if user is None:
+        return None
+    principal = Principal.from_user(user)
+    # Não guarda se users mudou durante a consulta (valor possivelmente antigo)
+    if table_version("users") == version:
+        _principal_cache.set(user_id, principal)
+    return principal
+
+
+async def load_principal_async(db: AsyncSession, user_id: str) -> Optional[Principal]:
+    """Versão de ``load_principal`` para sessões async"""
+    principal = _principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+
+    from app.models.user import User
+    version = table_version("users")
+    user = await db.get(User, _as_uuid(user_id))
+    if user is None:
+        return None
+    principal = Principal.from_user(user)
+    if table_version("users") == version:
+        _principal_cache.set(user_id, principal)
+    return principal
+
+
+def _as_uuid(value: str) -> Optional[UUID]:
+    try:
+        return UUID(str(value))
+    except ValueError:
+        return None
+
+
 # ============================================================================
 # AUTHENTICATION DEPENDENCY
 # ============================================================================
 
+# Usuário autenticado da requisição atual (read-your-writes do roteamento de leitura)
+_request_user_id: ContextVar[Optional[str]] = ContextVar("request_user_id", default=None)
+
+
+def request_user_id() -> Optional[str]:
+    """Id do usuário autenticado na requisição atual, se houver"""
+    return _request_user_id.get()
+
+
+def revocation_unavailable_error() -> HTTPException:
+    """503 para quando a lista de revogação não pôde ser carregada"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Autenticação temporariamente indisponível",
+        headers={"Retry-After": "5"},
+    )
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-):
+    db: AsyncSession = Depends(get_async_db)
+) -> Principal:
     """
     Dependency para obter usuário autenticado
 
@@ -195,9 +386,20 @@ async def get_current_user(
             detail="Token inválido"
         )
 
-    # Buscar usuário no banco
-    from app.models.user import User
-    user = db.query(User).filter(User.id == user_id).first()
+    # Token revogado (logout); verificação em memória
+    try:
+        revoked = await revocation_store.is_revoked_async(payload.get("jti"))
+    except RevocationUnavailable:
+        raise revocation_unavailable_error()
+    if revoked:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token revogado",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    # Buscar usuário (cache por worker, banco apenas em cache miss)
+    user = await load_principal_async(db, user_id)
 
     if user is None:
         raise HTTPException(
@@ -211,6 +413,7 @@ async def get_current_user(
             detail="Usuário inativo"
         )
 
+    _request_user_id.set(str(user.id))
     return user
 
 
@@ -293,6 +496,55 @@ def require_admin_gestao(current_user = Depends(get_current_user)):
 # FIELD-LEVEL RBAC
 # ============================================================================
 
+def _mask_constant(value) -> str:
+    return "***"
+
+
+@dataclass(frozen=True)
+class MaskingPlan:
+    """
+    Plano de mascaramento pré-compilado para (entidade, role, dados próprios)
+
+    ``masks`` associa cada campo restrito à função que produz o valor
+    mascarado. Campos fora do plano são devolvidos como estão.
+    """
+    entity: str
+    role: str
+    is_own_data: bool
+    masks: Mapping[str, Callable[[object], object]]
+    mask_all: bool = False
+
+    @property
+    def hidden(self) -> frozenset:
+        """Campos restritos (vazio se nada é mascarado)"""
+        return frozenset(self.masks)
+
+    @property
+    def is_noop(self) -> bool:
+        return not self.masks and not self.mask_all
+
+    def apply(self, data: dict) -> dict:
+        """Mascara os campos restritos de um dicionário em uma passada"""
+        if self.mask_all:
+            return {field: "***" for field in data}
+        if not self.masks:
+            return data
+        filtered = dict(data)
+        for field, mask in self.masks.items():
+            if field in filtered:
+                filtered[field] = mask(filtered[field])
+        return filtered
+
+    def redact(self) -> dict:
+        """
+        Valores que substituem os campos restritos em respostas tipadas
+
+        Os schemas validam tipos (EmailStr, date, Decimal), então nas
+        respostas JSON os campos restritos saem como None em vez de "***".
+        """
+        return dict.fromkeys(self.masks)
+
+
 class FieldAccessControl:
     """
     Controle de acesso a nível de campo
@@ -300,21 +552,33 @@ class FieldAccessControl:
     Define quais campos cada role pode ver/editar
     """
 
+    # Roles sem restrição de campo
+    FULL_ACCESS_ROLES = ("admin", "diretoria")
+
     # Campos sensíveis por entidade
     SENSITIVE_FIELDS = {
-        "employee.py": {
+        "employee": {
             "cpf": ["diretoria", "gerente"],
             "rg": ["diretoria", "gerente"],
             "data_nascimento": ["diretoria", "gerente"],
             "telefone_pessoal": ["diretoria", "gerente"],
             "email_pessoal": ["diretoria", "gerente"],
             "endereco": ["diretoria", "gerente"],
+            "endereco_completo": ["diretoria", "gerente"],
+            "salario_atual": ["diretoria", "gerente"],
+            "ultima_alteracao_salarial": ["diretoria", "gerente"],
+            "observacoes_internas": ["diretoria", "gerente"],
         },
         "salary": ["diretoria", "gerente"],  # Todo o objeto é sensível
         "pdi": ["diretoria", "gerente"],  # Apenas gerente e diretoria
         "one_to_one": ["diretoria", "gerente"],
     }
 
+    # Campos que o próprio colaborador sempre vê
+    OWN_PUBLIC_FIELDS = {
+        "employee": ("email_corporativo", "telefone_corporativo", "cargo"),
+    }
+
     @classmethod
     def can_access_field(
         cls,
@@ -327,7 +591,7 @@ class FieldAccessControl:
         Verifica se usuário pode acessar campo
 
         Args:
-            entity: Nome da entidade (employee.py, salary, etc)
+            entity: Nome da entidade (employee, salary, etc)
             field: Nome do campo
             user_role: Role do usuário
             is_own_data: Se são dados do próprio usuário
@@ -335,28 +599,49 @@ class FieldAccessControl:
         Returns:
             bool: True se pode acessar
         """
-        # Diretoria sempre pode
-        if user_role == "diretoria":
+        # Admin e diretoria sempre podem
+        if user_role in cls.FULL_ACCESS_ROLES:
             return True
 
         # Próprios dados (alguns campos)
-        if is_own_data and entity == "employee.py":
-            public_fields = ["email_corporativo", "telefone_corporativo", "cargo"]
-            if field in public_fields:
-                return True
+        if is_own_data and field in cls.OWN_PUBLIC_FIELDS.get(entity, ()):
+            return True
 
         # Verificar regras específicas
-        if entity in cls.SENSITIVE_FIELDS:
-            if isinstance(cls.SENSITIVE_FIELDS[entity], dict):
-                allowed_roles = cls.SENSITIVE_FIELDS[entity].get(field, [])
-                return user_role in allowed_roles
-            else:
-                # Entity inteira é sensível
-                allowed_roles = cls.SENSITIVE_FIELDS[entity]
-                return user_role in allowed_roles
-
-        # Campo não é sensível
-        return True
+        rules = cls.SENSITIVE_FIELDS.get(entity)
+        if rules is None:
+            # Campo não é sensível
+            return True
+        if isinstance(rules, dict):
+            allowed_roles = rules.get(field)
+            return allowed_roles is None or user_role in allowed_roles
+        # Entity inteira é sensível
+        return user_role in rules
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def masking_plan(cls, entity: str, user_role: str, is_own_data: bool = False) -> MaskingPlan:
+        """
+        Plano de mascaramento para a combinação (entidade, role, dados próprios)
+
+        As regras são avaliadas uma vez por combinação; aplicar o plano não
+        consulta SENSITIVE_FIELDS nem chama can_access_field por campo.
+        """
+        rules = cls.SENSITIVE_FIELDS.get(entity)
+        if isinstance(rules, list):
+            mask_all = not cls.can_access_field(entity, "*", user_role, is_own_data)
+            return MaskingPlan(entity, user_role, is_own_data, MappingProxyType({}), mask_all)
+
+        masks = {}
+        for field in rules or ():
+            if not cls.can_access_field(entity, field, user_role, is_own_data):
+                if settings.MASK_CPF and field == "cpf":
+                    masks[field] = cls.mask_cpf
+                elif settings.MASK_SALARY and field == "salario_atual":
+                    masks[field] = cls.mask_salary
+                else:
+                    masks[field] = _mask_constant
+        return MaskingPlan(entity, user_role, is_own_data, MappingProxyType(masks))
 
     @classmethod
     def filter_sensitive_fields(
@@ -378,17 +663,7 @@ class FieldAccessControl:
         Returns:
             dict: Dados filtrados
         """
-        filtered = data.copy()
-
-        for field in list(filtered.keys()):
-            if not cls.can_access_field(entity, field, user_role, is_own_data):
-                # Mascarar campo
-                if settings.MASK_CPF and field == "cpf":
-                    filtered[field] = cls.mask_cpf(filtered[field])
-                else:
-                    filtered[field] = "***"
-
-        return filtered
+        return cls.masking_plan(entity, user_role, is_own_data).apply(data)
 
     @staticmethod
     def mask_cpf(cpf: str) -> str:
@@ -444,19 +719,15 @@ async def log_access(
 
 
 # ============================================================================
-# RATE LIMITING (Simples)
+# RATE LIMITING
 # ============================================================================
 
-from collections import defaultdict
-from time import time
-
-# Cache de requisições por IP
-request_counts = defaultdict(list)
-
-
 def check_rate_limit(request: Request, limit: int = 60, window: int = 60):
     """
-    Verifica rate limit simples por IP
+    Verifica rate limit por IP (janela deslizante, ver app.core.rate_limit)
+
+    O limite global já é aplicado pelo RateLimitMiddleware; use esta função
+    para limites adicionais dentro de um endpoint específico.
 
     Args:
         request: Request do FastAPI
@@ -466,89 +737,60 @@ def check_rate_limit(request: Request, limit: int = 60, window: int = 60):
     Raises:
         HTTPException: Se exceder limite
     """
+    from app.core.rate_limit import Limit, client_ip, get_backend
+
     if not request.client:
         return
 
-    ip = request.client.host
-    now = time()
-
-    # Limpar requests antigos
-    request_counts[ip] = [
-        timestamp for timestamp in request_counts[ip]
-        if now - timestamp < window
-    ]
-
-    # Verificar limite
-    if len(request_counts[ip]) >= limit:
+    key = f"{client_ip(request.scope)}:{request.url.path}"
+    decision = get_backend().hit(key, [Limit(limit, window)])
+    if not decision.allowed:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail=f"Rate limit excedido. Máximo {limit} requisições por {window}s"
+            detail=f"Rate limit excedido. Máximo {limit} requisições por {window}s",
+            headers={"Retry-After": str(decision.retry_after)},
         )
 
-    # Registrar request
-    request_counts[ip].append(now)
-
 
 # ============================================================================
 # HELPERS DE AUTORIZAÇÃO
 # ============================================================================
 
-def can_manage_employee(current_user, target_employee) -> bool:
+def can_manage_employee(current_user, target_employee, db: Optional[Session] = None) -> bool:
     """
     Verifica se usuário pode gerenciar colaborador
 
     Args:
         current_user: Usuário atual
         target_employee: Colaborador alvo
+        db: Sessão do banco (opcional, usada só se o escopo não estiver em cache)
 
     Returns:
         bool: True se pode gerenciar
     """
-    # Diretoria pode tudo
-    if current_user.role == "diretoria":
-        return True
-
-    # Gerente pode gerenciar subordinados
-    if current_user.role == "gerente":
-        from app.models.employee import Employee
-        # Verificar se current_user é gerente do target_employee
-        if hasattr(current_user, 'employee.py'):
-            return target_employee.manager_id == current_user.employee.id
+    from app.services.manager_scope import ManagerScopeService
 
-    # Próprio usuário pode ver seus dados (mas não sensíveis)
-    if hasattr(current_user, 'employee.py'):
-        return current_user.employee.id == target_employee.id
+    # Diretoria pode tudo; gerente, os colaboradores da sua árvore;
+    # o próprio usuário pode ver seus dados (mas não sensíveis)
+    scope = ManagerScopeService.resolve(db, current_user)
+    return scope.can_see(target_employee.id)
 
-    return False
 
-
-def is_manager_of(current_user, employee_id: str) -> bool:
+def is_manager_of(current_user, employee_id: str, db: Optional[Session] = None) -> bool:
     """
     Verifica se usuário é gerente de um colaborador
 
     Args:
         current_user: Usuário atual
         employee_id: ID do colaborador
+        db: Sessão do banco (opcional, usada só se o escopo não estiver em cache)
 
     Returns:
         bool: True se é gerente
     """
-    if current_user.role == "diretoria":
-        return True
-
-    if current_user.role == "gerente" and hasattr(current_user, 'employee.py'):
-        from app.models.employee import Employee
-        from app.database import SessionLocal
+    from app.services.manager_scope import ManagerScopeService
 
-        db = SessionLocal()
-        try:
-            employee = db.query(Employee).filter(Employee.id == employee_id).first()
-            if employee:
-                return employee.manager_id == current_user.employee.id
-        finally:
-            db.close()
-
-    return False
+    return ManagerScopeService.resolve(db, current_user).manages(employee_id)
 
 
 # ============================================================================
@@ -619,7 +861,11 @@ def refresh_access_token(refresh_token: str, db: Session) -> dict:
 
     # Obter user_id
     user_id = payload.get("sub")
-    if not user_id:
+    try:
+        revoked = revocation_store.is_revoked(payload.get("jti"))
+    except RevocationUnavailable:
+        raise revocation_unavailable_error()
+    if not user_id or revoked:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token inválido"
@@ -641,6 +887,9 @@ def refresh_access_token(refresh_token: str, db: Session) -> dict:
     )
     new_refresh_token = create_refresh_token(str(user.id))
 
+    # Rotação: o refresh token usado não vale mais
+    revoke_token_payload(db, payload)
+
     return {
         "access_token": new_access_token,
         "refresh_token": new_refresh_token,
@@ -649,34 +898,55 @@ def refresh_access_token(refresh_token: str, db: Session) -> dict:
 
 
 # ============================================================================
-# LOGOUT / TOKEN BLACKLIST (Simples)
+# LOGOUT / REVOGAÇÃO DE TOKENS
 # ============================================================================
 
-# Em produção, usar Redis ou cache distribuído
-blacklisted_tokens = set()
+def revoke_token_payload(db: Session, payload: dict) -> bool:
+    """
+    Revoga o token descrito pelo payload (precisa dos claims jti e exp)
+
+    Returns:
+        bool: False se o token não tiver jti (emitido antes da revogação existir)
+    """
+    jti = payload.get("jti")
+    exp = payload.get("exp")
+    if not jti or not exp:
+        return False
+    revocation_store.revoke(
+        db,
+        jti,
+        datetime.fromtimestamp(exp, tz=timezone.utc),
+        user_id=UUID(payload["sub"]) if payload.get("sub") else None,
+    )
+    return True
 
 
-def blacklist_token(token: str):
+def blacklist_token(token: str, db: Session):
     """
-    Adiciona token à blacklist
+    Revoga um token JWT
 
     Args:
         token: Token a invalidar
+        db: Sessão do banco
     """
-    blacklisted_tokens.add(token)
+    return revoke_token_payload(db, decode_token(token))
 
 
 def is_token_blacklisted(token: str) -> bool:
     """
-    Verifica se token está na blacklist
+    Verifica se token foi revogado
 
     Args:
         token: Token a verificar
 
     Returns:
-        bool: True se está na blacklist
+        bool: True se foi revogado
     """
-    return token in blacklisted_tokens
+    try:
+        payload = jwt.get_unverified_claims(token)
+    except JWTError:
+        return False
+    return revocation_store.is_revoked(payload.get("jti"))
 
 
 # ============================================================================
@@ -686,23 +956,33 @@ def is_token_blacklisted(token: str) -> bool:
 __all__ = [
     'hash_password',
     'verify_password',
+    'hash_password_async',
+    'verify_password_async',
     'validate_password_strength',
     'create_access_token',
     'create_refresh_token',
     'decode_token',
+    'Principal',
+    'load_principal',
+    'load_principal_async',
+    'request_user_id',
+    'invalidate_principal',
     'get_current_user',
     'get_current_active_user',
+    'revocation_unavailable_error',
     'RoleChecker',
     'require_diretoria',
     'require_gerente_or_above',
     'require_admin_gestao',
     'FieldAccessControl',
+    'MaskingPlan',
     'log_access',
     'check_rate_limit',
     'can_manage_employee',
     'is_manager_of',
     'check_ip_whitelist',
     'refresh_access_token',
+    'revoke_token_payload',
     'blacklist_token',
     'is_token_blacklisted',
 ]
\ No newline at end of file
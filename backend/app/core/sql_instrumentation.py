@@ -0,0 +1,181 @@
+"""
+Instrumentação de SQL por requisição
+Quantidade de consultas, tempo no banco e detecção de N+1
+
+Com SHOW_SQL_QUERIES, cada requisição HTTP ganha um ``RequestQueries`` em uma
+ContextVar. Os eventos ``before/after_cursor_execute`` (registrados na classe
+Engine, valem para o engine síncrono e para o asyncpg) acumulam nele o número
+de consultas, o tempo gasto e quantas vezes cada formato de SQL se repetiu.
+
+Consultas acima de SLOW_QUERY_THRESHOLD_MS vão para o buffer de consultas
+lentas (``app.core.diagnostics``), com a rota da requisição quando houver.
+
+Ao fim da requisição o middleware:
+    - acrescenta ``Server-Timing: db;dur=…, app;dur=…`` à resposta
+    - registra no log a lista de consultas (nível DEBUG) e um resumo (INFO)
+    - avisa (WARNING) quando um mesmo formato se repete SQL_N_PLUS_ONE_THRESHOLD
+      vezes ou mais, o padrão típico de N+1
+
+Endpoints síncronos rodam no threadpool com uma cópia do contexto, então as
+consultas feitas lá também entram na conta. Threads próprias (estatísticas
+de login, cache bus) ficam de fora.
+"""
+from __future__ import annotations
+
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import settings
+from app.core.diagnostics import slow_queries
+
+logger = logging.getLogger(__name__)
+
+_START_KEY = "sql_instrumentation_start"
+
+# Listas de parâmetros expandidas (IN ($1, $2, …), VALUES (…), (…)) viram um
+# único marcador para que a mesma consulta com N ids conte como um formato
+_PARAM_LIST = re.compile(r"\(\s*(?:\$\d+|%\(\w+\)s|\?)(?:\s*(?:::\w+)?\s*,\s*(?:\$\d+|%\(\w+\)s|\?))*(?:::\w+)?\s*\)")
+_PARAM = re.compile(r"\$\d+|%\(\w+\)s")
+_SPACES = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Formato da consulta, sem valores de parâmetros"""
+    shape = _PARAM_LIST.sub("(?)", statement)
+    shape = _PARAM.sub("?", shape)
+    return _SPACES.sub(" ", shape).strip()
+
+
+@dataclass
+class RequestQueries:
+    """Consultas de uma requisição"""
+
+    scope: Scope
+    count: int = 0
+    db_time: float = 0.0  # segundos
+    shapes: Counter = field(default_factory=Counter)
+    queries: List[Tuple[float, str]] = field(default_factory=list)
+
+    @property
+    def route(self) -> str:
+        route = self.scope.get("route")
+        path = getattr(route, "path", None) or self.scope.get("path", "")
+        return f"{self.scope.get('method', '')} {path}"
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.db_time += elapsed
+        self.shapes[statement_shape(statement)] += 1
+        self.queries.append((elapsed, statement))
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Formatos executados ``threshold`` vezes ou mais (prováveis N+1)"""
+        return [(shape, total) for shape, total in self.shapes.most_common() if total >= threshold]
+
+
+_current: ContextVar[Optional[RequestQueries]] = ContextVar("request_queries", default=None)
+
+
+def current_queries() -> Optional[RequestQueries]:
+    """Consultas da requisição atual (None fora de uma requisição instrumentada)"""
+    return _current.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if settings.SLOW_QUERY_LOG_ENABLED or _current.get() is not None:
+        conn.info.setdefault(_START_KEY, []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get(_START_KEY)
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    queries = _current.get()
+    if queries is not None and settings.SHOW_SQL_QUERIES:
+        queries.record(statement, elapsed)
+    if (
+        settings.SLOW_QUERY_LOG_ENABLED
+        and elapsed * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS
+        and not statement.lstrip().upper().startswith("EXPLAIN")
+    ):
+        slow_queries.record(
+            statement,
+            parameters,
+            elapsed,
+            queries.route if queries is not None else None,
+            conn.dialect.paramstyle,
+            executemany,
+        )
+
+
+def _server_timing(queries: RequestQueries, total: float) -> bytes:
+    db_ms = queries.db_time * 1000
+    app_ms = max(total * 1000 - db_ms, 0.0)
+    return f'db;dur={db_ms:.1f};desc="{queries.count} queries", app;dur={app_ms:.1f}'.encode()
+
+
+def _report(queries: RequestQueries, total: float) -> None:
+    if logger.isEnabledFor(logging.DEBUG):
+        for elapsed, statement in queries.queries:
+            logger.debug(f"[{queries.route}] {elapsed * 1000:.1f}ms {_SPACES.sub(' ', statement)}")
+    if queries.count:
+        logger.info(
+            f"[{queries.route}] {queries.count} consultas, "
+            f"db {queries.db_time * 1000:.1f}ms de {total * 1000:.1f}ms"
+        )
+    for shape, repetitions in queries.repeated(settings.SQL_N_PLUS_ONE_THRESHOLD):
+        logger.warning(f"[{queries.route}] possível N+1: {repetitions}x {shape[:300]}")
+
+
+class SQLInstrumentationMiddleware:
+    """
+    Middleware ASGI que mede as consultas de cada requisição
+
+    Com SHOW_SQL_QUERIES, mede e reporta; só com SLOW_QUERY_LOG_ENABLED,
+    apenas identifica a rota para o buffer de consultas lentas. Sem nenhum
+    dos dois, repassa a requisição sem custo.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not (settings.SHOW_SQL_QUERIES or settings.SLOW_QUERY_LOG_ENABLED):
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries(scope)
+        token = _current.set(queries)
+        if not settings.SHOW_SQL_QUERIES:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                _current.reset(token)
+            return
+
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _server_timing(queries, time.perf_counter() - started)))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            _report(queries, time.perf_counter() - started)
@@ -0,0 +1,204 @@
+"""
+Revogação de tokens JWT
+Conjunto de jti revogados em memória, sincronizado pelo banco
+
+Cada worker mantém ``jti -> expiração`` e um heap por expiração para
+descartar as entradas cujo token já expiraria de qualquer forma. A fonte da
+verdade é a tabela ``revoked_tokens``: o conjunto é carregado uma vez,
+recarregado a cada CACHE_TTL_SECONDS e atualizado pelas invalidações da
+tabela (inclusive as vindas de outros workers via LISTEN/NOTIFY). A
+verificação em cada requisição não consulta o banco.
+
+Só a primeira carga bloqueia (``is_revoked_async`` a faz no threadpool); as
+recargas rodam em uma thread própria enquanto o conjunto atual continua
+valendo. Falhas de carga são registradas e a nova tentativa espera um
+intervalo crescente (até CACHE_TTL_SECONDS). Sem nenhuma carga bem-sucedida
+não há como responder: ``is_revoked`` levanta ``RevocationUnavailable`` em
+vez de aceitar o token.
+"""
+from __future__ import annotations
+
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.cache import invalidate_tables, subscribe
+from app.database import SessionLocal
+from app.models.revoked_token import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+_MIN_RETRY_SECONDS = 1.0
+
+
+class RevocationUnavailable(RuntimeError):
+    """Conjunto de revogações nunca carregado (banco inacessível)"""
+
+
+class TokenRevocationStore:
+    def __init__(self) -> None:
+        self._expiry: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self._fresh_until = 0.0
+        self._retry_at = 0.0
+        self._retry_delay = _MIN_RETRY_SECONDS
+        self._refreshing = False
+
+    # ------------------------------------------------------------------ #
+    # Consulta
+    # ------------------------------------------------------------------ #
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        """
+        Raises:
+            RevocationUnavailable: Se o conjunto nunca pôde ser carregado
+        """
+        if not jti:
+            return False
+        self._ensure_loaded()
+        now = time.time()
+        with self._lock:
+            self._purge(now)
+            expires_at = self._expiry.get(jti)
+        return expires_at is not None and expires_at > now
+
+    async def is_revoked_async(self, jti: Optional[str]) -> bool:
+        """``is_revoked`` sem bloquear o event loop na primeira carga"""
+        if jti and not self._loaded:
+            await run_in_threadpool(self._ensure_loaded)
+        return self.is_revoked(jti)
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+    # ------------------------------------------------------------------ #
+    # Revogação
+    # ------------------------------------------------------------------ #
+
+    def revoke(self, db: Session, jti: str, expires_at: datetime, user_id=None) -> None:
+        """
+        Revoga o token e remove do banco as revogações já expiradas
+
+        Args:
+            db: Sessão do banco (faz commit)
+            jti: Identificador do token
+            expires_at: Expiração do token (claim exp)
+            user_id: Dono do token, para auditoria
+        """
+        now = datetime.now(timezone.utc)
+        db.execute(
+            pg_insert(RevokedToken)
+            .values(jti=jti, expires_at=expires_at, user_id=user_id)
+            .on_conflict_do_nothing(index_elements=[RevokedToken.jti])
+        )
+        db.query(RevokedToken).filter(RevokedToken.expires_at < now).delete(synchronize_session=False)
+        db.commit()
+        self._add(jti, expires_at.timestamp())
+        # Comando via Core: avisa explicitamente os demais workers
+        invalidate_tables("revoked_tokens", keys=[jti])
+
+    # ------------------------------------------------------------------ #
+    # Sincronização
+    # ------------------------------------------------------------------ #
+
+    def on_invalidate(self, table: str, keys: Optional[frozenset]) -> None:
+        if keys is None:
+            # Recarga completa na próxima verificação, sem bloquear
+            self._fresh_until = 0.0
+            return
+        with self._lock:
+            unknown = [jti for jti in keys if jti not in self._expiry]
+        if unknown:
+            self._load(unknown)
+
+    def _ensure_loaded(self) -> None:
+        now = time.monotonic()
+        if self._loaded:
+            if now > self._fresh_until and now >= self._retry_at:
+                self._refresh_in_background()
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            if now < self._retry_at or not self._load():
+                raise RevocationUnavailable("Lista de tokens revogados indisponível")
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name="token-revocation-refresh", daemon=True).start()
+
+    def _refresh(self) -> None:
+        try:
+            with self._load_lock:
+                self._load()
+        finally:
+            self._refreshing = False
+
+    def _load(self, jtis: Optional[Iterable[str]] = None) -> bool:
+        now = datetime.now(timezone.utc)
+        db = SessionLocal()
+        try:
+            query = db.query(RevokedToken.jti, RevokedToken.expires_at).filter(RevokedToken.expires_at > now)
+            if jtis is not None:
+                query = query.filter(RevokedToken.jti.in_(list(jtis)))
+            rows = query.all()
+        except Exception as exc:
+            if jtis is None:
+                # Mantém o conjunto atual e espera antes de tentar de novo
+                self._retry_at = time.monotonic() + self._retry_delay
+                self._retry_delay = min(self._retry_delay * 2, max(settings.CACHE_TTL_SECONDS, _MIN_RETRY_SECONDS))
+            logger.error(f"Erro ao carregar tokens revogados: {exc}")
+            return False
+        finally:
+            db.close()
+
+        if jtis is None:
+            expiry = {jti: expires_at.timestamp() for jti, expires_at in rows}
+            with self._lock:
+                # Revogações feitas durante a leitura (revoke local ou aviso de
+                # outro worker) não estão no snapshot; revogação só sai do
+                # conjunto ao expirar, então as entradas atuais vigentes entram
+                # também
+                wall_now = time.time()
+                for jti, expires_at in self._expiry.items():
+                    if expires_at > wall_now:
+                        expiry.setdefault(jti, expires_at)
+                heap = [(expires_at, jti) for jti, expires_at in expiry.items()]
+                heapq.heapify(heap)
+                self._expiry, self._heap = expiry, heap
+            self._fresh_until = time.monotonic() + settings.CACHE_TTL_SECONDS
+            self._retry_delay = _MIN_RETRY_SECONDS
+            self._loaded = True
+        else:
+            for jti, expires_at in rows:
+                self._add(jti, expires_at.timestamp())
+        return True
+
+    def _add(self, jti: str, expires_at: float) -> None:
+        with self._lock:
+            if jti not in self._expiry:
+                self._expiry[jti] = expires_at
+                heapq.heappush(self._heap, (expires_at, jti))
+
+    def _purge(self, now: float) -> None:
+        while self._heap and self._heap[0][0] <= now:
+            _, jti = heapq.heappop(self._heap)
+            self._expiry.pop(jti, None)
+
+
+revocation_store = TokenRevocationStore()
+subscribe("revoked_tokens", revocation_store.on_invalidate)
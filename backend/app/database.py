@@ -4,26 +4,44 @@ Supabase PostgreSQL via SQLAlchemy
 """
 
 from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import NullPool, QueuePool
 from contextlib import contextmanager
-from typing import Generator
+from typing import AsyncGenerator, Generator, Optional, Tuple
 import logging
+import threading
+import time
 
 from app.config import settings
 from app.models.base import Base
+from app.core import cache  # noqa: F401  (registra a invalidação de cache nos commits)
+from app.core.metrics import (
+    InstrumentedAsyncQueuePool,
+    InstrumentedQueuePool,
+    InstrumentedReplicaAsyncQueuePool,
+    InstrumentedReplicaQueuePool,
+)
 
 logger = logging.getLogger(__name__)
 
 # Engine
 DATABASE_URL = settings.DATABASE_URL
 
+
+def _pool_options(poolclass, pool_size: int, max_overflow: int) -> dict:
+    """Pool do engine; em testes, NullPool (que não aceita tamanho nem overflow)"""
+    if settings.ENVIRONMENT == "test":
+        return {"poolclass": NullPool}
+    return {"poolclass": poolclass, "pool_size": pool_size, "max_overflow": max_overflow}
+
+
 engine = create_engine(
     DATABASE_URL,
-    poolclass=NullPool if settings.ENVIRONMENT == "test" else None,
+    # QueuePool com métricas de uso e de espera (ver app.core.metrics)
+    **_pool_options(InstrumentedQueuePool, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW),
     pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20,
     pool_recycle=3600,
     echo=settings.DEBUG,
     future=True,
@@ -50,6 +68,96 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+# ============================================================================
+# ASYNC (asyncpg)
+# ============================================================================
+
+def _async_database_url(url: str):
+    """Converte a URL do engine síncrono para o driver asyncpg"""
+    async_url = make_url(url).set(drivername="postgresql+asyncpg")
+    query = dict(async_url.query)
+    # asyncpg não entende sslmode; o equivalente é o parâmetro ssl
+    sslmode = query.pop("sslmode", None)
+    if sslmode and "ssl" not in query:
+        query["ssl"] = sslmode
+    return async_url.set(query=query)
+
+
+async_engine = create_async_engine(
+    _async_database_url(DATABASE_URL),
+    **_pool_options(InstrumentedAsyncQueuePool, settings.DB_ASYNC_POOL_SIZE, settings.DB_ASYNC_MAX_OVERFLOW),
+    pool_pre_ping=True,
+    pool_recycle=3600,
+    echo=settings.DEBUG,
+    # Sem prepared statements em cache: compatível com o pooler (PgBouncer) do Supabase
+    connect_args={"statement_cache_size": 0, "prepared_statement_cache_size": 0},
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency para endpoints async: sessão que não bloqueia o event loop
+
+    Relacionamentos não podem ser carregados sob demanda (lazy load) fora de
+    ``await``; use joinedload/selectinload nas consultas.
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Database error: {e}")
+            raise
+
+
+# ============================================================================
+# RÉPLICA DE LEITURA (opcional)
+# ============================================================================
+# O roteamento (lag, read-your-writes, fallback) fica em app.core.replica
+
+DATABASE_REPLICA_URL = settings.DATABASE_REPLICA_URL
+
+replica_engine = None
+ReplicaSessionLocal = None
+async_replica_engine = None
+AsyncReplicaSessionLocal = None
+
+if DATABASE_REPLICA_URL:
+    replica_engine = create_engine(
+        DATABASE_REPLICA_URL,
+        **_pool_options(InstrumentedReplicaQueuePool, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW),
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        echo=settings.DEBUG,
+        future=True,
+    )
+    ReplicaSessionLocal = sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        bind=replica_engine,
+        expire_on_commit=False
+    )
+    async_replica_engine = create_async_engine(
+        _async_database_url(DATABASE_REPLICA_URL),
+        **_pool_options(InstrumentedReplicaAsyncQueuePool, settings.DB_ASYNC_POOL_SIZE, settings.DB_ASYNC_MAX_OVERFLOW),
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        echo=settings.DEBUG,
+        connect_args={"statement_cache_size": 0, "prepared_statement_cache_size": 0},
+    )
+    AsyncReplicaSessionLocal = async_sessionmaker(
+        async_replica_engine,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+
 def check_database_connection() -> dict:
     """Verifica saúde da conexão com banco"""
     try:
@@ -81,6 +189,60 @@ def check_database_connection() -> dict:
         }
 
 
+# ============================================================================
+# READINESS (probes do orquestrador)
+# ============================================================================
+
+_ready_lock = threading.Lock()
+_ready_cache: Optional[Tuple[float, dict]] = None
+
+
+def pool_status() -> dict:
+    """Uso do pool do engine síncrono (sem I/O)"""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"class": type(pool).__name__}
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    checked_out = pool.checkedout()
+    return {
+        "size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_out": checked_out,
+        "overflow": pool.overflow(),
+        "saturation": round(checked_out / capacity, 3) if capacity else 0.0,
+    }
+
+
+def check_database_ready() -> dict:
+    """
+    Readiness do banco: ``SELECT 1`` em cache por HEALTH_READY_CACHE_SECONDS
+
+    Com o pool acima de HEALTH_POOL_SATURATION_THRESHOLD, responde não pronto
+    sem consultar o banco (a consulta esperaria uma conexão livre). Só uma
+    thread por processo consulta o banco quando o cache vence.
+    """
+    global _ready_cache
+    pool = pool_status()
+    if pool.get("saturation", 0.0) >= settings.HEALTH_POOL_SATURATION_THRESHOLD:
+        return {"status": "not_ready", "reason": "pool_saturated", "pool": pool}
+
+    now = time.monotonic()
+    cached = _ready_cache
+    if cached is None or now - cached[0] >= settings.HEALTH_READY_CACHE_SECONDS:
+        with _ready_lock:
+            cached = _ready_cache
+            if cached is None or now - cached[0] >= settings.HEALTH_READY_CACHE_SECONDS:
+                try:
+                    with engine.connect() as conn:
+                        conn.execute(text("SELECT 1"))
+                    result = {"status": "ready"}
+                except Exception as e:
+                    logger.error(f"Database readiness check failed: {e}")
+                    result = {"status": "not_ready", "reason": "database_unavailable", "error": str(e)}
+                cached = _ready_cache = (time.monotonic(), result)
+    return {**cached[1], "checked_at_age_s": round(time.monotonic() - cached[0], 3), "pool": pool}
+
+
 def init_database():
     """Inicializa o banco de dados"""
     try:
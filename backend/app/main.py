@@ -1,27 +1,32 @@
 import sys
 import os
 from datetime import datetime, timezone
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 from sqlalchemy.exc import SQLAlchemyError # Import para erro de DB
 from sqlalchemy.sql import func # Importar func para timestamp
-# Import para o novo health_check
-try:
-    from app.database import check_database_connection
-except ImportError:
-    # Fallback se a função ainda não existir
-    def check_database_connection():
-        return {"status": "error", "message": "check_database_connection not found"}
+from app.config import settings
+from app.core.diagnostics import install_log_buffer
+from app.core.metrics import MetricsMiddleware, mark_process_dead, render_metrics
+from app.core.rate_limit import RateLimitMiddleware
+from app.core.replica import replica_router
+from app.core.security import get_current_user
+from app.core.sql_instrumentation import SQLInstrumentationMiddleware
+# Health checks
+from app.database import check_database_connection, check_database_ready, pool_status
+from app.models.user import User
 
 # ============================================================
 # 🧠 CONFIGURAÇÃO BASE
 # ============================================================
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+# Últimos avisos e erros em memória para /admin/logs
+install_log_buffer()
 
 app = FastAPI(
     title="Gestão 360 - OL Tecnologia",
@@ -40,6 +45,9 @@ origins = [
     # Adicionar outros domínios de frontend se houver (ex: produção)
 ]
 
+# Rate limit antes do CORS: as respostas 429 também recebem os cabeçalhos CORS
+app.add_middleware(RateLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins if origins else ["*"],
@@ -51,6 +59,10 @@ logger.info(f"CORS configurado para permitir origens: {origins if origins else '
 
 app.add_middleware(GZipMiddleware, minimum_size=1000)
 
+# Por último (mais externos): o Server-Timing e a latência cobrem toda a requisição
+app.add_middleware(SQLInstrumentationMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 # ============================================================
 # 📦 IMPORTAÇÃO DOS ROUTERS
 # ============================================================
@@ -90,6 +102,27 @@ app.include_router(pdi_router)
 
 logger.info("✅ Todos os routers incluídos com sucesso.")
 
+# ============================================================
+# 🔄 CICLO DE VIDA
+# ============================================================
+from app.core.cache import start_cache_sync, stop_cache_sync
+from app.services.login_stats import login_stats
+
+
+@app.on_event("startup")
+async def on_startup():
+    # Invalidações de cache feitas pelos outros workers (LISTEN/NOTIFY)
+    start_cache_sync()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    stop_cache_sync()
+    # Grava as estatísticas de login ainda pendentes
+    login_stats.stop()
+    replica_router.stop()
+    mark_process_dead()
+
 # ============================================================
 # 📁 ARQUIVOS ESTÁTICOS
 # ============================================================
@@ -122,18 +155,44 @@ async def root():
         "docs": "/docs",
         "redoc": "/redoc",
         "health": "/health",
+        "liveness": "/health/live",
+        "readiness": "/health/ready",
+    }
+
+@app.get("/health/live", tags=["Sistema"], summary="Liveness", description="Processo no ar (não acessa o banco).")
+async def health_live():
+    return {"status": "alive"}
+
+@app.get("/health/ready", tags=["Sistema"], summary="Readiness", description="Banco acessível (SELECT 1 em cache) e pool com folga.")
+def health_ready():
+    ready = check_database_ready()
+    status_code = 200 if ready["status"] == "ready" else 503
+    return JSONResponse(status_code=status_code, content=ready)
+
+@app.get("/health", tags=["Sistema"], summary="Verificação de Saúde", description="Status da API e do banco (mesma verificação em cache de /health/ready).")
+def health_check():
+    ready = check_database_ready()
+    return {
+        "status": "healthy" if ready["status"] == "ready" else "unhealthy",
+        "version": "2.0.0",
+        "database": ready,
+        "timestamp": datetime.now(timezone.utc).isoformat() # Timestamp dinâmico
     }
 
-@app.get("/health", tags=["Sistema"], summary="Verificação de Saúde", description="Verifica o status da API e do banco de dados.")
-async def health_check():
+@app.get("/health/details", tags=["Sistema"], summary="Saúde detalhada", description="Versão do PostgreSQL, tabelas e pool. Apenas administradores.")
+def health_details(current_user: User = Depends(get_current_user)):
+    if current_user.role not in ["admin", "diretoria"]:
+        raise HTTPException(status_code=403, detail="Acesso negado")
     try:
-        db_status = check_database_connection() # Usando sua nova função
+        db_status = check_database_connection()
         api_status = "healthy" if db_status.get("status") == "healthy" else "unhealthy"
         return {
             "status": api_status,
             "version": "2.0.0",
             "database": db_status,
-            "timestamp": datetime.now(timezone.utc).isoformat() # Timestamp dinâmico
+            "pool": pool_status(),
+            "replica": replica_router.status(),
+            "timestamp": datetime.now(timezone.utc).isoformat()
         }
     except Exception as e:
         logger.error(f"Health check failed: {e}", exc_info=True)
@@ -142,6 +201,14 @@ async def health_check():
             content={"status": "unhealthy", "error": str(e), "database": "check failed"},
         )
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Métricas no formato Prometheus"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
 # ============================================================
 # ⚠️ TRATAMENTO DE EXCEÇÕES GLOBAIS (Versão robusta)
 # ============================================================
@@ -18,6 +18,8 @@ from app.models.audit_log import AuditLog  # MUDANÇA: Adicionado AuditLog
 from app.models.employee_day_off import EmployeeDayOff
 from app.models.one_on_one import EmployeeOneOnOne
 from app.models.pdi_log import EmployeePdiLog
+from app.models.rate_limit_counter import RateLimitCounter
+from app.models.revoked_token import RevokedToken
 
 
 # Exportar todos os models
@@ -39,4 +41,6 @@ __all__ = [
     "EmployeeDayOff",
     "EmployeeOneOnOne",
     "EmployeePdiLog",
+    "RateLimitCounter",
+    "RevokedToken",
 ]
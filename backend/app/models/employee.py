@@ -85,7 +85,7 @@ class Employee(Base):
         foreign_keys=[team_id] # Usar a coluna team_id desta tabela (Employee)
     )
 
-    manager_id = Column(UUID(as_uuid=True), ForeignKey("managers.id"), nullable=True) # ID do Manager que gerencia este Employee
+    manager_id = Column(UUID(as_uuid=True), ForeignKey("managers.id"), nullable=True, index=True) # ID do Manager que gerencia este Employee
     manager = relationship("Manager", back_populates="employees", foreign_keys=[manager_id]) # Ligação para o gestor
 
     # Relacionamento reverso para Manager (quando este Employee é um Manager)
@@ -1,7 +1,9 @@
 import uuid
 import enum
-from sqlalchemy import Column, String, Float, Date, ForeignKey, Text, DateTime, UniqueConstraint
+from datetime import date
+from sqlalchemy import Column, String, Float, Date, ForeignKey, Text, DateTime, UniqueConstraint, Index, text
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.types import Enum as SQLEnum
@@ -16,6 +18,12 @@ class EmployeeKnowledge(Base):
     __tablename__ = "employee_knowledge"
     __table_args__ = (
         UniqueConstraint('employee_id', 'knowledge_id', name='uq_employee_knowledge'),
+        # Índice parcial usado pelo resumo do catálogo e pelos alertas de expiração
+        Index(
+            'ix_employee_knowledge_expiracao_obtido',
+            'data_expiracao',
+            postgresql_where=text("status = 'OBTIDO'"),
+        ),
     )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
@@ -31,7 +39,7 @@ class EmployeeKnowledge(Base):
     data_inicio = Column(Date)
     data_limite = Column(Date)
     data_obtencao = Column(Date)
-    data_expiracao = Column(Date)
+    data_expiracao = Column(Date, index=True)
     certificado_url = Column(String(500), nullable=True)
     observacoes = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -39,6 +47,26 @@ class EmployeeKnowledge(Base):
     employee = relationship("Employee", back_populates="knowledges")
     knowledge = relationship("Knowledge", back_populates="vinculos")
 
+    @hybrid_property
+    def dias_para_expirar(self):
+        """Dias até a expiração (negativo quando vencido); None sem data de expiração."""
+        if self.data_expiracao is None:
+            return None
+        return (self.data_expiracao - date.today()).days
+
+    @dias_para_expirar.expression
+    def dias_para_expirar(cls):
+        # date - date no PostgreSQL resulta em inteiro (dias)
+        return cls.data_expiracao - func.current_date()
+
+    @hybrid_property
+    def vencido(self):
+        return self.data_expiracao is not None and self.data_expiracao < date.today()
+
+    @vencido.expression
+    def vencido(cls):
+        return func.coalesce(cls.data_expiracao < func.current_date(), False)
+
     def to_dict(self):
         """Serializa o vínculo para respostas JSON."""
         status_value = self.status.value if isinstance(self.status, enum.Enum) else self.status
@@ -1,8 +1,8 @@
 import uuid
 import enum
-from sqlalchemy import Column, String, Integer, Text, Numeric, Boolean, DateTime, Enum
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Integer, Text, Numeric, Boolean, DateTime, Enum, Computed, Index
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from app.models.base import Base
 
@@ -14,8 +14,19 @@ class KnowledgeCategoryEnum(str, enum.Enum):
     FORMACAO = "FORMACAO"
 
 
+# Documento de busca textual: nome (peso A), fornecedor/código (B), descrição (C)
+SEARCH_VECTOR_EXPRESSION = (
+    "setweight(to_tsvector('portuguese', coalesce(nome, '')), 'A') || "
+    "setweight(to_tsvector('portuguese', coalesce(fornecedor, '') || ' ' || coalesce(codigo_certificacao, '')), 'B') || "
+    "setweight(to_tsvector('portuguese', coalesce(descricao, '')), 'C')"
+)
+
+
 class Knowledge(Base):
     __tablename__ = "knowledge"
+    __table_args__ = (
+        Index("ix_knowledge_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     nome = Column(String(255), nullable=False, index=True)
@@ -37,6 +48,7 @@ class Knowledge(Base):
     observacoes_internas = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR_EXPRESSION, persisted=True)))
 
     vinculos = relationship("EmployeeKnowledge", back_populates="knowledge", cascade="all, delete-orphan")
 
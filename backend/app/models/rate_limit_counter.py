@@ -0,0 +1,16 @@
+from sqlalchemy import BigInteger, Column, Integer, String
+
+from app.models.base import Base
+
+
+class RateLimitCounter(Base):
+    """Contadores do rate limiter compartilhados entre workers (backend postgres)"""
+
+    __tablename__ = "rate_limit_counters"
+    # UNLOGGED: dado descartável, sem custo de WAL
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+
+    key = Column(String(200), primary_key=True)
+    window_seconds = Column(Integer, primary_key=True)
+    window_start = Column(BigInteger, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
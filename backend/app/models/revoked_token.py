@@ -0,0 +1,21 @@
+"""
+Model de RevokedToken
+Tokens JWT revogados (logout), identificados pelo claim jti.
+"""
+from sqlalchemy import Column, String, DateTime
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+from app.models.base import Base
+
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(String(64), primary_key=True)
+    # Depois desta data o token já é rejeitado pela expiração e a linha pode ser removida
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    user_id = Column(UUID(as_uuid=True), nullable=True)
+    revoked_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<RevokedToken(jti={self.jti}, expires_at={self.expires_at})>"
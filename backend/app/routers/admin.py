@@ -1,14 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
 from uuid import UUID
 
+from app.config import settings
+from app.core.diagnostics import recent_logs, slow_queries
 from app.database import get_db
 from app.models.user import User
 from app.models.employee import Employee
-from app.core.security import get_current_user, hash_password
+from app.core.security import get_current_user, hash_password_async
 from app.schemas.user import UserCreate, UserUpdate, UserResponse
+from app.services.expiry_service import DEFAULT_BATCH_SIZE, ExpiryService
 
 router = APIRouter(prefix="/admin", tags=["Administração"])
 
@@ -133,7 +136,7 @@ async def create_user(
     new_user = User(
         username=user_data.username,
         email=user_data.email,
-        hashed_password=hash_password(user_data.password),
+        hashed_password=await hash_password_async(user_data.password),
         role=user_data.role,
         is_active=user_data.is_active,
         is_admin=user_data.role in ["admin", "diretoria"],
@@ -165,7 +168,7 @@ async def update_user(
     if user_data.email:
         user.email = user_data.email
     if user_data.password:
-        user.hashed_password = hash_password(user_data.password)
+        user.hashed_password = await hash_password_async(user_data.password)
     if user_data.role:
         user.role = user_data.role
         user.is_admin = user_data.role in ["admin", "diretoria"]
@@ -205,6 +208,23 @@ async def delete_user(
 
     return None
 
+# MANUTENÇÃO
+
+@router.post("/maintenance/recompute-expiry")
+def recompute_knowledge_expiry(
+    knowledge_id: Optional[UUID] = None,
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=100, le=10000),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Recalcula data_expiracao dos vínculos a partir da validade do catálogo"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Acesso negado")
+
+    knowledge_ids = [knowledge_id] if knowledge_id else None
+    atualizados = ExpiryService.recompute(db, knowledge_ids=knowledge_ids, batch_size=batch_size)
+    return {"atualizados": atualizados}
+
 # CONFIGURAÇÕES DO SISTEMA
 
 @router.get("/settings")
@@ -232,14 +252,40 @@ async def get_settings(
 @router.get("/logs")
 async def get_system_logs(
     skip: int = 0,
-    limit: int = 50,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    limit: int = Query(50, ge=1, le=500),
+    nivel: Optional[str] = Query(None, description="Nível mínimo (WARNING, ERROR…)"),
+    current_user: User = Depends(get_current_user)
+):
+    """Últimos avisos e erros deste processo (mais recentes primeiro)"""
+    if current_user.role not in ["admin", "diretoria"]:
+        raise HTTPException(status_code=403, detail="Acesso negado")
+
+    return {
+        "nivel_minimo": settings.LOG_BUFFER_LEVEL,
+        "capacidade": settings.LOG_BUFFER_SIZE,
+        "logs": recent_logs.records(skip=skip, limit=limit, level=nivel)
+    }
+
+# DIAGNÓSTICO
+
+@router.get("/diagnostics/slow-queries")
+async def get_slow_queries(
+    limit: int = Query(50, ge=1, le=500),
+    current_user: User = Depends(get_current_user)
 ):
+    """Consultas acima de SLOW_QUERY_THRESHOLD_MS, com parâmetros mascarados e plano"""
     if current_user.role not in ["admin", "diretoria"]:
         raise HTTPException(status_code=403, detail="Acesso negado")
 
     return {
-        "message": "Sistema de logs em desenvolvimento",
-        "logs": []
+        "limite_ms": settings.SLOW_QUERY_THRESHOLD_MS,
+        "ativo": settings.SLOW_QUERY_LOG_ENABLED,
+        "consultas": slow_queries.entries(limit)
     }
+
+@router.delete("/diagnostics/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_slow_queries(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Acesso negado")
+    slow_queries.clear()
+    return None
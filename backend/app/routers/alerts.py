@@ -1,54 +1,46 @@
 from fastapi import APIRouter, HTTPException, Query, Depends
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
 from typing import List, Optional
 from datetime import datetime
 
-from app.database import get_db
+from app.database import get_async_db, get_db
 from app.models.alert import Alert, AlertTypeEnum, AlertPriorityEnum
 from app.schemas.alert import AlertCreate, AlertUpdate, AlertResponse
+from app.core.row_security import get_scoped_async_db, get_scoped_db, rls_bypass
 from app.core.security import get_current_user
 from app.models.user import User
-from app.models.employee import Employee, EmployeeTypeEnum
 from app.services.alert_service import AlertService
+from app.services.manager_scope import ManagerScope, get_direct_manager_scope
 
 router = APIRouter(prefix="/alerts", tags=["Alertas"])
 
 @router.get("/", response_model=List[AlertResponse])
-async def get_alerts(
+def get_alerts(
     alert_type: Optional[AlertTypeEnum] = Query(None),
     priority: Optional[AlertPriorityEnum] = Query(None),
     is_read: Optional[bool] = Query(None),
     employee_id: Optional[str] = Query(None),
     limit: int = Query(default=50, le=200),
     offset: int = Query(default=0),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_scoped_db),
+    scope: ManagerScope = Depends(get_direct_manager_scope)
 ):
-    AlertService.refresh_alerts(db)
+    with rls_bypass(db):
+        AlertService.refresh_alerts(db)
     query = db.query(Alert)
 
     # Authorization logic
-    if not current_user.is_admin:
-        employee = db.query(Employee).filter(Employee.id == current_user.employee_id).first()
-        if not employee:
+    if not scope.unrestricted:
+        if scope.own_employee_id is None:
             raise HTTPException(status_code=404, detail="Employee not found for the current user")
-
-        if employee.tipo_cadastro == EmployeeTypeEnum.DIRETOR:
-            # Directors can see all alerts
-            pass
-        elif employee.tipo_cadastro in [EmployeeTypeEnum.GERENTE, EmployeeTypeEnum.COORDENADOR]:
+        if scope.is_manager:
             # Managers can see alerts for their team
-            manager = employee.manager_profile
-            if manager:
-                managed_employee_ids = [emp.id for emp in manager.employees]
-                query = query.filter(Alert.employee_id.in_(managed_employee_ids))
-            else:
-                # If the user is a manager but has no manager profile, they can only see their own alerts
-                query = query.filter(Alert.employee_id == current_user.employee_id)
+            query = query.filter(scope.filter(Alert.employee_id))
         else:
-            # Collaborators can only see their own alerts
-            query = query.filter(Alert.employee_id == current_user.employee_id)
-
+            # Collaborators (and managers without a manager profile) can only see their own alerts
+            query = query.filter(Alert.employee_id == scope.own_employee_id)
 
     if alert_type:
         query = query.filter(Alert.type == alert_type)
@@ -63,49 +55,54 @@ async def get_alerts(
     return alerts
 
 @router.get("/{alert_id}", response_model=AlertResponse)
-async def get_alert(alert_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    alert = db.query(Alert).filter(Alert.id == alert_id).first()
+async def get_alert(alert_id: int, db: AsyncSession = Depends(get_scoped_async_db), current_user: User = Depends(get_current_user)):
+    alert = await db.get(Alert, alert_id)
     if not alert:
         raise HTTPException(status_code=404, detail="Alerta não encontrado")
     # TODO: Add authorization to check if the user can see this specific alert
     return alert
 
 @router.post("/", response_model=AlertResponse, status_code=201)
-async def create_alert(alert_data: AlertCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def create_alert(alert_data: AlertCreate, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
     # TODO: Add authorization to check if the user can create alerts
     payload = alert_data.model_dump(by_alias=True)
     alert = Alert(**payload, created_at=datetime.now())
     db.add(alert)
-    db.commit()
-    db.refresh(alert)
+    await db.commit()
+    await db.refresh(alert)
     return alert
 
 @router.patch("/{alert_id}/read", response_model=AlertResponse)
-async def mark_alert_as_read(alert_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    alert = db.query(Alert).filter(Alert.id == alert_id).first()
+async def mark_alert_as_read(alert_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    alert = await db.get(Alert, alert_id)
     if not alert:
         raise HTTPException(status_code=404, detail="Alerta não encontrado")
     # TODO: Add authorization to check if the user can mark this alert as read
     alert.is_read = True
-    db.commit()
-    db.refresh(alert)
+    await db.commit()
+    await db.refresh(alert)
     return alert
 
 @router.patch("/read-all")
 async def mark_all_as_read(
     alert_type: Optional[AlertTypeEnum] = Query(None),
     employee_id: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    scope: ManagerScope = Depends(get_direct_manager_scope)
 ):
-    query = db.query(Alert).filter(Alert.is_read == False)
-    # TODO: Add authorization logic similar to get_alerts
+    statement = update(Alert).where(Alert.is_read == False).values(is_read=True)
+    if not scope.unrestricted:
+        if scope.is_manager:
+            statement = statement.where(scope.filter(Alert.employee_id))
+        else:
+            statement = statement.where(Alert.employee_id == scope.own_employee_id)
     if alert_type:
-        query = query.filter(Alert.type == alert_type)
+        statement = statement.where(Alert.type == alert_type)
     if employee_id:
-        query = query.filter(Alert.employee_id == employee_id)
-    updated_count = query.update({Alert.is_read: True})
-    db.commit()
+        statement = statement.where(Alert.employee_id == employee_id)
+    result = await db.execute(statement.execution_options(synchronize_session=False))
+    updated_count = result.rowcount
+    await db.commit()
     return {
         "success": True,
         "message": "Alertas marcados como lidos",
@@ -113,16 +110,16 @@ async def mark_all_as_read(
     }
 
 @router.post("/refresh")
-async def refresh_alerts(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def refresh_alerts(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     total = AlertService.refresh_alerts(db)
     return {"success": True, "total_alerts": total}
 
 @router.delete("/{alert_id}")
-async def delete_alert(alert_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    alert = db.query(Alert).filter(Alert.id == alert_id).first()
+async def delete_alert(alert_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    alert = await db.get(Alert, alert_id)
     if not alert:
         raise HTTPException(status_code=404, detail="Alerta não encontrado")
     # TODO: Add authorization to check if the user can delete this alert
-    db.delete(alert)
-    db.commit()
+    await db.delete(alert)
+    await db.commit()
     return {"success": True, "message": "Alerta deletado com sucesso"}
\ No newline at end of file
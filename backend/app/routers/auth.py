@@ -2,17 +2,22 @@
 Router de Autenticação - Versão com banco, bcrypt e JWT
 """
 from fastapi import APIRouter, HTTPException, status, Request, Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload # MUDANÇA: Importar joinedload
-from datetime import datetime
+from datetime import datetime, timezone
 import logging
 
 from app.dependencies import get_current_user
-from app.database import get_db
+from app.database import get_async_db, get_db
 from app.models.user import User
 from app.models.employee import Employee # MUDANÇA: Importar Employee
-from app.core.security import verify_password
-from app.core.security import create_access_token
+from app.core.security import verify_password_async
+from app.core.security import create_access_token, decode_token, revoke_token_payload
+from fastapi.security import HTTPAuthorizationCredentials
+from app.dependencies import security
 from app.schemas.auth import LoginRequest, Token, UserResponse
+from app.services.login_stats import login_stats
 
 logger = logging.getLogger(__name__)
 
@@ -23,22 +28,17 @@ router = APIRouter(prefix="/auth", tags=["🔐 Autenticação"])
 # ============================================================================
 
 @router.post("/login", response_model=Token)
-async def login(request: Request, credentials: LoginRequest, db: Session = Depends(get_db)):
-    logger.info("=" * 50)
-    logger.info("📥 REQUEST RECEBIDA NO BACKEND")
-    logger.info(f"Method: {request.method}")
-    logger.info(f"URL: {request.url}")
-    logger.info(f"Headers: {dict(request.headers)}")
-    logger.info(f"✅ Body recebido (via Pydantic): Email: {credentials.email} | Password length: {len(credentials.password)}")
-
+async def login(request: Request, credentials: LoginRequest, db: AsyncSession = Depends(get_async_db)):
     # MUDANÇA: Fazer join com Employee para buscar o nome completo
-    user = db.query(User).options(joinedload(User.employee)).filter(User.email == credentials.email).first()
+    user = (
+        await db.execute(select(User).options(joinedload(User.employee)).where(User.email == credentials.email))
+    ).scalars().first()
 
     if not user:
         logger.error(f"❌ Usuário não encontrado: {credentials.email}")
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email ou senha incorretos")
 
-    if not verify_password(credentials.password, user.hashed_password):
+    if not await verify_password_async(credentials.password, user.hashed_password):
         logger.error(f"❌ Senha incorreta para: {credentials.email}")
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email ou senha incorretos")
 
@@ -46,9 +46,9 @@ async def login(request: Request, credentials: LoginRequest, db: Session = Depen
         logger.error(f"❌ Usuário inativo: {credentials.email}")
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Usuário inativo")
 
-    user.last_login = datetime.utcnow()
-    user.login_count = (user.login_count or 0) + 1
-    db.commit()
+    # last_login/login_count são gravados em lote pelo LoginStatsWriter
+    last_login = datetime.now(timezone.utc)
+    pending_logins = login_stats.record(user.id, last_login)
 
     access_token = create_access_token({"sub": str(user.id), "role": user.role, "is_admin": user.is_admin})
 
@@ -67,26 +67,34 @@ async def login(request: Request, credentials: LoginRequest, db: Session = Depen
             "role": user.role,
             "is_active": user.is_active,
             "is_admin": user.is_admin,
-            "last_login": user.last_login.isoformat() if user.last_login else None,
-            "login_count": user.login_count,
+            "last_login": last_login.isoformat(),
+            "login_count": (user.login_count or 0) + pending_logins,
         }
     }
 
     logger.info(f"✅ LOGIN SUCCESSFUL - Token gerado para: {credentials.email}")
-    logger.info("=" * 50)
 
     return response_data
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_route(current_user: User = Depends(get_current_user)):
+async def get_current_user_route(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     """Rota protegida que retorna o usuário atual"""
-    return current_user
+    # O usuário autenticado vem do cache; o perfil completo (último login etc.) vem do banco
+    user = await db.get(User, current_user.id)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuário não encontrado")
+    return user
 
 
 @router.post("/logout")
-async def logout(current_user: User = Depends(get_current_user)):
-    """Logout simulado, rota protegida"""
+def logout(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Logout: revoga o access token usado na requisição"""
+    revoke_token_payload(db, decode_token(credentials.credentials))
     return {"message": f"Logout realizado com sucesso para {current_user.email}"}
 
 
@@ -1,23 +1,40 @@
 from __future__ import annotations
 
+import time
 from calendar import monthrange
-from datetime import date
-from typing import List, Optional
+from datetime import date, timedelta
+from typing import List, Literal, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+import sqlalchemy as sa
+from sqlalchemy import or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
 
+from app.core.cache import invalidate_tables
+from app.core.row_security import get_scoped_read_async_db
 from app.core.security import get_current_user
-from app.database import get_db
+from app.database import get_async_db, get_db
+from app.models.employee import Employee
 from app.models.employee_knowledge import EmployeeKnowledge, StatusEnum as KnowledgeLinkStatus
 from app.models.knowledge import Knowledge, KnowledgeCategoryEnum
 from app.models.user import User
 from app.schemas.employee_knowledge import (
+    EmployeeKnowledgeBulkAssign,
+    EmployeeKnowledgeBulkResult,
     EmployeeKnowledgeCreate,
     EmployeeKnowledgeResponse,
     EmployeeKnowledgeUpdate,
+    LmsImportReport,
+    StaffingSearchRequest,
+    StaffingSearchResponse,
 )
+from app.services.lms_import_service import DEFAULT_BATCH_SIZE as LMS_BATCH_SIZE, LmsImportService
+from app.services.manager_scope import ManagerScopeService
+from app.services.org_scope import employee_scope_select
+from app.services.staffing_index import staffing_index
 
 router = APIRouter(prefix="/employee-knowledge", tags=["Vinculos"])
 
@@ -47,14 +64,6 @@ def _to_status_enum(value) -> KnowledgeLinkStatus:
 
 
 def _enrich_record(record: EmployeeKnowledge) -> None:
-    if record.data_expiracao:
-        delta = (record.data_expiracao - date.today()).days
-        setattr(record, "dias_para_expirar", delta)
-        setattr(record, "vencido", delta < 0)
-    else:
-        setattr(record, "dias_para_expirar", None)
-        setattr(record, "vencido", False)
-
     if record.employee:
         setattr(record, "employee_nome", record.employee.nome_completo)
         setattr(record, "employee_cargo", record.employee.cargo)
@@ -75,32 +84,67 @@ def _enrich_record(record: EmployeeKnowledge) -> None:
         setattr(record, "knowledge_tipo", None)
 
 
+async def _load_link(db: AsyncSession, vinculo_id: UUID) -> Optional[EmployeeKnowledge]:
+    """Vínculo com colaborador e conhecimento já carregados (sem lazy load em async)"""
+    statement = (
+        sa.select(EmployeeKnowledge)
+        .options(joinedload(EmployeeKnowledge.employee), joinedload(EmployeeKnowledge.knowledge))
+        .where(EmployeeKnowledge.id == vinculo_id)
+        .execution_options(populate_existing=True)
+    )
+    return (await db.execute(statement)).scalars().first()
+
+
 @router.get("/", response_model=List[EmployeeKnowledgeResponse])
 async def list_employee_knowledge(
     employee_id: Optional[UUID] = Query(None),
     knowledge_id: Optional[UUID] = Query(None),
     status_filter: Optional[KnowledgeLinkStatus] = Query(None, alias="status"),
+    expiring_within: Optional[int] = Query(
+        None, ge=0, le=3650, description="Apenas vínculos que expiram nos próximos N dias"
+    ),
+    expired: Optional[bool] = Query(None, description="Filtrar vínculos vencidos (true) ou não vencidos (false)"),
+    order_by: Literal["recent", "urgency"] = Query(
+        "recent", description="recent = mais recentes primeiro; urgency = expiração mais próxima primeiro"
+    ),
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_scoped_read_async_db),
     current_user: User = Depends(get_current_user),
 ):
-    query = (
-        db.query(EmployeeKnowledge)
-        .options(
-            joinedload(EmployeeKnowledge.employee),
-            joinedload(EmployeeKnowledge.knowledge),
-        )
-        .order_by(EmployeeKnowledge.created_at.desc())
+    query = sa.select(EmployeeKnowledge).options(
+        joinedload(EmployeeKnowledge.employee),
+        joinedload(EmployeeKnowledge.knowledge),
     )
     if employee_id:
-        query = query.filter(EmployeeKnowledge.employee_id == employee_id)
+        query = query.where(EmployeeKnowledge.employee_id == employee_id)
     if knowledge_id:
-        query = query.filter(EmployeeKnowledge.knowledge_id == knowledge_id)
+        query = query.where(EmployeeKnowledge.knowledge_id == knowledge_id)
     if status_filter:
-        query = query.filter(EmployeeKnowledge.status == status_filter)
+        query = query.where(EmployeeKnowledge.status == status_filter)
+
+    # Filtros como intervalos sobre data_expiracao para aproveitar o índice
+    today = date.today()
+    if expiring_within is not None:
+        query = query.where(
+            EmployeeKnowledge.data_expiracao.between(today, today + timedelta(days=expiring_within))
+        )
+    if expired is True:
+        query = query.where(EmployeeKnowledge.data_expiracao < today)
+    elif expired is False:
+        query = query.where(
+            or_(EmployeeKnowledge.data_expiracao.is_(None), EmployeeKnowledge.data_expiracao >= today)
+        )
+
+    if order_by == "urgency":
+        query = query.order_by(
+            EmployeeKnowledge.data_expiracao.asc().nulls_last(),
+            EmployeeKnowledge.id.asc(),
+        )
+    else:
+        query = query.order_by(EmployeeKnowledge.created_at.desc(), EmployeeKnowledge.id.asc())
 
-    records = query.offset(skip).limit(limit).all()
+    records = (await db.execute(query.offset(skip).limit(limit))).scalars().all()
     for record in records:
         _enrich_record(record)
     return records
@@ -109,7 +153,7 @@ async def list_employee_knowledge(
 @router.post("/", response_model=EmployeeKnowledgeResponse, status_code=status.HTTP_201_CREATED)
 async def create_employee_knowledge(
     vinculo_data: EmployeeKnowledgeCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user),
 ):
     if not vinculo_data.employee_id or not vinculo_data.knowledge_id:
@@ -118,13 +162,11 @@ async def create_employee_knowledge(
             detail="Colaborador e conhecimento sao obrigatorios.",
         )
 
-    existing = (
-        db.query(EmployeeKnowledge)
-        .filter(
+    existing = await db.scalar(
+        sa.select(EmployeeKnowledge.id).where(
             EmployeeKnowledge.employee_id == vinculo_data.employee_id,
             EmployeeKnowledge.knowledge_id == vinculo_data.knowledge_id,
         )
-        .first()
     )
     if existing:
         raise HTTPException(
@@ -132,7 +174,7 @@ async def create_employee_knowledge(
             detail="Este vinculo ja esta cadastrado.",
         )
 
-    knowledge = db.query(Knowledge).filter(Knowledge.id == vinculo_data.knowledge_id).first()
+    knowledge = await db.get(Knowledge, vinculo_data.knowledge_id)
     if not knowledge:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conhecimento nao encontrado.")
 
@@ -154,30 +196,181 @@ async def create_employee_knowledge(
 
     vinculo = EmployeeKnowledge(**payload)
     db.add(vinculo)
-    db.commit()
-    db.refresh(vinculo)
+    await db.commit()
+    vinculo = await _load_link(db, vinculo.id)
     _enrich_record(vinculo)
     return vinculo
 
 
+@router.post("/bulk", response_model=EmployeeKnowledgeBulkResult)
+def bulk_assign_employee_knowledge(
+    payload: EmployeeKnowledgeBulkAssign,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Vincula conhecimentos a vários colaboradores em uma única transação"""
+    if current_user.role not in ["admin", "diretoria", "gerente"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Sem permissao para vincular em massa.")
+
+    knowledge_ids = list(dict.fromkeys(payload.knowledge_ids))
+    found = set(db.scalars(sa.select(Knowledge.id).where(Knowledge.id.in_(knowledge_ids))))
+    missing = [str(k_id) for k_id in knowledge_ids if k_id not in found]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Conhecimento(s) nao encontrado(s): {', '.join(missing)}",
+        )
+
+    # Gerentes só vinculam colaboradores da própria árvore
+    scope = ManagerScopeService.resolve(db, current_user)
+    targets = employee_scope_select(
+        area_id=payload.area_id,
+        team_id=payload.team_id,
+        manager_id=payload.manager_id,
+        include_subtree=payload.incluir_subordinados_indiretos,
+    ).where(scope.filter(Employee.id))
+    ignorados: List[UUID] = []
+    if payload.employee_ids:
+        requested = list(dict.fromkeys(payload.employee_ids))
+        targets = targets.where(Employee.id.in_(requested))
+        selected = set(db.scalars(targets))
+        # Inativos, inexistentes, fora dos filtros ou fora do escopo
+        ignorados = [emp_id for emp_id in requested if emp_id not in selected]
+        colaboradores = len(selected)
+    targets = targets.subquery("targets")
+    if not payload.employee_ids:
+        colaboradores = db.scalar(sa.select(sa.func.count()).select_from(targets))
+
+    ek_table = EmployeeKnowledge.__table__
+    status_value = KnowledgeLinkStatus(payload.status)
+    pairs = (
+        sa.select(
+            sa.func.gen_random_uuid(),
+            targets.c.id,
+            Knowledge.id,
+            sa.literal(status_value, ek_table.c.status.type),
+            sa.literal(0.0, ek_table.c.progresso.type),
+            sa.literal(payload.data_limite, ek_table.c.data_limite.type),
+        )
+        .select_from(targets)
+        .join(Knowledge, Knowledge.id.in_(knowledge_ids))
+    )
+    statement = pg_insert(ek_table).from_select(
+        ["id", "employee_id", "knowledge_id", "status", "progresso", "data_limite"],
+        pairs,
+    )
+    if payload.atualizar_existentes:
+        # Nunca rebaixa um vínculo já obtido
+        statement = statement.on_conflict_do_update(
+            constraint="uq_employee_knowledge",
+            set_={
+                "status": statement.excluded.status,
+                "data_limite": sa.func.coalesce(statement.excluded.data_limite, ek_table.c.data_limite),
+                "updated_at": sa.func.now(),
+            },
+            where=sa.and_(
+                ek_table.c.status != KnowledgeLinkStatus.OBTIDO.value,
+                sa.or_(
+                    ek_table.c.status.is_distinct_from(statement.excluded.status),
+                    ek_table.c.data_limite.is_distinct_from(
+                        sa.func.coalesce(statement.excluded.data_limite, ek_table.c.data_limite)
+                    ),
+                ),
+            ),
+        )
+    else:
+        statement = statement.on_conflict_do_nothing(constraint="uq_employee_knowledge")
+    # xmax = 0 identifica linhas inseridas (e não atualizadas) pelo comando
+    statement = statement.returning(ek_table.c.id, sa.literal_column("xmax = 0").label("criado"))
+
+    rows = db.execute(statement).all()
+    db.commit()
+
+    criados = sum(1 for row in rows if row.criado)
+    atualizados = len(rows) - criados
+    if rows:
+        invalidate_tables("employee_knowledge", keys=[row.id for row in rows])
+
+    solicitados = colaboradores * len(knowledge_ids)
+    return EmployeeKnowledgeBulkResult(
+        colaboradores=colaboradores,
+        vinculos_solicitados=solicitados,
+        criados=criados,
+        atualizados=atualizados,
+        existentes=solicitados - criados - atualizados,
+        ignorados=ignorados,
+    )
+
+
+@router.post("/import/lms", response_model=LmsImportReport)
+def import_lms_progress(
+    arquivo: UploadFile = File(..., description="CSV exportado pelo LMS"),
+    simular: bool = Query(False, description="Apenas concilia, sem gravar"),
+    batch_size: int = Query(LMS_BATCH_SIZE, ge=100, le=10000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Atualiza progresso e status dos vínculos a partir do CSV do LMS"""
+    if current_user.role not in ["admin", "diretoria", "gerente"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Sem permissao para importar progresso.")
+    if arquivo.filename and not arquivo.filename.lower().endswith(".csv"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Envie um arquivo CSV.")
+
+    try:
+        return LmsImportService.run(
+            db,
+            arquivo.file,
+            batch_size=batch_size,
+            dry_run=simular,
+            # Gerentes só atualizam vínculos da própria árvore, como em /bulk
+            scope=ManagerScopeService.resolve(db, current_user),
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+
+@router.post("/staffing-search", response_model=StaffingSearchResponse)
+def staffing_search(
+    search: StaffingSearchRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    staffing_index.ensure_fresh(db)
+    expression = search.expressao.model_dump(by_alias=True, exclude_none=True)
+
+    started = time.perf_counter()
+    matches = staffing_index.search(expression, area_id=search.area_id, team_id=search.team_id)
+    elapsed_us = (time.perf_counter() - started) * 1_000_000
+
+    matches.sort(key=lambda item: item[1])
+    page_ids = [emp_id for emp_id, _ in matches[search.skip:search.skip + search.limit]]
+    employees = {
+        employee.id: employee
+        for employee in db.query(Employee)
+        .options(joinedload(Employee.area), joinedload(Employee.manager))
+        .filter(Employee.id.in_(page_ids))
+        .all()
+    }
+    return StaffingSearchResponse(
+        total=len(matches),
+        tempo_avaliacao_us=round(elapsed_us, 1),
+        items=[employees[emp_id] for emp_id in page_ids if emp_id in employees],
+    )
+
+
 @router.put("/{vinculo_id}", response_model=EmployeeKnowledgeResponse)
 async def update_employee_knowledge(
     vinculo_id: UUID,
     vinculo_data: EmployeeKnowledgeUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user),
 ):
-    vinculo = (
-        db.query(EmployeeKnowledge)
-        .options(joinedload(EmployeeKnowledge.knowledge))
-        .filter(EmployeeKnowledge.id == vinculo_id)
-        .first()
-    )
+    vinculo = await _load_link(db, vinculo_id)
     if not vinculo:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Vinculo nao encontrado.")
 
     update_payload = vinculo_data.model_dump(exclude_unset=True)
-    knowledge = vinculo.knowledge or db.query(Knowledge).filter(Knowledge.id == vinculo.knowledge_id).first()
+    knowledge = vinculo.knowledge
 
     for field, value in update_payload.items():
         if field == "status" and value is not None:
@@ -196,8 +389,8 @@ async def update_employee_knowledge(
         if "data_expiracao" not in update_payload:
             vinculo.data_expiracao = None
 
-    db.commit()
-    db.refresh(vinculo)
+    await db.commit()
+    vinculo = await _load_link(db, vinculo.id)
     _enrich_record(vinculo)
     return vinculo
 
@@ -205,12 +398,12 @@ async def update_employee_knowledge(
 @router.delete("/{vinculo_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_employee_knowledge(
     vinculo_id: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user),
 ):
-    vinculo = db.query(EmployeeKnowledge).filter(EmployeeKnowledge.id == vinculo_id).first()
+    vinculo = await db.get(EmployeeKnowledge, vinculo_id)
     if not vinculo:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Vinculo nao encontrado.")
-    db.delete(vinculo)
-    db.commit()
+    await db.delete(vinculo)
+    await db.commit()
     return None
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_
+from sqlalchemy import or_, select
 from typing import List, Optional
 from datetime import datetime, date
 from uuid import UUID
@@ -11,7 +13,12 @@ from app.models.employee import Employee, EmployeeTypeEnum
 from app.models.manager import Manager
 from app.models.employee_note import EmployeeNote
 from app.models.employee_salary_history import EmployeeSalaryHistory
-from app.core.security import get_current_user
+from app.models.knowledge import KnowledgeCategoryEnum
+from app.core.replica import get_read_async_db
+from app.core.row_security import get_scoped_read_async_db, get_scoped_read_db
+from app.core.security import FieldAccessControl, get_current_user
+from app.services.employee_export_service import EmployeeExportService
+from app.services.recommendation_service import RecommendationService
 from app.schemas.employee import (
     EmployeeCreate,
     EmployeeUpdate,
@@ -21,10 +28,42 @@ from app.schemas.employee import (
     EmployeeNoteCreate,
     EmployeeSalaryHistoryResponse,
     EmployeeSalaryHistoryCreate,
+    SimilarEmployeeResponse,
+    KnowledgeSuggestionResponse,
 )
 
 router = APIRouter(prefix="/employees", tags=["Colaboradores"])
 
+def _employee_filters(
+    search: Optional[str] = None,
+    status: Optional[str] = None,
+    team_id: Optional[UUID] = None,
+    area_id: Optional[UUID] = None,
+    cargo: Optional[str] = None,
+) -> list:
+    criteria = []
+    if search: criteria.append(or_(Employee.nome_completo.ilike(f"%{search}%"), Employee.email_corporativo.ilike(f"%{search}%")))
+    if status: criteria.append(Employee.status == status)
+    if team_id: criteria.append(Employee.team_id == team_id)
+    if cargo: criteria.append(Employee.cargo.ilike(f"%{cargo}%"))
+    if area_id: criteria.append(Employee.area_id == area_id)
+    return criteria
+
+def _mask_employees(employees: list, schema, current_user) -> list:
+    """Aplica os planos de mascaramento da role (dados de terceiros e próprios)"""
+    plans = {
+        own: FieldAccessControl.masking_plan("employee", current_user.role, own)
+        for own in (False, True)
+    }
+    if plans[False].is_noop and plans[True].is_noop:
+        return employees
+    masked = []
+    for employee in employees:
+        plan = plans[employee.id == current_user.employee_id]
+        item = schema.model_validate(employee)
+        masked.append(item.model_copy(update=plan.redact()) if plan.masks else item)
+    return masked
+
 @router.get("/", response_model=List[EmployeeResponse])
 async def list_employees(
     skip: int = 0,
@@ -34,22 +73,54 @@ async def list_employees(
     team_id: Optional[UUID] = Query(None, description="Filtrar por time"),
     area_id: Optional[UUID] = Query(None, description="Filtrar por área"),
     cargo: Optional[str] = Query(None, description="Filtrar por cargo"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_scoped_read_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    query = db.query(Employee).options(joinedload(Employee.area), joinedload(Employee.manager))
-    if search: query = query.filter(or_(Employee.nome_completo.ilike(f"%{search}%"), Employee.email_corporativo.ilike(f"%{search}%")))
-    if status: query = query.filter(Employee.status == status)
-    if team_id: query = query.filter(Employee.team_id == team_id)
-    if cargo: query = query.filter(Employee.cargo.ilike(f"%{cargo}%"))
-    if area_id: query = query.filter(Employee.area_id == area_id)
-    employees = query.order_by(Employee.nome_completo).offset(skip).limit(limit).all()
-    return employees
+    query = (
+        select(Employee)
+        .options(joinedload(Employee.area), joinedload(Employee.manager))
+        .where(*_employee_filters(search, status, team_id, area_id, cargo))
+        .order_by(Employee.nome_completo)
+        .offset(skip)
+        .limit(limit)
+    )
+    employees = (await db.execute(query)).scalars().all()
+    return _mask_employees(employees, EmployeeResponse, current_user)
+
+@router.get("/export")
+def export_employees(
+    search: Optional[str] = None,
+    status: Optional[str] = Query(None, description="Filtrar por status"),
+    team_id: Optional[UUID] = Query(None, description="Filtrar por time"),
+    area_id: Optional[UUID] = Query(None, description="Filtrar por área"),
+    cargo: Optional[str] = Query(None, description="Filtrar por cargo"),
+    db: Session = Depends(get_scoped_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Mesmo escopo da listagem; os campos restritos saem mascarados conforme a role
+    content = EmployeeExportService.iter_csv(
+        db,
+        _employee_filters(search, status, team_id, area_id, cargo),
+        current_user.role,
+        own_employee_id=current_user.employee_id,
+    )
+    return StreamingResponse(
+        content,
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": 'attachment; filename="colaboradores.csv"'},
+    )
 
 @router.get("/supervisors", response_model=List[EmployeeResponse])
-async def list_supervisors(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def list_supervisors(db: AsyncSession = Depends(get_read_async_db), current_user: User = Depends(get_current_user)):
     # Primeiro, tente obter os gestores efetivos a partir da tabela `managers`
-    managers = db.query(Manager).options(joinedload(Manager.employee)).all()
+    managers = (
+        await db.execute(
+            select(Manager).options(
+                joinedload(Manager.employee).joinedload(Employee.area),
+                joinedload(Manager.employee).joinedload(Employee.manager),
+            )
+        )
+    ).scalars().all()
     supervisors = []
     for m in managers:
         if m.employee:
@@ -64,36 +135,69 @@ async def list_supervisors(db: Session = Depends(get_db), current_user: User = D
             EmployeeTypeEnum.COORDENADOR,
         )
         query = (
-            db.query(Employee)
-            .options(joinedload(Employee.area))
-            .filter(Employee.tipo_cadastro.in_(supervisor_types))
+            select(Employee)
+            .options(joinedload(Employee.area), joinedload(Employee.manager))
+            .where(Employee.tipo_cadastro.in_(supervisor_types))
             .order_by(Employee.nome_completo)
         )
-        return query.all()
+        return _mask_employees((await db.execute(query)).scalars().all(), EmployeeResponse, current_user)
 
     # Ordenar supervisores por nome
     supervisors.sort(key=lambda e: e.nome_completo if e and getattr(e, 'nome_completo', None) else '')
-    return supervisors
+    return _mask_employees(supervisors, EmployeeResponse, current_user)
 
 @router.get("/{employee_id}", response_model=EmployeeDetailResponse)
-async def get_employee(employee_id: UUID, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    employee = (
-        db.query(Employee)
+async def get_employee(employee_id: UUID, db: AsyncSession = Depends(get_scoped_read_async_db), current_user: User = Depends(get_current_user)):
+    query = (
+        select(Employee)
         .options(
             joinedload(Employee.area),
             joinedload(Employee.manager),
             joinedload(Employee.notes).joinedload(EmployeeNote.author),
             joinedload(Employee.salary_history).joinedload(EmployeeSalaryHistory.created_by_user),
         )
-        .filter(Employee.id == employee_id)
-        .first()
+        .where(Employee.id == employee_id)
     )
+    employee = (await db.execute(query)).unique().scalars().first()
     if not employee:
         raise HTTPException(status_code=404, detail="Colaborador não encontrado")
-    return employee
+    plan = FieldAccessControl.masking_plan("employee", current_user.role, employee.id == current_user.employee_id)
+    salary_plan = FieldAccessControl.masking_plan("salary", current_user.role)
+    if plan.is_noop and salary_plan.is_noop:
+        return employee
+    update = plan.redact()
+    if salary_plan.mask_all:
+        update["salary_history"] = []
+    return EmployeeDetailResponse.model_validate(employee).model_copy(update=update)
+
+@router.get("/{employee_id}/similar", response_model=List[SimilarEmployeeResponse])
+def list_similar_employees(
+    employee_id: UUID,
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    similar = RecommendationService.similar_employees(db, employee_id, limit=limit)
+    if similar is None:
+        raise HTTPException(status_code=404, detail="Colaborador não encontrado")
+    return similar
+
+@router.get("/{employee_id}/knowledge-suggestions", response_model=List[KnowledgeSuggestionResponse])
+def list_knowledge_suggestions(
+    employee_id: UUID,
+    limit: int = Query(10, ge=1, le=100),
+    vizinhos: int = Query(20, ge=1, le=200, description="Quantidade de colegas parecidos considerados"),
+    tipo: Optional[KnowledgeCategoryEnum] = Query(KnowledgeCategoryEnum.CERTIFICACAO, description="Categoria sugerida"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    suggestions = RecommendationService.suggest_knowledge(db, employee_id, limit=limit, neighbours=vizinhos, tipo=tipo)
+    if suggestions is None:
+        raise HTTPException(status_code=404, detail="Colaborador não encontrado")
+    return suggestions
 
 @router.post("/", response_model=EmployeeResponse, status_code=status.HTTP_201_CREATED)
-async def create_employee(employee_data: EmployeeCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def create_employee(employee_data: EmployeeCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     if current_user.role not in ["admin", "diretoria", "gerente"]:
         raise HTTPException(status_code=403, detail="Sem permissão para criar colaboradores")
     if db.query(Employee).filter(Employee.email_corporativo == employee_data.email_corporativo).first():
@@ -140,7 +244,7 @@ async def create_employee(employee_data: EmployeeCreate, db: Session = Depends(g
     return new_employee
 
 @router.put("/{employee_id}", response_model=EmployeeResponse)
-async def update_employee(employee_id: UUID, employee_data: EmployeeUpdate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def update_employee(employee_id: UUID, employee_data: EmployeeUpdate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     employee = db.query(Employee).filter(Employee.id == employee_id).first()
     if not employee:
         raise HTTPException(status_code=404, detail="Colaborador não encontrado")
@@ -202,7 +306,7 @@ async def update_employee(employee_id: UUID, employee_data: EmployeeUpdate, db:
     return employee
 
 @router.get("/{employee_id}/notes", response_model=List[EmployeeNoteResponse])
-async def list_employee_notes(employee_id: UUID, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def list_employee_notes(employee_id: UUID, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     employee = db.query(Employee).filter(Employee.id == employee_id).first()
     if not employee:
         raise HTTPException(status_code=404, detail="Colaborador não encontrado")
@@ -223,7 +327,7 @@ async def list_employee_notes(employee_id: UUID, db: Session = Depends(get_db),
     return notes
 
 @router.post("/{employee_id}/notes", response_model=EmployeeNoteResponse, status_code=status.HTTP_201_CREATED)
-async def create_employee_note(
+def create_employee_note(
     employee_id: UUID,
     note_data: EmployeeNoteCreate,
     db: Session = Depends(get_db),
@@ -252,10 +356,13 @@ async def create_employee_note(
     return note
 
 @router.get("/{employee_id}/salary-history", response_model=List[EmployeeSalaryHistoryResponse])
-async def list_salary_history(employee_id: UUID, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def list_salary_history(employee_id: UUID, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     employee = db.query(Employee).filter(Employee.id == employee_id).first()
     if not employee:
         raise HTTPException(status_code=404, detail="Colaborador não encontrado")
+    # Mesmo critério do detalhe: sem acesso ao objeto salary, histórico vazio
+    if FieldAccessControl.masking_plan("salary", current_user.role).mask_all:
+        return []
     history = (
         db.query(EmployeeSalaryHistory)
         .filter(EmployeeSalaryHistory.employee_id == employee_id)
@@ -273,7 +380,7 @@ async def list_salary_history(employee_id: UUID, db: Session = Depends(get_db),
     return history
 
 @router.post("/{employee_id}/salary-history", response_model=EmployeeSalaryHistoryResponse, status_code=status.HTTP_201_CREATED)
-async def create_salary_history(
+def create_salary_history(
     employee_id: UUID,
     entry_data: EmployeeSalaryHistoryCreate,
     db: Session = Depends(get_db),
@@ -307,7 +414,7 @@ async def create_salary_history(
     return entry
 
 @router.delete("/{employee_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_employee(employee_id: UUID, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def delete_employee(employee_id: UUID, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     if current_user.role not in ["admin", "diretoria"]:
         raise HTTPException(status_code=403, detail="Apenas administradores podem deletar colaboradores")
     employee = db.query(Employee).filter(Employee.id == employee_id).first()
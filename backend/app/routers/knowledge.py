@@ -1,25 +1,41 @@
 from __future__ import annotations
 
+import re
 from collections import Counter
+from dataclasses import replace
 from datetime import date, timedelta
-from typing import List, Optional
+from typing import Dict, List, Optional
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
 
+from app.core.replica import get_read_async_db
 from app.core.security import get_current_user
-from app.database import get_db
+from app.database import get_async_db, get_db
+from app.models.employee import Employee
 from app.models.knowledge import Knowledge, KnowledgeCategoryEnum
 from app.models.employee_knowledge import EmployeeKnowledge, StatusEnum as KnowledgeLinkStatus
 from app.models.user import User
 from app.schemas.knowledge import (
     KnowledgeCreate,
+    KnowledgeFacetCount,
+    KnowledgeMatrixResponse,
     KnowledgeResponse,
+    KnowledgeSearchResponse,
     KnowledgeSummary,
     KnowledgeUpdate,
+    RenewalForecastResponse,
+    SkillGapReport,
 )
+from app.services.expiry_service import ExpiryService
+from app.services.knowledge_matrix_service import KnowledgeMatrixService
+from app.services.manager_scope import ManagerScope, get_manager_scope
+from app.services.renewal_forecast_service import AGRUPAMENTOS, RenewalForecastService
+from app.services.skill_gap_service import ESCOPOS, SkillGapService
 
 router = APIRouter(prefix="/knowledge", tags=["Conhecimentos"])
 
@@ -40,6 +56,59 @@ def _normalize_tipo(value) -> KnowledgeCategoryEnum:
     return KnowledgeCategoryEnum(value)
 
 
+def _ts_query(search: Optional[str]):
+    """Converte o texto digitado em tsquery com prefixo em cada termo"""
+    terms = re.findall(r"\w+", search or "")
+    if not terms:
+        return None
+    return sa.func.to_tsquery("portuguese", " & ".join(f"{term}:*" for term in terms))
+
+
+def _catalogue_filters(
+    ts_query,
+    tipo: Optional[KnowledgeCategoryEnum],
+    fornecedor: Optional[str],
+    area: Optional[str],
+    status_filter: Optional[str],
+    obrigatorio: Optional[bool],
+) -> list:
+    criteria = []
+    if ts_query is not None:
+        criteria.append(Knowledge.search_vector.op("@@")(ts_query))
+    if tipo:
+        criteria.append(Knowledge.tipo == tipo)
+    if fornecedor:
+        criteria.append(sa.func.lower(Knowledge.fornecedor) == fornecedor.strip().lower())
+    if area:
+        criteria.append(sa.func.lower(Knowledge.area) == area.strip().lower())
+    if status_filter:
+        criteria.append(Knowledge.status == status_filter)
+    if obrigatorio is not None:
+        criteria.append(Knowledge.obrigatorio == obrigatorio)
+    return criteria
+
+
+async def _load_knowledge(db: AsyncSession, knowledge_id: UUID) -> Optional[Knowledge]:
+    statement = (
+        sa.select(Knowledge)
+        .options(joinedload(Knowledge.vinculos))
+        .where(Knowledge.id == knowledge_id)
+        .execution_options(populate_existing=True)
+    )
+    return (await db.execute(statement)).unique().scalars().first()
+
+
+async def _ranked_page(db: AsyncSession, criteria: list, ts_query, skip: int, limit: int) -> List[Knowledge]:
+    query = sa.select(Knowledge).options(joinedload(Knowledge.vinculos)).where(*criteria)
+    if ts_query is not None:
+        query = query.order_by(sa.func.ts_rank_cd(Knowledge.search_vector, ts_query).desc())
+    query = query.order_by(Knowledge.nome.asc()).offset(skip).limit(limit)
+    records = (await db.execute(query)).unique().scalars().all()
+    for record in records:
+        _apply_aggregates(record)
+    return records
+
+
 @router.get("/", response_model=List[KnowledgeResponse])
 async def list_knowledge(
     skip: int = 0,
@@ -50,91 +119,210 @@ async def list_knowledge(
     area: Optional[str] = Query(None, description="Filtrar por área"),
     status_filter: Optional[str] = Query(None, description="Filtrar por status"),
     obrigatorio: Optional[bool] = Query(None, description="Apenas obrigatórios"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_async_db),
     current_user: User = Depends(get_current_user),
 ):
-    query = (
-        db.query(Knowledge)
-        .options(joinedload(Knowledge.vinculos))
-        .order_by(Knowledge.nome.asc())
-    )
-    if search:
-        pattern = f"%{search}%"
-        query = query.filter(
-            Knowledge.nome.ilike(pattern)
-            | Knowledge.descricao.ilike(pattern)
-            | Knowledge.fornecedor.ilike(pattern)
+    ts_query = _ts_query(search)
+    criteria = _catalogue_filters(ts_query, tipo, fornecedor, area, status_filter, obrigatorio)
+    return await _ranked_page(db, criteria, ts_query, skip, limit)
+
+
+@router.get("/search", response_model=KnowledgeSearchResponse)
+async def search_knowledge(
+    q: Optional[str] = Query(None, description="Texto da busca"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    tipo: Optional[KnowledgeCategoryEnum] = Query(None, description="Filtrar por categoria"),
+    fornecedor: Optional[str] = Query(None, description="Filtrar por fornecedor"),
+    area: Optional[str] = Query(None, description="Filtrar por área"),
+    status_filter: Optional[str] = Query(None, description="Filtrar por status"),
+    obrigatorio: Optional[bool] = Query(None, description="Apenas obrigatórios"),
+    db: AsyncSession = Depends(get_read_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Busca ranqueada no catálogo com contagens por faceta"""
+    ts_query = _ts_query(q)
+    criteria = _catalogue_filters(ts_query, tipo, fornecedor, area, status_filter, obrigatorio)
+
+    # Total e todas as facetas em uma única passada via GROUPING SETS
+    facet_columns = {
+        "tipo": Knowledge.tipo,
+        "fornecedor": Knowledge.fornecedor,
+        "area": Knowledge.area,
+        "dificuldade": Knowledge.dificuldade,
+    }
+    grouping_flags = [sa.func.grouping(column).label(f"g_{name}") for name, column in facet_columns.items()]
+    rows = (await db.execute(
+        sa.select(*facet_columns.values(), *grouping_flags, sa.func.count().label("total"))
+        .where(*criteria)
+        .group_by(
+            sa.func.grouping_sets(
+                *(sa.tuple_(column) for column in facet_columns.values()),
+                sa.tuple_(),
+            )
         )
-    if tipo:
-        query = query.filter(Knowledge.tipo == tipo)
-    if fornecedor:
-        query = query.filter(Knowledge.fornecedor.ilike(f"%{fornecedor}%"))
-    if area:
-        query = query.filter(Knowledge.area.ilike(f"%{area}%"))
-    if status_filter:
-        query = query.filter(Knowledge.status == status_filter)
-    if obrigatorio is not None:
-        query = query.filter(Knowledge.obrigatorio == obrigatorio)
+    )).mappings().all()
 
-    records = query.offset(skip).limit(limit).all()
-    for record in records:
-        _apply_aggregates(record)
-    return records
+    total = 0
+    facets: Dict[str, List[KnowledgeFacetCount]] = {name: [] for name in facet_columns}
+    for row in rows:
+        if all(row[f"g_{name}"] for name in facet_columns):
+            total = row["total"]
+            continue
+        for name in facet_columns:
+            if not row[f"g_{name}"]:
+                value = row[name]
+                if isinstance(value, KnowledgeCategoryEnum):
+                    value = value.value
+                facets[name].append(KnowledgeFacetCount(valor=value, total=row["total"]))
+    for values in facets.values():
+        values.sort(key=lambda item: (-item.total, item.valor or ""))
+
+    items = await _ranked_page(db, criteria, ts_query, skip, limit) if total else []
+    return KnowledgeSearchResponse(total=total, items=items, facetas=facets)
 
 
 @router.get("/summary", response_model=KnowledgeSummary)
-async def knowledge_summary(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    total = db.query(sa.func.count(Knowledge.id)).scalar() or 0
-    by_type = dict(
-        db.query(Knowledge.tipo, sa.func.count(Knowledge.id))
-        .group_by(Knowledge.tipo)
-        .all()
-    )
-    obrigatorios = (
-        db.query(sa.func.count(Knowledge.id))
-        .filter(Knowledge.obrigatorio.is_(True))
-        .scalar()
-        or 0
-    )
-    expiring_records = (
-        db.query(EmployeeKnowledge.data_expiracao)
-        .filter(
-            EmployeeKnowledge.status == KnowledgeLinkStatus.OBTIDO,
-            EmployeeKnowledge.data_expiracao.isnot(None),
+async def knowledge_summary(
+    horizonte_dias: int = Query(60, ge=1, le=730, description="Janela, em dias, para certificações expirando"),
+    db: AsyncSession = Depends(get_read_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    today = date.today()
+    expiring_limit = today + timedelta(days=horizonte_dias)
+
+    # Um único SELECT: agregados do catálogo via FILTER e contagens de vínculos
+    # como subconsultas escalares, cada uma com seu próprio índice.
+    def expiring_until(limit: date):
+        return (
+            sa.select(sa.func.count())
+            .select_from(EmployeeKnowledge)
+            .where(
+                EmployeeKnowledge.status == KnowledgeLinkStatus.OBTIDO,
+                EmployeeKnowledge.data_expiracao.between(today, limit),
+            )
+            .scalar_subquery()
         )
-        .all()
-    )
-    expiring_limit = date.today() + timedelta(days=60)
-    expiring_soon = sum(1 for (exp_date,) in expiring_records if exp_date and exp_date <= expiring_limit)
 
+    expiring_soon = expiring_until(expiring_limit)
+    # expiram_ate_60_dias mantém a janela fixa de 60 dias, qualquer que seja o horizonte
+    expiring_60 = expiring_soon if horizonte_dias == 60 else expiring_until(today + timedelta(days=60))
     colaboradores_afetados = (
-        db.query(sa.func.count(sa.func.distinct(EmployeeKnowledge.employee_id)))
-        .filter(EmployeeKnowledge.status == KnowledgeLinkStatus.OBRIGATORIO)
-        .scalar()
-        or 0
+        sa.select(sa.func.count(sa.distinct(EmployeeKnowledge.employee_id)))
+        .where(EmployeeKnowledge.status == KnowledgeLinkStatus.OBRIGATORIO)
+        .scalar_subquery()
     )
+    por_tipo_columns = [
+        sa.func.count(Knowledge.id).filter(Knowledge.tipo == tipo).label(f"tipo_{tipo.value}")
+        for tipo in KnowledgeCategoryEnum
+    ]
+    row = (await db.execute(
+        sa.select(
+            sa.func.count(Knowledge.id).label("total"),
+            sa.func.count(Knowledge.id).filter(Knowledge.obrigatorio.is_(True)).label("obrigatorios"),
+            *por_tipo_columns,
+            expiring_soon.label("expiring_soon"),
+            expiring_60.label("expiring_60"),
+            colaboradores_afetados.label("colaboradores_afetados"),
+        )
+    )).one()
 
     return KnowledgeSummary(
-        total=total,
-        por_tipo={k.value if isinstance(k, KnowledgeCategoryEnum) else k: v for k, v in by_type.items()},
-        obrigatorios=obrigatorios,
-        expiram_ate_60_dias=int(expiring_soon),
-        colaboradores_afetados=colaboradores_afetados,
+        total=row.total,
+        por_tipo={tipo.value: row._mapping[f"tipo_{tipo.value}"] for tipo in KnowledgeCategoryEnum},
+        obrigatorios=row.obrigatorios,
+        horizonte_dias=horizonte_dias,
+        expiram_no_horizonte=row.expiring_soon,
+        expiram_ate_60_dias=row.expiring_60,
+        colaboradores_afetados=row.colaboradores_afetados,
+    )
+
+
+@router.get("/matrix", response_model=KnowledgeMatrixResponse)
+def knowledge_matrix(
+    area_id: Optional[UUID] = Query(None, description="Filtrar por área"),
+    team_id: Optional[UUID] = Query(None, description="Filtrar por time"),
+    manager_id: Optional[UUID] = Query(None, description="Filtrar pela árvore de um gestor (id em managers)"),
+    tipo: Optional[KnowledgeCategoryEnum] = Query(None, description="Filtrar por categoria"),
+    formato: str = Query("json", pattern="^(json|csv)$", description="json (colunar) ou csv"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    scope: ManagerScope = Depends(get_manager_scope),
+):
+    if current_user.role not in ["admin", "diretoria", "gerente"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Sem permissão para ver a matriz de conhecimentos")
+    matrix = KnowledgeMatrixService.build(
+        db,
+        area_id=area_id,
+        team_id=team_id,
+        manager_id=manager_id,
+        tipo=tipo,
+        # Gerentes veem só a própria árvore
+        restrict_to=None if scope.unrestricted else scope.filter(Employee.id, include_own=True),
     )
+    if formato == "csv":
+        return StreamingResponse(
+            matrix.iter_csv(),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": 'attachment; filename="matriz_conhecimentos.csv"'},
+        )
+    return ORJSONResponse(matrix.to_columnar())
+
+
+@router.get("/gaps", response_model=SkillGapReport)
+def knowledge_gaps(
+    horizonte_dias: int = Query(60, ge=1, le=730, description="Janela, em dias, para certificações expirando"),
+    escopo: Optional[str] = Query(None, description="organizacao, area, time ou gestor"),
+    escopo_id: Optional[UUID] = Query(None, description="Restringir a uma área, time ou gestor"),
+    max_faltantes: int = Query(50, ge=0, le=5000, description="Máximo de colaboradores listados por item"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    scope: ManagerScope = Depends(get_manager_scope),
+):
+    if current_user.role not in ["admin", "diretoria", "gerente"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Sem permissão para ver as lacunas de conhecimento")
+    if escopo and escopo not in ESCOPOS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Escopo inválido. Use: {', '.join(ESCOPOS)}")
+    report = SkillGapService.report(db, horizonte_dias=horizonte_dias)
+    itens = [
+        item
+        for item in report.itens
+        if (not escopo or item.escopo == escopo) and (not escopo_id or item.escopo_id == escopo_id)
+        # Gerentes veem só o agregado da própria árvore
+        and (scope.unrestricted or (item.escopo == "gestor" and item.escopo_id == scope.manager_id))
+    ]
+    return SkillGapReport(
+        gerado_em=report.gerado_em,
+        horizonte_dias=report.horizonte_dias,
+        itens=[replace(item, colaboradores_faltantes=item.colaboradores_faltantes[:max_faltantes]) for item in itens],
+    )
+
+
+@router.get("/renewal-forecast", response_model=RenewalForecastResponse)
+def knowledge_renewal_forecast(
+    horizonte_meses: int = Query(12, ge=1, le=60, description="Quantidade de meses previstos"),
+    agrupamento: str = Query("area", description="area, time ou fornecedor"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Previsão mensal de renovações de certificações e do custo estimado"""
+    if current_user.role not in ["admin", "diretoria", "gerente"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Sem permissão para ver a previsão de custos")
+    if agrupamento not in AGRUPAMENTOS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Agrupamento inválido. Use: {', '.join(AGRUPAMENTOS)}",
+        )
+    return RenewalForecastService.forecast(db, horizonte_meses=horizonte_meses, agrupamento=agrupamento)
 
 
 @router.get("/{knowledge_id}", response_model=KnowledgeResponse)
 async def get_knowledge(
     knowledge_id: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_async_db),
     current_user: User = Depends(get_current_user),
 ):
-    knowledge = (
-        db.query(Knowledge)
-        .options(joinedload(Knowledge.vinculos))
-        .filter(Knowledge.id == knowledge_id)
-        .first()
-    )
+    knowledge = await _load_knowledge(db, knowledge_id)
     if not knowledge:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conhecimento não encontrado")
     _apply_aggregates(knowledge)
@@ -144,18 +332,16 @@ async def get_knowledge(
 @router.post("/", response_model=KnowledgeResponse, status_code=status.HTTP_201_CREATED)
 async def create_knowledge(
     knowledge_data: KnowledgeCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user),
 ):
     if current_user.role not in ["admin", "diretoria", "gerente"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Sem permissão para criar conhecimentos")
-    existing = (
-        db.query(Knowledge)
-        .filter(
+    existing = await db.scalar(
+        sa.select(Knowledge.id).where(
             Knowledge.nome == knowledge_data.nome,
             Knowledge.fornecedor == knowledge_data.fornecedor,
         )
-        .first()
     )
     if existing:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Já existe um conhecimento com este nome para o mesmo fornecedor.")
@@ -164,14 +350,14 @@ async def create_knowledge(
     payload["tipo"] = _normalize_tipo(payload.get("tipo", KnowledgeCategoryEnum.CURSO))
     new_knowledge = Knowledge(**payload)
     db.add(new_knowledge)
-    db.commit()
-    db.refresh(new_knowledge)
+    await db.commit()
+    new_knowledge = await _load_knowledge(db, new_knowledge.id)
     _apply_aggregates(new_knowledge)
     return new_knowledge
 
 
 @router.put("/{knowledge_id}", response_model=KnowledgeResponse)
-async def update_knowledge(
+def update_knowledge(
     knowledge_id: UUID,
     knowledge_data: KnowledgeUpdate,
     db: Session = Depends(get_db),
@@ -186,9 +372,13 @@ async def update_knowledge(
     update_payload = knowledge_data.model_dump(exclude_unset=True)
     if "tipo" in update_payload and update_payload["tipo"]:
         update_payload["tipo"] = _normalize_tipo(update_payload["tipo"])
+    validity_before = (knowledge.tipo, knowledge.validade_meses)
     for field, value in update_payload.items():
         setattr(knowledge, field, value)
+    validity_changed = (knowledge.tipo, knowledge.validade_meses) != validity_before
     db.commit()
+    if validity_changed:
+        ExpiryService.recompute(db, knowledge_ids=[knowledge.id], previous_validity=validity_before)
     db.refresh(knowledge)
     _apply_aggregates(knowledge)
     return knowledge
@@ -197,16 +387,16 @@ async def update_knowledge(
 @router.delete("/{knowledge_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_knowledge(
     knowledge_id: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user),
 ):
     if current_user.role not in ["admin", "diretoria"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Sem permissão para remover conhecimentos")
-    knowledge = db.query(Knowledge).filter(Knowledge.id == knowledge_id).first()
+    knowledge = await db.get(Knowledge, knowledge_id)
     if not knowledge:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conhecimento não encontrado")
-    db.delete(knowledge)
-    db.commit()
+    await db.delete(knowledge)
+    await db.commit()
     return None
 
 
@@ -5,6 +5,7 @@ from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
+from app.core.row_security import get_scoped_db
 from app.core.security import get_current_user
 from app.database import get_db
 from app.models.employee import Employee
@@ -37,7 +38,7 @@ def ensure_employee(db: Session, employee_id: UUID) -> Employee:
 @router.get("/", response_model=List[EmployeeOneOnOneResponse])
 async def list_one_on_ones(
     employee_id: UUID = Query(..., description="ID do colaborador"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_scoped_db),
     current_user: User = Depends(get_current_user),
 ):
     ensure_permissions(current_user)
@@ -206,4 +206,21 @@ class EmployeeStats(BaseModel):
     timestamp: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class SimilarEmployeeResponse(BaseModel):
+    """Colaborador com perfil de conhecimentos parecido"""
+    employee_id: UUID
+    nome_completo: str
+    similaridade: float
+    conhecimentos_em_comum: int
+
+
+class KnowledgeSuggestionResponse(BaseModel):
+    """Conhecimento sugerido a partir dos colegas mais parecidos"""
+    knowledge_id: UUID
+    knowledge_nome: str
+    knowledge_tipo: Optional[str] = None
+    pontuacao: float
+    colegas_com_conhecimento: int
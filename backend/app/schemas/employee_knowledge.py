@@ -1,12 +1,13 @@
 from __future__ import annotations
 
 from datetime import date, datetime
-from typing import Optional
+from typing import List, Literal, Optional
 from uuid import UUID
 
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, model_validator, validator
 
 from app.models.employee_knowledge import StatusEnum as KnowledgeLinkStatus
+from app.schemas.employee import EmployeeResponse
 
 
 class EmployeeKnowledgeBase(BaseModel):
@@ -155,3 +156,114 @@ class EmployeeKnowledgeFilter(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class StaffingExpression(BaseModel):
+    """Nó da busca de alocação: um termo (knowledge_id + status) ou and/or/not."""
+
+    knowledge_id: Optional[UUID] = Field(default=None, description="Identificador do conhecimento (termo)")
+    status: Optional[Literal["DESEJADO", "OBTIDO", "OBRIGATORIO", "VIGENTE", "VENCIDO"]] = Field(
+        default=None,
+        description="Status do vínculo no termo; VIGENTE = obtido e não expirado (padrão)",
+    )
+    and_: Optional[List["StaffingExpression"]] = Field(default=None, alias="and")
+    or_: Optional[List["StaffingExpression"]] = Field(default=None, alias="or")
+    not_: Optional["StaffingExpression"] = Field(default=None, alias="not")
+
+    class Config:
+        populate_by_name = True
+
+    @model_validator(mode="after")
+    def validate_node(self):
+        kinds = [
+            self.knowledge_id is not None,
+            self.and_ is not None,
+            self.or_ is not None,
+            self.not_ is not None,
+        ]
+        if sum(kinds) != 1:
+            raise ValueError("Cada nó deve ter exatamente um entre: knowledge_id, and, or, not")
+        if self.status is not None and self.knowledge_id is None:
+            raise ValueError("status só é permitido em termos com knowledge_id")
+        return self
+
+
+class StaffingSearchRequest(BaseModel):
+    """Busca de alocação: expressão booleana sobre conhecimentos e filtros de organização."""
+
+    expressao: StaffingExpression
+    area_id: Optional[UUID] = None
+    team_id: Optional[UUID] = None
+    skip: int = Field(default=0, ge=0)
+    limit: int = Field(default=50, ge=1, le=500)
+
+
+class StaffingSearchResponse(BaseModel):
+    """Colaboradores encontrados, carregados apenas para a página pedida."""
+
+    total: int
+    tempo_avaliacao_us: float
+    items: List[EmployeeResponse]
+
+
+class EmployeeKnowledgeBulkAssign(BaseModel):
+    """Vincula um ou mais conhecimentos a vários colaboradores de uma vez."""
+
+    knowledge_ids: List[UUID] = Field(..., min_length=1, max_length=50, description="Identificadores dos conhecimentos")
+    employee_ids: Optional[List[UUID]] = Field(
+        default=None,
+        max_length=5000,
+        description="Identificadores explícitos de colaboradores (combinados com os filtros abaixo)",
+    )
+    area_id: Optional[UUID] = Field(default=None, description="Apenas colaboradores desta área")
+    team_id: Optional[UUID] = Field(default=None, description="Apenas colaboradores deste time")
+    manager_id: Optional[UUID] = Field(default=None, description="Apenas colaboradores sob este gestor")
+    incluir_subordinados_indiretos: bool = Field(
+        default=True,
+        description="Com manager_id, inclui toda a árvore de subordinados",
+    )
+    status: Literal["DESEJADO", "OBRIGATORIO"] = Field(
+        default="OBRIGATORIO",
+        description="Status dos novos vínculos",
+    )
+    data_limite: Optional[date] = Field(default=None, description="Data limite dos novos vínculos")
+    atualizar_existentes: bool = Field(
+        default=False,
+        description="Aplica status/data_limite também aos vínculos existentes ainda não obtidos",
+    )
+
+    @model_validator(mode="after")
+    def validate_target(self):
+        if not self.employee_ids and not (self.area_id or self.team_id or self.manager_id):
+            raise ValueError("Informe employee_ids ou ao menos um filtro de colaboradores")
+        return self
+
+
+class EmployeeKnowledgeBulkResult(BaseModel):
+    colaboradores: int
+    vinculos_solicitados: int
+    criados: int
+    atualizados: int
+    existentes: int
+    # employee_ids informados que ficaram de fora (inativos, inexistentes,
+    # fora dos filtros ou fora do escopo do usuário)
+    ignorados: List[UUID] = []
+
+
+class LmsImportIssue(BaseModel):
+    linha: int
+    motivo: str
+    email: Optional[str] = None
+    conhecimento: Optional[str] = None
+
+
+class LmsImportReport(BaseModel):
+    """Relatório de conciliação de uma importação de progresso do LMS."""
+
+    simulacao: bool
+    linhas_lidas: int
+    atualizados: int
+    concluidos: int
+    inalterados: int
+    rejeitadas: dict
+    ocorrencias: List[LmsImportIssue]
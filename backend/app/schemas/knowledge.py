@@ -1,7 +1,7 @@
 from decimal import Decimal
 from datetime import datetime
 from uuid import UUID
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 
 from pydantic import BaseModel, Field
 
@@ -74,5 +74,92 @@ class KnowledgeSummary(BaseModel):
     total: int
     por_tipo: Dict[str, int]
     obrigatorios: int
+    horizonte_dias: int = 60
+    expiram_no_horizonte: int = 0
+    # Mantido por compatibilidade com o painel: sempre a janela fixa de 60 dias.
     expiram_ate_60_dias: int
     colaboradores_afetados: int
+
+
+class KnowledgeFacetCount(BaseModel):
+    valor: Optional[str] = None
+    total: int
+
+
+class KnowledgeSearchResponse(BaseModel):
+    total: int
+    items: List[KnowledgeResponse]
+    facetas: Dict[str, List[KnowledgeFacetCount]]
+
+
+class RenewalForecastGroup(BaseModel):
+    grupo_id: Optional[str] = None
+    grupo_nome: str
+    renovacoes: List[int]
+    custo: List[float]
+    total_renovacoes: int
+    custo_total: float
+
+
+class RenewalForecastResponse(BaseModel):
+    """Renovações e custo previstos por mês; listas alinhadas com ``meses``."""
+
+    gerado_em: datetime
+    agrupamento: str
+    horizonte_meses: int
+    meses: List[str]
+    renovacoes: List[int]
+    custo: List[float]
+    total_renovacoes: int
+    custo_total: float
+    vencidas: int
+    sem_custo: int
+    grupos: List[RenewalForecastGroup]
+
+
+class KnowledgeMatrixAxis(BaseModel):
+    id: List[str]
+    nome: List[str]
+    tipo: Optional[List[str]] = None
+
+
+class KnowledgeMatrixResponse(BaseModel):
+    """Matriz colaborador × conhecimento em formato colunar (coordenadas esparsas)."""
+
+    employees: KnowledgeMatrixAxis
+    knowledge: KnowledgeMatrixAxis
+    status_labels: List[str]
+    employee_index: List[int]
+    knowledge_index: List[int]
+    status: List[int]
+
+
+class SkillGapHolder(BaseModel):
+    id: UUID
+    nome: Optional[str] = None
+
+
+class SkillGapEntry(BaseModel):
+    escopo: str
+    escopo_id: Optional[UUID] = None
+    escopo_nome: Optional[str] = None
+    knowledge_id: UUID
+    knowledge_nome: str
+    obrigatorios: int
+    obtidos: int
+    expirando: int
+    faltantes: int
+    cobertura: float
+    colaboradores_faltantes: List[SkillGapHolder] = Field(default_factory=list)
+
+    class Config:
+        from_attributes = True
+
+
+class SkillGapReport(BaseModel):
+    gerado_em: datetime
+    horizonte_dias: int
+    itens: List[SkillGapEntry]
+
+    class Config:
+        from_attributes = True
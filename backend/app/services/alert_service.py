@@ -6,6 +6,7 @@ from typing import Iterable, Optional, Set, Tuple
 from uuid import UUID
 
 from sqlalchemy.orm import Session, joinedload
+from app.core.metrics import ALERT_REFRESH_DURATION
 
 from app.models.alert import Alert, AlertPriorityEnum, AlertTypeEnum
 from app.models.employee import Employee, EmployeeTypeEnum
@@ -42,6 +43,7 @@ class AlertService:
     }
 
     @classmethod
+    @ALERT_REFRESH_DURATION.time()
     def refresh_alerts(cls, db: Session) -> int:
         """Recalcula os alertas dinâmicos e retorna o total ativo."""
         existing_alerts = (
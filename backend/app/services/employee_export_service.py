@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import csv
+import io
+from typing import Iterator, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session, aliased
+
+from app.core.security import FieldAccessControl
+from app.models.area import Area
+from app.models.employee import Employee
+from app.models.manager import Manager
+from app.models.team import Team
+
+# Colunas do CSV, na ordem de saída
+EXPORT_COLUMNS = (
+    "nome_completo",
+    "email_corporativo",
+    "email_pessoal",
+    "cpf",
+    "rg",
+    "data_nascimento",
+    "telefone_corporativo",
+    "telefone_pessoal",
+    "endereco_completo",
+    "cargo",
+    "senioridade",
+    "tipo_cadastro",
+    "status",
+    "data_admissao",
+    "area",
+    "time",
+    "gestor",
+    "salario_atual",
+    "ultima_alteracao_salarial",
+)
+
+_CPF_PLACEHOLDER = "00000000000"
+
+
+class EmployeeExportService:
+    """Exportação da lista de colaboradores com os campos mascarados por role.
+
+    Os planos de mascaramento (dados de terceiros e dados próprios) são
+    obtidos uma vez por exportação. Campos cujo valor mascarado não depende
+    do valor real nem chegam a ser lidos do banco: quando nenhuma linha pode
+    exibi-los, a coluna sai da projeção.
+    """
+
+    @staticmethod
+    def _projection(hidden: frozenset) -> Tuple[List[sa.ColumnElement], type]:
+        manager_employee = aliased(Employee)
+        columns = {
+            "area": Area.nome,
+            "time": Team.nome,
+            "gestor": manager_employee.nome_completo,
+        }
+        projection = [Employee.id]
+        for name in EXPORT_COLUMNS:
+            column = columns.get(name, getattr(Employee, name, None))
+            projection.append((sa.null() if name in hidden else column).label(name))
+        return projection, manager_employee
+
+    @classmethod
+    def iter_csv(
+        cls,
+        db: Session,
+        criteria: Sequence[sa.ColumnElement],
+        user_role: str,
+        own_employee_id: Optional[UUID] = None,
+    ) -> Iterator[str]:
+        """
+        Gera o CSV dos colaboradores que atendem aos critérios
+
+        Args:
+            db: Sessão do banco
+            criteria: Filtros sobre Employee (os mesmos da listagem)
+            user_role: Role de quem exporta
+            own_employee_id: Colaborador de quem exporta (dados próprios)
+        """
+        plan = FieldAccessControl.masking_plan("employee", user_role, False)
+        own_plan = FieldAccessControl.masking_plan("employee", user_role, True)
+
+        # Só sai da consulta o que é restrito em ambos os planos e cuja
+        # máscara não usa o valor (o CPF mascarado mantém os 2 últimos dígitos)
+        value_free = {
+            field for field in plan.hidden & own_plan.hidden
+            if plan.masks[field](_CPF_PLACEHOLDER) == plan.masks[field](None)
+        }
+        projection, manager_employee = cls._projection(frozenset(value_free))
+        stmt = (
+            sa.select(*projection)
+            .select_from(Employee)
+            .outerjoin(Area, Area.id == Employee.area_id)
+            .outerjoin(Team, Team.id == Employee.team_id)
+            .outerjoin(Manager, Manager.id == Employee.manager_id)
+            .outerjoin(manager_employee, manager_employee.id == Manager.employee_id)
+            .where(*criteria)
+            .order_by(Employee.nome_completo)
+        )
+        # Consulta executada já aqui: o CSV é gerado depois que o endpoint retorna
+        rows = db.execute(stmt).all()
+        return cls._write(rows, plan, own_plan, own_employee_id)
+
+    @staticmethod
+    def _write(rows, plan, own_plan, own_employee_id: Optional[UUID]) -> Iterator[str]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def flush() -> str:
+            value = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            return value
+
+        writer.writerow(EXPORT_COLUMNS)
+        yield flush()
+
+        for position, row in enumerate(rows):
+            values = row._asdict()
+            employee_id = values.pop("id")
+            row_plan = own_plan if own_employee_id is not None and employee_id == own_employee_id else plan
+            values = row_plan.apply(values)
+            writer.writerow(["" if values[name] is None else getattr(values[name], "value", values[name]) for name in EXPORT_COLUMNS])
+            if position % 200 == 199:
+                yield flush()
+        yield flush()
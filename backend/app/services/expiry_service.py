@@ -0,0 +1,150 @@
+"""
+Serviço de expiração de certificações
+Recalcula data_expiracao dos vínculos em lote, direto no banco
+"""
+from __future__ import annotations
+
+import logging
+from typing import Iterable, Optional, Tuple
+from uuid import UUID
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.core.cache import invalidate_tables
+from app.models.employee_knowledge import EmployeeKnowledge, StatusEnum as KnowledgeLinkStatus
+from app.models.knowledge import Knowledge, KnowledgeCategoryEnum
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class ExpiryService:
+    """Mantém data_expiracao coerente com a validade do catálogo"""
+
+    @staticmethod
+    def expected_expiration(data_obtencao=None):
+        """
+        Expressão SQL equivalente a ``_compute_expiration``: data de obtenção
+        mais ``validade_meses`` (o PostgreSQL ajusta o fim de mês, como em
+        31/01 + 1 mês = 28/02) apenas para certificações com validade.
+
+        Args:
+            data_obtencao: Expressão da data de obtenção (padrão: a coluna do vínculo)
+        """
+        if data_obtencao is None:
+            data_obtencao = EmployeeKnowledge.data_obtencao
+        return sa.case(
+            (
+                sa.and_(
+                    Knowledge.tipo == KnowledgeCategoryEnum.CERTIFICACAO,
+                    Knowledge.validade_meses > 0,
+                ),
+                sa.cast(
+                    data_obtencao
+                    + sa.func.make_interval(0, Knowledge.validade_meses),
+                    sa.Date,
+                ),
+            ),
+            else_=sa.null(),
+        )
+
+    @staticmethod
+    def _derived_before(validity: Tuple[KnowledgeCategoryEnum, Optional[int]]):
+        """Expiração que a validade anterior teria gerado (None se não gerava nenhuma)"""
+        tipo, validade_meses = validity
+        if tipo != KnowledgeCategoryEnum.CERTIFICACAO or not validade_meses or validade_meses <= 0:
+            return None
+        return sa.cast(
+            EmployeeKnowledge.data_obtencao + sa.func.make_interval(0, sa.literal(validade_meses)),
+            sa.Date,
+        )
+
+    @classmethod
+    def recompute(
+        cls,
+        db: Session,
+        knowledge_ids: Optional[Iterable[UUID]] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        previous_validity: Optional[Tuple[KnowledgeCategoryEnum, Optional[int]]] = None,
+    ) -> int:
+        """
+        Recalcula a expiração dos vínculos OBTIDO com data de obtenção
+
+        Cada lote é um ``UPDATE … FROM knowledge`` limitado a ``batch_size``
+        linhas e confirmado em seguida, para não segurar locks longos em
+        ``employee_knowledge``. Só linhas cujo valor muda são tocadas, então
+        o laço termina quando um lote volta vazio.
+
+        Datas informadas manualmente no vínculo são preservadas quando
+        ``previous_validity`` é dado: só mudam os vínculos sem expiração ou com
+        a expiração que a validade anterior geraria (e só esses podem voltar a
+        NULL, se o conhecimento deixou de ter validade). Sem ele (recálculo
+        administrativo), apenas certificações com validade são realinhadas e
+        nenhuma data é apagada.
+
+        Args:
+            db: Sessão do banco (cada lote faz commit)
+            knowledge_ids: Restringe a estes conhecimentos (None = catálogo todo)
+            batch_size: Máximo de vínculos por lote
+            previous_validity: (tipo, validade_meses) antes da alteração, para
+                todos os ``knowledge_ids``
+
+        Returns:
+            Total de vínculos atualizados
+        """
+        expected = cls.expected_expiration()
+        criteria = [
+            EmployeeKnowledge.status == KnowledgeLinkStatus.OBTIDO,
+            EmployeeKnowledge.data_obtencao.isnot(None),
+            EmployeeKnowledge.data_expiracao.is_distinct_from(expected),
+        ]
+        if previous_validity is None:
+            criteria += [
+                Knowledge.tipo == KnowledgeCategoryEnum.CERTIFICACAO,
+                Knowledge.validade_meses > 0,
+            ]
+        else:
+            derived = cls._derived_before(previous_validity)
+            untouched = EmployeeKnowledge.data_expiracao.is_(None)
+            criteria.append(untouched if derived is None else sa.or_(untouched, EmployeeKnowledge.data_expiracao == derived))
+        pending = (
+            sa.select(EmployeeKnowledge.id)
+            .join(Knowledge, Knowledge.id == EmployeeKnowledge.knowledge_id)
+            .where(*criteria)
+            .limit(batch_size)
+        )
+        if knowledge_ids is not None:
+            knowledge_ids = list(knowledge_ids)
+            if not knowledge_ids:
+                return 0
+            pending = pending.where(EmployeeKnowledge.knowledge_id.in_(knowledge_ids))
+        batch = pending.cte("batch")
+
+        statement = (
+            sa.update(EmployeeKnowledge)
+            .where(
+                EmployeeKnowledge.id == batch.c.id,
+                Knowledge.id == EmployeeKnowledge.knowledge_id,
+            )
+            .values(data_expiracao=expected, updated_at=sa.func.now())
+            .returning(EmployeeKnowledge.id)
+        )
+
+        total = 0
+        while True:
+            try:
+                updated_ids = db.execute(statement).scalars().all()
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            if not updated_ids:
+                break
+            total += len(updated_ids)
+            invalidate_tables("employee_knowledge", keys=updated_ids)
+
+        if total:
+            logger.info(f"Expiração recalculada em {total} vínculo(s)")
+        return total
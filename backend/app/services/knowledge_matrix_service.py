@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import csv
+import io
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, Iterator, List, Optional
+from uuid import UUID
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.models.employee import Employee
+from app.models.employee_knowledge import EmployeeKnowledge, StatusEnum as KnowledgeLinkStatus
+from app.models.knowledge import Knowledge, KnowledgeCategoryEnum
+from app.services.org_scope import employee_scope_select
+
+# Códigos compactos de status; o índice 0 representa "sem vínculo".
+STATUS_LABELS: List[str] = ["", "DESEJADO", "OBTIDO", "OBRIGATORIO", "VENCIDO"]
+STATUS_CODES: Dict[KnowledgeLinkStatus, int] = {
+    KnowledgeLinkStatus.DESEJADO: 1,
+    KnowledgeLinkStatus.OBTIDO: 2,
+    KnowledgeLinkStatus.OBRIGATORIO: 3,
+}
+VENCIDO_CODE = 4
+
+
+@dataclass
+class KnowledgeMatrix:
+    employee_ids: List[str] = field(default_factory=list)
+    employee_names: List[str] = field(default_factory=list)
+    knowledge_ids: List[str] = field(default_factory=list)
+    knowledge_names: List[str] = field(default_factory=list)
+    knowledge_tipos: List[str] = field(default_factory=list)
+    employee_index: List[int] = field(default_factory=list)
+    knowledge_index: List[int] = field(default_factory=list)
+    status: List[int] = field(default_factory=list)
+
+    def to_columnar(self) -> dict:
+        return {
+            "employees": {"id": self.employee_ids, "nome": self.employee_names},
+            "knowledge": {"id": self.knowledge_ids, "nome": self.knowledge_names, "tipo": self.knowledge_tipos},
+            "status_labels": STATUS_LABELS,
+            "employee_index": self.employee_index,
+            "knowledge_index": self.knowledge_index,
+            "status": self.status,
+        }
+
+    def iter_csv(self) -> Iterator[str]:
+        """Gera o CSV linha a linha (uma linha por colaborador)."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def flush() -> str:
+            value = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            return value
+
+        writer.writerow(["colaborador", *self.knowledge_names])
+        yield flush()
+
+        width = len(self.knowledge_ids)
+        position = 0
+        total = len(self.employee_index)
+        for emp_idx, emp_name in enumerate(self.employee_names):
+            row = [""] * width
+            while position < total and self.employee_index[position] == emp_idx:
+                row[self.knowledge_index[position]] = STATUS_LABELS[self.status[position]]
+                position += 1
+            writer.writerow([emp_name, *row])
+            if emp_idx % 200 == 199:
+                yield flush()
+        yield flush()
+
+
+class KnowledgeMatrixService:
+    """Monta a matriz colaborador × conhecimento em uma única consulta."""
+
+    @staticmethod
+    def build(
+        db: Session,
+        area_id: Optional[UUID] = None,
+        team_id: Optional[UUID] = None,
+        manager_id: Optional[UUID] = None,
+        tipo: Optional[KnowledgeCategoryEnum] = None,
+        restrict_to=None,
+    ) -> KnowledgeMatrix:
+        """
+        Args:
+            restrict_to: Critério extra sobre Employee.id (ex.: ``ManagerScope.filter``)
+        """
+        scope = employee_scope_select(area_id=area_id, team_id=team_id, manager_id=manager_id)
+        if restrict_to is not None:
+            scope = scope.where(restrict_to)
+        link_join = EmployeeKnowledge.employee_id == Employee.id
+        knowledge_join = Knowledge.id == EmployeeKnowledge.knowledge_id
+        if tipo:
+            knowledge_join = sa.and_(knowledge_join, Knowledge.tipo == tipo)
+
+        rows = db.execute(
+            sa.select(
+                Employee.id,
+                Employee.nome_completo,
+                Knowledge.id,
+                Knowledge.nome,
+                Knowledge.tipo,
+                EmployeeKnowledge.status,
+                EmployeeKnowledge.data_expiracao,
+            )
+            .select_from(Employee)
+            .outerjoin(EmployeeKnowledge, link_join)
+            .outerjoin(Knowledge, knowledge_join)
+            .where(Employee.id.in_(scope))
+            .order_by(Employee.nome_completo, Employee.id)
+        ).all()
+
+        matrix = KnowledgeMatrix()
+        employee_positions: Dict[UUID, int] = {}
+        knowledge_positions: Dict[UUID, int] = {}
+        entries = []
+        today = date.today()
+
+        for emp_id, emp_nome, k_id, k_nome, k_tipo, link_status, data_expiracao in rows:
+            emp_idx = employee_positions.get(emp_id)
+            if emp_idx is None:
+                emp_idx = employee_positions[emp_id] = len(matrix.employee_ids)
+                matrix.employee_ids.append(str(emp_id))
+                matrix.employee_names.append(emp_nome)
+            if k_id is None:
+                continue
+            k_idx = knowledge_positions.get(k_id)
+            if k_idx is None:
+                k_idx = knowledge_positions[k_id] = len(matrix.knowledge_ids)
+                matrix.knowledge_ids.append(str(k_id))
+                matrix.knowledge_names.append(k_nome)
+                matrix.knowledge_tipos.append(k_tipo.value if hasattr(k_tipo, "value") else k_tipo)
+            code = STATUS_CODES.get(link_status, 0)
+            if code == STATUS_CODES[KnowledgeLinkStatus.OBTIDO] and data_expiracao and data_expiracao < today:
+                code = VENCIDO_CODE
+            entries.append((emp_idx, k_idx, code))
+
+        # Colunas de conhecimento em ordem alfabética; índices remapeados.
+        order = sorted(range(len(matrix.knowledge_ids)), key=matrix.knowledge_names.__getitem__)
+        remap = [0] * len(order)
+        for new_idx, old_idx in enumerate(order):
+            remap[old_idx] = new_idx
+        matrix.knowledge_ids = [matrix.knowledge_ids[i] for i in order]
+        matrix.knowledge_names = [matrix.knowledge_names[i] for i in order]
+        matrix.knowledge_tipos = [matrix.knowledge_tipos[i] for i in order]
+
+        entries.sort(key=lambda entry: (entry[0], remap[entry[1]]))
+        matrix.employee_index = [entry[0] for entry in entries]
+        matrix.knowledge_index = [remap[entry[1]] for entry in entries]
+        matrix.status = [entry[2] for entry in entries]
+        return matrix
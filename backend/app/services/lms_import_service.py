@@ -0,0 +1,314 @@
+"""
+Importação de progresso do LMS
+Lê o CSV do fornecedor de treinamentos em fluxo e atualiza os vínculos em lote
+"""
+from __future__ import annotations
+
+import csv
+import io
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from itertools import chain
+from typing import IO, Dict, List, Optional, Tuple
+from uuid import UUID
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.orm import Session
+
+from app.core.cache import invalidate_tables
+from app.models.employee import Employee
+from app.models.employee_knowledge import EmployeeKnowledge, StatusEnum as KnowledgeLinkStatus
+from app.models.knowledge import Knowledge
+from app.services.expiry_service import ExpiryService
+from app.services.manager_scope import ManagerScope
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_OCORRENCIAS = 200
+
+# Cabeçalhos aceitos para cada campo (comparados em minúsculas)
+COLUMN_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "email": ("email", "e-mail", "email_colaborador", "employee_email", "user_email"),
+    "conhecimento": ("conhecimento", "curso", "nome_curso", "course", "course_name", "knowledge"),
+    "codigo": ("codigo", "código", "codigo_certificacao", "code", "course_code"),
+    "progresso": ("progresso", "progress", "percentual", "completion", "completion_percent"),
+    "status": ("status", "situacao", "situação"),
+    "data_conclusao": ("data_conclusao", "data_obtencao", "conclusao", "completed_at", "completion_date"),
+}
+COMPLETED_STATUSES = {"concluido", "concluído", "completo", "aprovado", "obtido", "completed", "complete", "passed"}
+
+NAO_ENCONTRADO_COLABORADOR = "colaborador_nao_encontrado"
+NAO_ENCONTRADO_CONHECIMENTO = "conhecimento_nao_encontrado"
+VINCULO_INEXISTENTE = "vinculo_inexistente"
+FORA_DO_ESCOPO = "fora_do_escopo"
+LINHA_INVALIDA = "linha_invalida"
+
+
+@dataclass
+class LmsImportIssue:
+    linha: int
+    motivo: str
+    email: Optional[str] = None
+    conhecimento: Optional[str] = None
+
+
+@dataclass
+class LmsImportReport:
+    simulacao: bool = False
+    linhas_lidas: int = 0
+    atualizados: int = 0
+    concluidos: int = 0
+    inalterados: int = 0
+    rejeitadas: Dict[str, int] = field(default_factory=Counter)
+    ocorrencias: List[LmsImportIssue] = field(default_factory=list)
+
+    def reject(self, linha: int, motivo: str, email: Optional[str], conhecimento: Optional[str]) -> None:
+        self.rejeitadas[motivo] += 1
+        if len(self.ocorrencias) < MAX_OCORRENCIAS:
+            self.ocorrencias.append(LmsImportIssue(linha, motivo, email, conhecimento))
+
+
+@dataclass
+class _Lookups:
+    employees: Dict[str, UUID]
+    knowledge_by_code: Dict[str, UUID]
+    knowledge_by_name: Dict[str, UUID]
+    links: Dict[Tuple[UUID, UUID], Tuple[UUID, str, Optional[float]]]
+
+
+def _parse_progress(value: Optional[str]) -> Optional[float]:
+    if value is None or not value.strip():
+        return None
+    number = float(value.strip().rstrip("%").replace(",", "."))
+    if not 0.0 <= number <= 100.0:
+        raise ValueError(number)
+    return number
+
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    if value is None or not value.strip():
+        return None
+    value = value.strip()
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        return datetime.strptime(value, "%d/%m/%Y").date()
+
+
+class LmsImportService:
+    """Concilia o CSV de progresso do LMS com employee_knowledge"""
+
+    @staticmethod
+    def _load_lookups(db: Session) -> _Lookups:
+        employees: Dict[str, UUID] = {}
+        for emp_id, corporativo, pessoal in db.execute(
+            sa.select(Employee.id, Employee.email_corporativo, Employee.email_pessoal)
+        ):
+            if pessoal:
+                employees.setdefault(pessoal.strip().lower(), emp_id)
+            if corporativo:
+                # O e-mail corporativo tem prioridade sobre o pessoal
+                employees[corporativo.strip().lower()] = emp_id
+
+        knowledge_by_code: Dict[str, UUID] = {}
+        knowledge_by_name: Dict[str, UUID] = {}
+        for k_id, nome, codigo in db.execute(sa.select(Knowledge.id, Knowledge.nome, Knowledge.codigo_certificacao)):
+            knowledge_by_name[nome.strip().lower()] = k_id
+            if codigo:
+                knowledge_by_code[codigo.strip().lower()] = k_id
+
+        links = {
+            (emp_id, k_id): (link_id, getattr(link_status, "value", link_status), progresso)
+            for link_id, emp_id, k_id, link_status, progresso in db.execute(
+                sa.select(
+                    EmployeeKnowledge.id,
+                    EmployeeKnowledge.employee_id,
+                    EmployeeKnowledge.knowledge_id,
+                    EmployeeKnowledge.status,
+                    EmployeeKnowledge.progresso,
+                )
+            )
+        }
+        return _Lookups(employees, knowledge_by_code, knowledge_by_name, links)
+
+    @staticmethod
+    def _resolve_columns(header: List[str]) -> Dict[str, int]:
+        normalized = [column.strip().lower() for column in header]
+        columns = {}
+        for name, aliases in COLUMN_ALIASES.items():
+            for alias in aliases:
+                if alias in normalized:
+                    columns[name] = normalized.index(alias)
+                    break
+        return columns
+
+    @staticmethod
+    def _flush(db: Session, pending: Dict[UUID, Tuple[float, bool, Optional[date]]]) -> None:
+        """Aplica um lote com um único UPDATE … FROM (VALUES …)"""
+        lms = sa.values(
+            sa.column("id", PG_UUID(as_uuid=True)),
+            sa.column("progresso", sa.Float),
+            sa.column("obtido", sa.Boolean),
+            sa.column("data_obtencao", sa.Date),
+            name="lms",
+        ).data([(link_id, *values) for link_id, values in pending.items()])
+
+        status_type = EmployeeKnowledge.__table__.c.status.type
+        # O psycopg2 envia None como NULL sem tipo: num lote sem conclusões a
+        # coluna do VALUES sairia como text
+        data_obtencao = sa.cast(lms.c.data_obtencao, sa.Date)
+        statement = (
+            sa.update(EmployeeKnowledge)
+            .where(
+                EmployeeKnowledge.id == lms.c.id,
+                Knowledge.id == EmployeeKnowledge.knowledge_id,
+            )
+            .values(
+                progresso=lms.c.progresso,
+                status=sa.case(
+                    (lms.c.obtido, sa.literal(KnowledgeLinkStatus.OBTIDO, status_type)),
+                    else_=EmployeeKnowledge.status,
+                ),
+                data_obtencao=sa.case(
+                    (lms.c.obtido, data_obtencao),
+                    else_=EmployeeKnowledge.data_obtencao,
+                ),
+                data_expiracao=sa.case(
+                    (lms.c.obtido, ExpiryService.expected_expiration(data_obtencao)),
+                    else_=EmployeeKnowledge.data_expiracao,
+                ),
+                updated_at=sa.func.now(),
+            )
+        )
+        try:
+            db.execute(statement)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        invalidate_tables("employee_knowledge", keys=pending.keys())
+
+    @classmethod
+    def run(
+        cls,
+        db: Session,
+        stream: IO[bytes],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        dry_run: bool = False,
+        scope: Optional[ManagerScope] = None,
+    ) -> LmsImportReport:
+        """
+        Importa o arquivo linha a linha
+
+        As linhas são casadas com os vínculos por (e-mail do colaborador,
+        código ou nome do conhecimento) usando mapas em memória carregados
+        uma única vez. Progresso 100 (ou status de conclusão) marca o vínculo
+        como OBTIDO e calcula a expiração no próprio UPDATE. Cada lote é
+        confirmado separadamente.
+
+        Args:
+            db: Sessão do banco
+            stream: Arquivo CSV binário (UTF-8, separador ',' ou ';')
+            batch_size: Vínculos por UPDATE
+            dry_run: Apenas concilia, sem gravar
+            scope: Escopo de gestão do usuário; linhas de colaboradores fora
+                dele são rejeitadas (None = sem restrição)
+
+        Returns:
+            Relatório de conciliação
+        """
+        report = LmsImportReport(simulacao=dry_run)
+        text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+        header_line = text.readline()
+        if not header_line.strip():
+            return report
+        delimiter = ";" if header_line.count(";") > header_line.count(",") else ","
+        reader = csv.reader(chain([header_line], text), delimiter=delimiter)
+        columns = cls._resolve_columns(next(reader))
+        if "email" not in columns or not ({"conhecimento", "codigo"} & columns.keys()):
+            raise ValueError("O arquivo precisa das colunas de e-mail e de conhecimento (nome ou código)")
+
+        def cell(row: List[str], name: str) -> Optional[str]:
+            index = columns.get(name)
+            if index is None or index >= len(row):
+                return None
+            return row[index].strip() or None
+
+        lookups = cls._load_lookups(db)
+        today = date.today()
+        pending: Dict[UUID, Tuple[float, bool, Optional[date]]] = {}
+
+        for line_number, row in enumerate(reader, start=2):
+            if not any(value.strip() for value in row):
+                continue
+            report.linhas_lidas += 1
+            email = cell(row, "email")
+            codigo = cell(row, "codigo")
+            nome = cell(row, "conhecimento")
+            knowledge_label = codigo or nome
+
+            employee_id = lookups.employees.get(email.lower()) if email else None
+            if not employee_id:
+                report.reject(line_number, NAO_ENCONTRADO_COLABORADOR, email, knowledge_label)
+                continue
+            if scope is not None and not scope.manages(employee_id):
+                report.reject(line_number, FORA_DO_ESCOPO, email, knowledge_label)
+                continue
+            knowledge_id = (lookups.knowledge_by_code.get(codigo.lower()) if codigo else None) or (
+                lookups.knowledge_by_name.get(nome.lower()) if nome else None
+            )
+            if not knowledge_id:
+                report.reject(line_number, NAO_ENCONTRADO_CONHECIMENTO, email, knowledge_label)
+                continue
+            link = lookups.links.get((employee_id, knowledge_id))
+            if not link:
+                report.reject(line_number, VINCULO_INEXISTENTE, email, knowledge_label)
+                continue
+
+            try:
+                progresso = _parse_progress(cell(row, "progresso"))
+                data_conclusao = _parse_date(cell(row, "data_conclusao"))
+            except ValueError:
+                report.reject(line_number, LINHA_INVALIDA, email, knowledge_label)
+                continue
+            status_lms = (cell(row, "status") or "").lower()
+            concluido = status_lms in COMPLETED_STATUSES or (progresso is not None and progresso >= 100.0)
+            if progresso is None and not concluido:
+                report.reject(line_number, LINHA_INVALIDA, email, knowledge_label)
+                continue
+
+            link_id, current_status, current_progress = link
+            if current_status == KnowledgeLinkStatus.OBTIDO.value:
+                # Já obtido: o LMS não rebaixa nem reabre o vínculo
+                report.inalterados += 1
+                continue
+            if concluido:
+                progresso = 100.0
+            elif current_progress is not None and abs(current_progress - progresso) < 1e-9:
+                report.inalterados += 1
+                continue
+
+            new_status = KnowledgeLinkStatus.OBTIDO.value if concluido else current_status
+            pending[link_id] = (progresso, concluido, (data_conclusao or today) if concluido else None)
+            lookups.links[(employee_id, knowledge_id)] = (link_id, new_status, progresso)
+            report.atualizados += 1
+            if concluido:
+                report.concluidos += 1
+
+            if len(pending) >= batch_size:
+                if not dry_run:
+                    cls._flush(db, pending)
+                pending = {}
+
+        if pending and not dry_run:
+            cls._flush(db, pending)
+
+        logger.info(
+            f"Importação LMS: {report.linhas_lidas} linha(s), {report.atualizados} atualização(ões), "
+            f"{sum(report.rejeitadas.values())} rejeitada(s){' (simulação)' if dry_run else ''}"
+        )
+        return report
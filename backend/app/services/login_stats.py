@@ -0,0 +1,113 @@
+"""
+Estatísticas de login em lote
+Acumula last_login/login_count em memória e grava periodicamente
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+from uuid import UUID
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+
+from app.config import settings
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+class LoginStatsWriter:
+    """
+    Grava as estatísticas de login fora da requisição
+
+    O login só registra o evento em memória; uma thread grava tudo a cada
+    LOGIN_STATS_FLUSH_SECONDS com um único ``UPDATE … FROM (VALUES …)``.
+    Se a gravação falhar, os contadores voltam para a fila e entram no
+    próximo lote.
+
+    O UPDATE não invalida o cache de usuários autenticados de propósito:
+    o Principal não carrega last_login/login_count.
+    """
+
+    def __init__(self) -> None:
+        self._pending: Dict[UUID, Tuple[int, datetime]] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, user_id: UUID, when: Optional[datetime] = None) -> int:
+        """
+        Registra um login
+
+        Returns:
+            Logins deste usuário ainda não gravados (incluindo este)
+        """
+        when = when or datetime.now(timezone.utc)
+        with self._lock:
+            count, last = self._pending.get(user_id, (0, when))
+            self._pending[user_id] = (count + 1, max(last, when))
+            pending = count + 1
+        self._ensure_started()
+        return pending
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop_event.clear()
+                self._thread = threading.Thread(target=self._run, name="login-stats", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(settings.LOGIN_STATS_FLUSH_SECONDS):
+            self.flush()
+
+    def stop(self) -> None:
+        """Para a thread e grava o que estiver pendente"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=settings.LOGIN_STATS_FLUSH_SECONDS + 5)
+            self._thread = None
+        self.flush()
+
+    def flush(self) -> int:
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+
+        stats = sa.values(
+            sa.column("id", PG_UUID(as_uuid=True)),
+            sa.column("logins", sa.Integer),
+            sa.column("last_login", sa.DateTime(timezone=True)),
+            name="stats",
+        ).data([(user_id, count, last) for user_id, (count, last) in batch.items()])
+        statement = (
+            sa.update(User)
+            .where(User.id == stats.c.id)
+            .values(
+                login_count=sa.func.coalesce(User.login_count, 0) + stats.c.logins,
+                last_login=sa.func.greatest(User.last_login, stats.c.last_login),
+            )
+        )
+
+        from app.database import engine
+
+        try:
+            with engine.begin() as conn:
+                conn.execute(statement)
+        except Exception as exc:
+            logger.error(f"Erro ao gravar estatísticas de login: {exc}")
+            with self._lock:
+                for user_id, (count, last) in batch.items():
+                    pending_count, pending_last = self._pending.get(user_id, (0, last))
+                    self._pending[user_id] = (pending_count + count, max(pending_last, last))
+            return 0
+        return len(batch)
+
+
+login_stats = LoginStatsWriter()
@@ -0,0 +1,170 @@
+"""
+Escopo de gestão
+Colaboradores geridos por um usuário, resolvidos uma vez e mantidos em cache
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import FrozenSet, Optional, Tuple, Union
+from uuid import UUID
+
+import sqlalchemy as sa
+from fastapi import Depends
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.cache import DatasetCache
+from app.core.security import get_current_user
+from app.database import SessionLocal, get_db
+from app.models.employee import Employee, EmployeeTypeEnum
+from app.models.manager import Manager
+from app.services.org_scope import manager_subtree_cte
+
+SOURCE_TABLES = ("employees", "managers")
+
+UNRESTRICTED_ROLES = ("admin", "diretoria")
+
+
+def _as_uuid(value: Union[UUID, str, None]) -> Optional[UUID]:
+    if value is None or isinstance(value, UUID):
+        return value
+    try:
+        return UUID(str(value))
+    except ValueError:
+        return None
+
+
+@dataclass(frozen=True)
+class ManagerScope:
+    """
+    Colaboradores que um usuário enxerga como gestor
+
+    Admin, diretoria e colaboradores do tipo DIRETOR não têm restrição
+    (``unrestricted``). Para os demais, ``employee_ids`` traz os geridos
+    (diretos ou a árvore toda) e ``own_employee_id`` o próprio cadastro,
+    que fica None se o usuário não tiver colaborador vinculado.
+    """
+
+    unrestricted: bool
+    own_employee_id: Optional[UUID]
+    manager_id: Optional[UUID]
+    employee_ids: FrozenSet[UUID]
+
+    @property
+    def is_manager(self) -> bool:
+        return self.manager_id is not None
+
+    def manages(self, employee_id: Union[UUID, str, None]) -> bool:
+        """True se o colaborador está sob a gestão do usuário"""
+        if self.unrestricted:
+            return True
+        return _as_uuid(employee_id) in self.employee_ids
+
+    def can_see(self, employee_id: Union[UUID, str, None]) -> bool:
+        """Geridos ou o próprio colaborador"""
+        employee_id = _as_uuid(employee_id)
+        return self.manages(employee_id) or (employee_id is not None and employee_id == self.own_employee_id)
+
+    def filter(self, column, include_own: bool = False):
+        """
+        Critério ``column IN (...)`` para restringir uma consulta ao escopo
+
+        Args:
+            column: Coluna com o id do colaborador (ex.: Alert.employee_id)
+            include_own: Inclui o próprio colaborador
+        """
+        if self.unrestricted:
+            return sa.true()
+        ids = set(self.employee_ids)
+        if include_own and self.own_employee_id is not None:
+            ids.add(self.own_employee_id)
+        if not ids:
+            return sa.false()
+        return column.in_(ids)
+
+
+class ManagerScopeService:
+    """
+    Resolve o escopo de gestão de um usuário
+
+    O conjunto de geridos é calculado com uma única consulta (a CTE recursiva
+    de ``org_scope`` para a árvore) e fica em cache por colaborador até a
+    próxima alteração em employees ou managers.
+    """
+
+    _cache = DatasetCache("manager_scopes", maxsize=settings.PRINCIPAL_CACHE_MAXSIZE, ttl=settings.CACHE_TTL_SECONDS)
+
+    @classmethod
+    def resolve(cls, db: Optional[Session], current_user, include_subtree: bool = True) -> ManagerScope:
+        """
+        Args:
+            db: Sessão do banco; sem ela, uma sessão é aberta só se faltar no cache
+            current_user: Usuário autenticado (Principal ou User)
+            include_subtree: Inclui os subordinados indiretos
+
+        Returns:
+            Escopo do usuário
+        """
+        if current_user.is_admin or current_user.role in UNRESTRICTED_ROLES:
+            return ManagerScope(True, current_user.employee_id, None, frozenset())
+        employee_id = current_user.employee_id
+        if employee_id is None:
+            return ManagerScope(False, None, None, frozenset())
+
+        key = (employee_id, include_subtree)
+        if db is not None:
+            return cls._cache.get_or_compute(key, SOURCE_TABLES, lambda: cls._load(db, employee_id, include_subtree))
+
+        def compute() -> ManagerScope:
+            session = SessionLocal()
+            try:
+                return cls._load(session, employee_id, include_subtree)
+            finally:
+                session.close()
+
+        return cls._cache.get_or_compute(key, SOURCE_TABLES, compute)
+
+    @staticmethod
+    def _load(db: Session, employee_id: UUID, include_subtree: bool) -> ManagerScope:
+        row: Optional[Tuple[EmployeeTypeEnum, Optional[UUID]]] = db.execute(
+            sa.select(Employee.tipo_cadastro, Manager.id)
+            .outerjoin(Manager, Manager.employee_id == Employee.id)
+            .where(Employee.id == employee_id)
+        ).first()
+        if row is None:
+            return ManagerScope(False, None, None, frozenset())
+
+        tipo_cadastro, manager_id = row
+        if tipo_cadastro == EmployeeTypeEnum.DIRETOR:
+            return ManagerScope(True, employee_id, manager_id, frozenset())
+        if manager_id is None:
+            return ManagerScope(False, employee_id, None, frozenset())
+
+        if include_subtree:
+            subtree = manager_subtree_cte(manager_id)
+            managed = sa.select(subtree.c.employee_id)
+        else:
+            managed = sa.select(Employee.id).where(Employee.manager_id == manager_id)
+        employee_ids = frozenset(db.execute(managed).scalars())
+        return ManagerScope(False, employee_id, manager_id, employee_ids)
+
+
+class ManagerScopeDependency:
+    """
+    Dependency que entrega o escopo de gestão do usuário atual
+
+    Usage:
+        @router.get("/")
+        async def listar(scope: ManagerScope = Depends(get_manager_scope)):
+            query = query.filter(scope.filter(Model.employee_id))
+    """
+
+    def __init__(self, include_subtree: bool = True):
+        self.include_subtree = include_subtree
+
+    def __call__(self, db: Session = Depends(get_db), current_user=Depends(get_current_user)) -> ManagerScope:
+        return ManagerScopeService.resolve(db, current_user, self.include_subtree)
+
+
+get_manager_scope = ManagerScopeDependency()
+get_direct_manager_scope = ManagerScopeDependency(include_subtree=False)
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from typing import Optional
+from uuid import UUID
+
+import sqlalchemy as sa
+from sqlalchemy.orm import aliased
+
+from app.models.employee import Employee
+from app.models.manager import Manager
+
+
+def manager_subtree_cte(manager_id: UUID, name: str = "manager_subtree") -> sa.CTE:
+    """CTE recursiva com os ids de todos os colaboradores abaixo de um gestor.
+
+    ``manager_id`` é o id da tabela ``managers`` (o mesmo valor gravado em
+    ``Employee.manager_id``). Os subordinados indiretos são alcançados pelos
+    perfis de gestor dos próprios subordinados.
+    """
+    base = sa.select(Employee.id.label("employee_id")).where(Employee.manager_id == manager_id)
+    subtree = base.cte(name=name, recursive=True)
+    child = aliased(Employee)
+    subtree = subtree.union(
+        sa.select(child.id)
+        .join(Manager, child.manager_id == Manager.id)
+        .join(subtree, Manager.employee_id == subtree.c.employee_id)
+    )
+    return subtree
+
+
+def employee_scope_select(
+    area_id: Optional[UUID] = None,
+    team_id: Optional[UUID] = None,
+    manager_id: Optional[UUID] = None,
+    include_subtree: bool = True,
+    only_active: bool = True,
+) -> sa.Select:
+    """SELECT dos ids de colaboradores filtrados por área, time e gestor."""
+    stmt = sa.select(Employee.id)
+    if only_active:
+        stmt = stmt.where(Employee.status == "ATIVO")
+    if area_id:
+        stmt = stmt.where(Employee.area_id == area_id)
+    if team_id:
+        stmt = stmt.where(Employee.team_id == team_id)
+    if manager_id:
+        if include_subtree:
+            subtree = manager_subtree_cte(manager_id)
+            stmt = stmt.where(Employee.id.in_(sa.select(subtree.c.employee_id)))
+        else:
+            stmt = stmt.where(Employee.manager_id == manager_id)
+    return stmt
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.cache import DatasetCache
+from app.models.employee import Employee
+from app.models.employee_knowledge import EmployeeKnowledge, StatusEnum as KnowledgeLinkStatus
+from app.models.knowledge import Knowledge, KnowledgeCategoryEnum
+
+SOURCE_TABLES = ("employee_knowledge", "knowledge", "employees")
+
+# Peso de cada vínculo no perfil do colaborador
+STATUS_WEIGHTS = {
+    KnowledgeLinkStatus.OBTIDO: 1.0,
+    KnowledgeLinkStatus.OBRIGATORIO: 0.6,
+    KnowledgeLinkStatus.DESEJADO: 0.4,
+}
+EXPIRED_FACTOR = 0.5
+RECENCY_HALF_LIFE_DAYS = 3 * 365
+RECENCY_MIN_FACTOR = 0.5
+
+
+@dataclass
+class KnowledgeProfiles:
+    employee_ids: List[UUID]
+    employee_names: List[str]
+    employee_positions: Dict[UUID, int]
+    active: np.ndarray          # bool (n_employees,)
+    knowledge_ids: List[UUID]
+    knowledge_names: List[str]
+    knowledge_tipos: np.ndarray  # object (n_knowledge,)
+    normalized: np.ndarray      # float32 (n_employees, n_knowledge), linhas com norma L2 = 1
+    holds: np.ndarray           # bool (n_employees, n_knowledge): OBTIDO e vigente
+
+
+class RecommendationService:
+    """Recomendações por similaridade de perfil de conhecimentos.
+
+    O perfil de cada colaborador é um vetor sobre o catálogo, ponderado por
+    status e pela recência da obtenção. Com as linhas normalizadas, a
+    similaridade de cosseno vira um produto matriz × vetor.
+    """
+
+    _cache = DatasetCache("knowledge_profiles", maxsize=2, ttl=settings.CACHE_TTL_SECONDS)
+
+    @classmethod
+    def profiles(cls, db: Session) -> KnowledgeProfiles:
+        return cls._cache.get_or_compute(date.today(), SOURCE_TABLES, lambda: cls._build(db))
+
+    @staticmethod
+    def _build(db: Session) -> KnowledgeProfiles:
+        employees = db.query(Employee.id, Employee.nome_completo, Employee.status).order_by(Employee.id).all()
+        knowledge = db.query(Knowledge.id, Knowledge.nome, Knowledge.tipo).order_by(Knowledge.id).all()
+        links = db.query(
+            EmployeeKnowledge.employee_id,
+            EmployeeKnowledge.knowledge_id,
+            EmployeeKnowledge.status,
+            EmployeeKnowledge.data_obtencao,
+            EmployeeKnowledge.data_expiracao,
+        ).all()
+
+        employee_positions = {row[0]: pos for pos, row in enumerate(employees)}
+        knowledge_positions = {row[0]: pos for pos, row in enumerate(knowledge)}
+        n_links = len(links)
+        rows = np.empty(n_links, dtype=np.int64)
+        cols = np.empty(n_links, dtype=np.int64)
+        base = np.empty(n_links, dtype=np.float32)
+        age_days = np.zeros(n_links, dtype=np.float32)
+        expired = np.zeros(n_links, dtype=bool)
+        obtained = np.zeros(n_links, dtype=bool)
+
+        today = date.today()
+        i = 0
+        for emp_id, k_id, link_status, data_obtencao, data_expiracao in links:
+            # As três consultas não compartilham snapshot: vínculos de um
+            # colaborador ou conhecimento criado entre elas ficam de fora
+            row_pos = employee_positions.get(emp_id)
+            col_pos = knowledge_positions.get(k_id)
+            if row_pos is None or col_pos is None:
+                continue
+            rows[i] = row_pos
+            cols[i] = col_pos
+            base[i] = STATUS_WEIGHTS.get(link_status, 0.0)
+            if link_status == KnowledgeLinkStatus.OBTIDO:
+                obtained[i] = True
+                if data_obtencao:
+                    age_days[i] = max((today - data_obtencao).days, 0)
+                if data_expiracao and data_expiracao < today:
+                    expired[i] = True
+            i += 1
+        rows, cols, base, age_days, expired, obtained = (
+            rows[:i], cols[:i], base[:i], age_days[:i], expired[:i], obtained[:i]
+        )
+
+        recency = np.maximum(np.power(0.5, age_days / RECENCY_HALF_LIFE_DAYS), RECENCY_MIN_FACTOR)
+        weights = np.where(obtained, base * recency, base)
+        weights = np.where(expired, weights * EXPIRED_FACTOR, weights).astype(np.float32)
+
+        matrix = np.zeros((len(employees), len(knowledge)), dtype=np.float32)
+        np.add.at(matrix, (rows, cols), weights)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        normalized = np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+        holds = np.zeros_like(matrix, dtype=bool)
+        valid = obtained & ~expired
+        holds[rows[valid], cols[valid]] = True
+
+        return KnowledgeProfiles(
+            employee_ids=[row[0] for row in employees],
+            employee_names=[row[1] for row in employees],
+            employee_positions=employee_positions,
+            active=np.array([row[2] == "ATIVO" for row in employees], dtype=bool),
+            knowledge_ids=[row[0] for row in knowledge],
+            knowledge_names=[row[1] for row in knowledge],
+            knowledge_tipos=np.array(
+                [row[2].value if hasattr(row[2], "value") else row[2] for row in knowledge], dtype=object
+            ),
+            normalized=normalized,
+            holds=holds,
+        )
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        k = min(k, int(np.count_nonzero(scores > 0)))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        return candidates[np.argsort(-scores[candidates])]
+
+    @classmethod
+    def _neighbour_scores(cls, profiles: KnowledgeProfiles, position: int) -> np.ndarray:
+        scores = profiles.normalized @ profiles.normalized[position]
+        scores[position] = 0.0
+        scores[~profiles.active] = 0.0
+        return scores
+
+    @classmethod
+    def similar_employees(cls, db: Session, employee_id: UUID, limit: int = 10) -> Optional[List[dict]]:
+        profiles = cls.profiles(db)
+        position = profiles.employee_positions.get(employee_id)
+        if position is None:
+            return None
+        scores = cls._neighbour_scores(profiles, position)
+        top = cls._top_k(scores, limit)
+        common = (profiles.holds[top] & profiles.holds[position]).sum(axis=1)
+        return [
+            {
+                "employee_id": profiles.employee_ids[idx],
+                "nome_completo": profiles.employee_names[idx],
+                "similaridade": round(float(scores[idx]), 4),
+                "conhecimentos_em_comum": int(shared),
+            }
+            for idx, shared in zip(top, common)
+        ]
+
+    @classmethod
+    def suggest_knowledge(
+        cls,
+        db: Session,
+        employee_id: UUID,
+        limit: int = 10,
+        neighbours: int = 20,
+        tipo: Optional[KnowledgeCategoryEnum] = KnowledgeCategoryEnum.CERTIFICACAO,
+    ) -> Optional[List[dict]]:
+        """Conhecimentos obtidos pelos colegas mais parecidos e que o colaborador ainda não tem."""
+        profiles = cls.profiles(db)
+        position = profiles.employee_positions.get(employee_id)
+        if position is None:
+            return None
+        scores = cls._neighbour_scores(profiles, position)
+        top = cls._top_k(scores, neighbours)
+        if top.size == 0:
+            return []
+        similarity = scores[top]
+        holders = profiles.holds[top]
+        knowledge_scores = similarity @ holders / similarity.sum()
+        holders_count = holders.sum(axis=0)
+
+        candidates = ~profiles.holds[position]
+        if tipo is not None:
+            tipo_value = tipo.value if hasattr(tipo, "value") else tipo
+            candidates &= profiles.knowledge_tipos == tipo_value
+        knowledge_scores = np.where(candidates, knowledge_scores, 0.0)
+
+        ranked = cls._top_k(knowledge_scores, limit)
+        return [
+            {
+                "knowledge_id": profiles.knowledge_ids[idx],
+                "knowledge_nome": profiles.knowledge_names[idx],
+                "knowledge_tipo": profiles.knowledge_tipos[idx],
+                "pontuacao": round(float(knowledge_scores[idx]), 4),
+                "colegas_com_conhecimento": int(holders_count[idx]),
+            }
+            for idx in ranked
+        ]
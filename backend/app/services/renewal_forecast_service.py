@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.cache import DatasetCache
+from app.models.area import Area
+from app.models.employee import Employee
+from app.models.employee_knowledge import EmployeeKnowledge, StatusEnum as KnowledgeLinkStatus
+from app.models.knowledge import Knowledge
+from app.models.team import Team
+
+SOURCE_TABLES = ("employee_knowledge", "knowledge", "employees", "areas", "teams")
+
+AGRUPAMENTOS = ("area", "time", "fornecedor")
+
+_SEM_GRUPO = {"area": "Sem área", "time": "Sem time", "fornecedor": "Sem fornecedor"}
+
+
+@dataclass
+class RenewalDataset:
+    """Colunas dos vínculos renováveis, uma posição por vínculo."""
+
+    expiracao_mes: np.ndarray  # ano * 12 + (mês - 1)
+    expiracao_dia: np.ndarray  # date.toordinal() da expiração
+    validade_meses: np.ndarray  # 0 = sem renovação recorrente
+    custo: np.ndarray
+    sem_custo: np.ndarray
+    grupos: Dict[str, np.ndarray]  # agrupamento -> rótulo por vínculo
+    nomes: Dict[str, Dict[str, str]]
+
+
+@dataclass
+class RenewalForecastGroup:
+    grupo_id: Optional[str]
+    grupo_nome: str
+    renovacoes: List[int]
+    custo: List[float]
+    total_renovacoes: int
+    custo_total: float
+
+
+@dataclass
+class RenewalForecast:
+    gerado_em: datetime
+    agrupamento: str
+    horizonte_meses: int
+    meses: List[str]
+    renovacoes: List[int]
+    custo: List[float]
+    total_renovacoes: int
+    custo_total: float
+    vencidas: int
+    sem_custo: int
+    grupos: List[RenewalForecastGroup]
+
+
+def _month_index(value: date) -> int:
+    return value.year * 12 + value.month - 1
+
+
+def _month_label(index: int) -> str:
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+class RenewalForecastService:
+    """Previsão de renovações de certificações e do custo associado.
+
+    Considera os vínculos OBTIDO com data de expiração de colaboradores
+    ativos. Cada vínculo renova no mês da expiração (ou no mês corrente, se
+    já venceu) e, havendo ``validade_meses``, novamente a cada período
+    dentro do horizonte. O custo de cada renovação é o ``custo_estimado``
+    do conhecimento.
+    """
+
+    _cache = DatasetCache("renewal_forecast", maxsize=64, ttl=settings.CACHE_TTL_SECONDS)
+
+    @classmethod
+    def forecast(cls, db: Session, horizonte_meses: int = 12, agrupamento: str = "area") -> RenewalForecast:
+        key = ("forecast", date.today(), horizonte_meses, agrupamento)
+        return cls._cache.get_or_compute(
+            key, SOURCE_TABLES, lambda: cls._compute(cls._dataset(db), horizonte_meses, agrupamento)
+        )
+
+    @classmethod
+    def _dataset(cls, db: Session) -> RenewalDataset:
+        return cls._cache.get_or_compute(("dataset",), SOURCE_TABLES, lambda: cls._load(db))
+
+    @staticmethod
+    def _load(db: Session) -> RenewalDataset:
+        expiracao_mes = (
+            sa.extract("year", EmployeeKnowledge.data_expiracao) * 12
+            + sa.extract("month", EmployeeKnowledge.data_expiracao)
+            - 1
+        )
+        rows = db.execute(
+            sa.select(
+                sa.cast(expiracao_mes, sa.Integer),
+                sa.func.coalesce(Knowledge.validade_meses, 0),
+                Knowledge.custo_estimado,
+                Employee.area_id,
+                Employee.team_id,
+                Knowledge.fornecedor,
+                EmployeeKnowledge.data_expiracao,
+            )
+            .join(Knowledge, Knowledge.id == EmployeeKnowledge.knowledge_id)
+            .join(Employee, Employee.id == EmployeeKnowledge.employee_id)
+            .where(
+                EmployeeKnowledge.status == KnowledgeLinkStatus.OBTIDO,
+                EmployeeKnowledge.data_expiracao.isnot(None),
+                Employee.status == "ATIVO",
+            )
+        ).all()
+
+        columns = list(zip(*rows)) if rows else [()] * 7
+        custos = [float(value) if value is not None else np.nan for value in columns[2]]
+        custo = np.array(custos, dtype=np.float64)
+        grupos = {
+            "area": np.array([str(value) if value else "" for value in columns[3]], dtype=object),
+            "time": np.array([str(value) if value else "" for value in columns[4]], dtype=object),
+            "fornecedor": np.array([value.strip() if value else "" for value in columns[5]], dtype=object),
+        }
+        nomes = {
+            "area": {str(area_id): nome for area_id, nome in db.execute(sa.select(Area.id, Area.nome))},
+            "time": {str(team_id): nome for team_id, nome in db.execute(sa.select(Team.id, Team.nome))},
+            "fornecedor": {},
+        }
+        return RenewalDataset(
+            expiracao_mes=np.array(columns[0], dtype=np.int64),
+            expiracao_dia=np.array([value.toordinal() for value in columns[6]], dtype=np.int64),
+            validade_meses=np.array(columns[1], dtype=np.int64),
+            custo=np.nan_to_num(custo, nan=0.0),
+            sem_custo=np.isnan(custo),
+            grupos=grupos,
+            nomes=nomes,
+        )
+
+    @staticmethod
+    def _compute(dataset: RenewalDataset, horizonte_meses: int, agrupamento: str) -> RenewalForecast:
+        inicio = _month_index(date.today())
+        fim = inicio + horizonte_meses
+
+        # Primeira renovação: mês da expiração, ou o mês corrente se já vencida
+        primeira = np.maximum(dataset.expiracao_mes, inicio)
+        dentro = primeira < fim
+        primeira = primeira[dentro]
+        validade = dataset.validade_meses[dentro]
+        custo = dataset.custo[dentro]
+        labels = dataset.grupos[agrupamento][dentro]
+
+        # Matriz vínculo × ocorrência: primeira + k * validade (k = 0..max_k)
+        recorrente = validade > 0
+        menor_validade = int(validade[recorrente].min()) if recorrente.any() else horizonte_meses
+        max_k = max(1, -(-horizonte_meses // max(menor_validade, 1)))
+        k = np.arange(max_k)
+        ocorrencias = primeira[:, None] + k[None, :] * validade[:, None]
+        validas = (ocorrencias < fim) & ((k[None, :] == 0) | recorrente[:, None])
+
+        grupo_labels, grupo_idx = np.unique(labels, return_inverse=True)
+        linha, coluna = np.nonzero(validas)
+        bucket = grupo_idx[linha] * horizonte_meses + (ocorrencias[linha, coluna] - inicio)
+        tamanho = len(grupo_labels) * horizonte_meses
+        contagem = np.bincount(bucket, minlength=tamanho).reshape(-1, horizonte_meses)
+        gasto = np.bincount(bucket, weights=custo[linha], minlength=tamanho).reshape(-1, horizonte_meses)
+
+        nomes = dataset.nomes[agrupamento]
+        grupos = [
+            RenewalForecastGroup(
+                grupo_id=str(label) if label and agrupamento != "fornecedor" else None,
+                grupo_nome=(nomes.get(label, label) if label else _SEM_GRUPO[agrupamento]),
+                renovacoes=contagem[i].tolist(),
+                custo=np.round(gasto[i], 2).tolist(),
+                total_renovacoes=int(contagem[i].sum()),
+                custo_total=round(float(gasto[i].sum()), 2),
+            )
+            for i, label in enumerate(grupo_labels)
+        ]
+        grupos.sort(key=lambda item: (-item.custo_total, -item.total_renovacoes, item.grupo_nome))
+
+        return RenewalForecast(
+            gerado_em=datetime.utcnow(),
+            agrupamento=agrupamento,
+            horizonte_meses=horizonte_meses,
+            meses=[_month_label(index) for index in range(inicio, fim)],
+            renovacoes=contagem.sum(axis=0).astype(int).tolist(),
+            custo=np.round(gasto.sum(axis=0), 2).tolist(),
+            total_renovacoes=int(contagem.sum()),
+            custo_total=round(float(gasto.sum()), 2),
+            # Por dia: vencidas no início do mês corrente também contam
+            vencidas=int((dataset.expiracao_dia < date.today().toordinal()).sum()),
+            sem_custo=int(dataset.sem_custo[dentro].sum()),
+            grupos=grupos,
+        )
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from uuid import UUID
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.cache import DatasetCache
+from app.models.area import Area
+from app.models.employee import Employee
+from app.models.employee_knowledge import EmployeeKnowledge, StatusEnum as KnowledgeLinkStatus
+from app.models.knowledge import Knowledge
+from app.models.manager import Manager
+from app.models.team import Team
+
+SOURCE_TABLES = ("employee_knowledge", "knowledge", "employees", "managers", "areas", "teams")
+
+ESCOPOS = ("organizacao", "area", "time", "gestor")
+
+
+@dataclass
+class SkillGapEntry:
+    escopo: str
+    escopo_id: Optional[UUID]
+    escopo_nome: Optional[str]
+    knowledge_id: UUID
+    knowledge_nome: str
+    obrigatorios: int
+    obtidos: int
+    expirando: int
+    faltantes: int
+    cobertura: float
+    colaboradores_faltantes: List[dict] = field(default_factory=list)
+
+
+@dataclass
+class SkillGapReport:
+    gerado_em: datetime
+    horizonte_dias: int
+    itens: List[SkillGapEntry]
+
+
+class SkillGapService:
+    """Cobertura de conhecimentos obrigatórios por organização, área, time e gestor.
+
+    Um par (colaborador, conhecimento) é obrigatório quando o conhecimento
+    está marcado como obrigatório no catálogo (vale para todos os ativos) ou
+    quando existe um vínculo com status OBRIGATORIO. O par está coberto se
+    houver vínculo OBTIDO ainda vigente.
+    """
+
+    _cache = DatasetCache("skill_gaps", maxsize=32, ttl=settings.CACHE_TTL_SECONDS)
+
+    @classmethod
+    def report(cls, db: Session, horizonte_dias: int = 60) -> SkillGapReport:
+        key = (date.today(), horizonte_dias)
+        return cls._cache.get_or_compute(key, SOURCE_TABLES, lambda: cls._compute(db, horizonte_dias))
+
+    @classmethod
+    def _compute(cls, db: Session, horizonte_dias: int) -> SkillGapReport:
+        today = date.today()
+        limit = today + timedelta(days=horizonte_dias)
+
+        catalogue_required = (
+            sa.select(Employee.id.label("employee_id"), Knowledge.id.label("knowledge_id"))
+            .select_from(Employee)
+            .join(Knowledge, Knowledge.obrigatorio.is_(True))
+            .where(Employee.status == "ATIVO", Knowledge.status == "ATIVO")
+        )
+        linked_required = (
+            sa.select(EmployeeKnowledge.employee_id, EmployeeKnowledge.knowledge_id)
+            .join(Employee, Employee.id == EmployeeKnowledge.employee_id)
+            .where(
+                EmployeeKnowledge.status == KnowledgeLinkStatus.OBRIGATORIO,
+                Employee.status == "ATIVO",
+            )
+        )
+        required = sa.union(catalogue_required, linked_required).cte("required")
+
+        vigente = sa.and_(
+            EmployeeKnowledge.status == KnowledgeLinkStatus.OBTIDO,
+            sa.or_(EmployeeKnowledge.data_expiracao.is_(None), EmployeeKnowledge.data_expiracao >= today),
+        )
+        pairs = (
+            sa.select(
+                required.c.employee_id,
+                required.c.knowledge_id,
+                Employee.area_id,
+                Employee.team_id,
+                sa.func.coalesce(vigente, False).label("obtido"),
+                sa.func.coalesce(sa.and_(vigente, EmployeeKnowledge.data_expiracao <= limit), False).label("expirando"),
+            )
+            .select_from(required)
+            .join(Employee, Employee.id == required.c.employee_id)
+            .outerjoin(
+                EmployeeKnowledge,
+                sa.and_(
+                    EmployeeKnowledge.employee_id == required.c.employee_id,
+                    EmployeeKnowledge.knowledge_id == required.c.knowledge_id,
+                ),
+            )
+            .cte("pairs")
+        )
+
+        # Fecho transitivo gestor -> colaboradores (diretos e indiretos)
+        closure = (
+            sa.select(Employee.manager_id.label("root_id"), Employee.id.label("employee_id"))
+            .where(Employee.manager_id.isnot(None))
+            .cte("closure", recursive=True)
+        )
+        closure = closure.union(
+            sa.select(closure.c.root_id, Employee.id)
+            .join(Manager, Manager.employee_id == closure.c.employee_id)
+            .join(Employee, Employee.manager_id == Manager.id)
+        )
+
+        def aggregate(escopo: str, scope_column, *joins):
+            stmt = sa.select(
+                sa.literal(escopo).label("escopo"),
+                scope_column.label("escopo_id"),
+                pairs.c.knowledge_id,
+                sa.func.count().label("obrigatorios"),
+                sa.func.count().filter(pairs.c.obtido).label("obtidos"),
+                sa.func.count().filter(pairs.c.expirando).label("expirando"),
+                sa.func.array_agg(pairs.c.employee_id).filter(sa.not_(pairs.c.obtido)).label("faltantes"),
+            ).select_from(pairs)
+            for target, onclause in joins:
+                stmt = stmt.join(target, onclause)
+            return stmt.group_by(scope_column, pairs.c.knowledge_id)
+
+        statement = sa.union_all(
+            aggregate("organizacao", sa.cast(sa.null(), pairs.c.area_id.type)),
+            aggregate("area", pairs.c.area_id),
+            aggregate("time", pairs.c.team_id),
+            aggregate("gestor", closure.c.root_id, (closure, closure.c.employee_id == pairs.c.employee_id)),
+        )
+        rows = db.execute(statement).all()
+
+        names = cls._load_names(db, rows)
+        itens: List[SkillGapEntry] = []
+        for row in rows:
+            if row.escopo in ("area", "time") and row.escopo_id is None:
+                continue
+            faltantes = row.faltantes or []
+            itens.append(
+                SkillGapEntry(
+                    escopo=row.escopo,
+                    escopo_id=row.escopo_id,
+                    escopo_nome=names[row.escopo].get(row.escopo_id),
+                    knowledge_id=row.knowledge_id,
+                    knowledge_nome=names["knowledge"].get(row.knowledge_id, ""),
+                    obrigatorios=row.obrigatorios,
+                    obtidos=row.obtidos,
+                    expirando=row.expirando,
+                    faltantes=len(faltantes),
+                    cobertura=round(row.obtidos / row.obrigatorios, 4) if row.obrigatorios else 1.0,
+                    colaboradores_faltantes=[
+                        {"id": emp_id, "nome": names["employee"].get(emp_id)} for emp_id in faltantes
+                    ],
+                )
+            )
+        itens.sort(key=lambda item: (ESCOPOS.index(item.escopo), item.escopo_nome or "", item.knowledge_nome))
+        return SkillGapReport(gerado_em=datetime.utcnow(), horizonte_dias=horizonte_dias, itens=itens)
+
+    @staticmethod
+    def _load_names(db: Session, rows) -> Dict[str, Dict[UUID, str]]:
+        ids: Dict[str, set] = defaultdict(set)
+        for row in rows:
+            ids[row.escopo].add(row.escopo_id)
+            ids["knowledge"].add(row.knowledge_id)
+            ids["employee"].update(row.faltantes or [])
+
+        names: Dict[str, Dict[UUID, str]] = {"organizacao": {}}
+        names["area"] = dict(db.query(Area.id, Area.nome).filter(Area.id.in_(ids["area"] - {None})).all())
+        names["time"] = dict(db.query(Team.id, Team.nome).filter(Team.id.in_(ids["time"] - {None})).all())
+        names["gestor"] = dict(
+            db.query(Manager.id, Employee.nome_completo)
+            .join(Employee, Employee.id == Manager.employee_id)
+            .filter(Manager.id.in_(ids["gestor"]))
+            .all()
+        )
+        names["knowledge"] = dict(
+            db.query(Knowledge.id, Knowledge.nome).filter(Knowledge.id.in_(ids["knowledge"])).all()
+        )
+        names["employee"] = dict(
+            db.query(Employee.id, Employee.nome_completo).filter(Employee.id.in_(ids["employee"])).all()
+        )
+        return names
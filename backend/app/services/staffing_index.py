@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import threading
+import time
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.cache import subscribe
+from app.models.employee import Employee
+from app.models.employee_knowledge import EmployeeKnowledge, StatusEnum as KnowledgeLinkStatus
+
+# Chaves de postings além dos próprios status do vínculo
+VIGENTE = "VIGENTE"
+VENCIDO = "VENCIDO"
+
+
+def iter_positions(bits: int) -> Iterable[int]:
+    """Posições dos bits ligados, do menor para o maior"""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class StaffingIndex:
+    """Índice invertido de conhecimentos dos colaboradores.
+
+    Cada colaborador recebe uma posição fixa; cada par (conhecimento, status)
+    aponta para um bitset (``int`` do Python) com as posições dos
+    colaboradores. Expressões AND/OR/NOT viram operações bit a bit.
+
+    Alterações em ``employee_knowledge`` e ``employees`` feitas por este
+    worker são aplicadas de forma incremental na próxima consulta; o índice
+    é reconstruído por completo quando expira (CACHE_TTL_SECONDS), quando a
+    data muda (vencimentos) ou quando recebe uma invalidação sem chaves.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._built_on: Optional[date] = None
+        self._built_at = 0.0
+        self._pending_links: Set[str] = set()
+        self._pending_employees: Set[str] = set()
+        self._needs_rebuild = True
+        self._reset()
+
+    def _reset(self) -> None:
+        self.employee_ids: List[UUID] = []
+        self.employee_names: List[str] = []
+        self.positions: Dict[UUID, int] = {}
+        self.active = 0
+        self.by_area: Dict[UUID, int] = {}
+        self.by_team: Dict[UUID, int] = {}
+        self.employee_groups: Dict[int, Tuple[Optional[UUID], Optional[UUID]]] = {}
+        self.postings: Dict[Tuple[UUID, str], int] = {}
+        self.links: Dict[UUID, Tuple[int, UUID, Tuple[str, ...]]] = {}
+
+    # ------------------------------------------------------------------ #
+    # Invalidação
+    # ------------------------------------------------------------------ #
+
+    def on_invalidate(self, table: str, keys: Optional[frozenset]) -> None:
+        with self._lock:
+            if keys is None:
+                self._needs_rebuild = True
+            elif table == "employee_knowledge":
+                self._pending_links.update(keys)
+            elif table == "employees":
+                self._pending_employees.update(keys)
+
+    def ensure_fresh(self, db: Session) -> None:
+        with self._lock:
+            expired = time.monotonic() - self._built_at > settings.CACHE_TTL_SECONDS
+            if self._needs_rebuild or expired or self._built_on != date.today() or not settings.CACHE_ENABLED:
+                self._rebuild(db)
+                return
+            if self._pending_employees:
+                self._refresh_employees(db, self._pending_employees)
+                self._pending_employees = set()
+            if self._pending_links:
+                self._refresh_links(db, self._pending_links)
+                self._pending_links = set()
+
+    # ------------------------------------------------------------------ #
+    # Construção
+    # ------------------------------------------------------------------ #
+
+    def _rebuild(self, db: Session) -> None:
+        self._reset()
+        self._pending_links = set()
+        self._pending_employees = set()
+        self._needs_rebuild = False
+        employees = db.query(
+            Employee.id, Employee.nome_completo, Employee.status, Employee.area_id, Employee.team_id
+        ).all()
+        for emp_id, nome, emp_status, area_id, team_id in employees:
+            self._set_employee(emp_id, nome, emp_status, area_id, team_id)
+
+        links = db.query(
+            EmployeeKnowledge.id,
+            EmployeeKnowledge.employee_id,
+            EmployeeKnowledge.knowledge_id,
+            EmployeeKnowledge.status,
+            EmployeeKnowledge.data_expiracao,
+        ).all()
+        today = date.today()
+        for link_id, emp_id, k_id, link_status, data_expiracao in links:
+            self._add_link(link_id, emp_id, k_id, link_status, data_expiracao, today)
+
+        self._built_on = today
+        self._built_at = time.monotonic()
+
+    def _position(self, emp_id: UUID) -> int:
+        pos = self.positions.get(emp_id)
+        if pos is None:
+            pos = self.positions[emp_id] = len(self.employee_ids)
+            self.employee_ids.append(emp_id)
+            self.employee_names.append("")
+        return pos
+
+    def _set_employee(self, emp_id, nome, emp_status, area_id, team_id) -> None:
+        pos = self._position(emp_id)
+        bit = 1 << pos
+        old_area, old_team = self.employee_groups.get(pos, (None, None))
+        if old_area in self.by_area:
+            self.by_area[old_area] &= ~bit
+        if old_team in self.by_team:
+            self.by_team[old_team] &= ~bit
+        self.employee_names[pos] = nome or ""
+        self.employee_groups[pos] = (area_id, team_id)
+        if area_id:
+            self.by_area[area_id] = self.by_area.get(area_id, 0) | bit
+        if team_id:
+            self.by_team[team_id] = self.by_team.get(team_id, 0) | bit
+        if emp_status == "ATIVO":
+            self.active |= bit
+        else:
+            self.active &= ~bit
+
+    @staticmethod
+    def _status_keys(link_status, data_expiracao: Optional[date], today: date) -> Tuple[str, ...]:
+        value = link_status.value if hasattr(link_status, "value") else link_status
+        if value != KnowledgeLinkStatus.OBTIDO.value:
+            return (value,)
+        if data_expiracao and data_expiracao < today:
+            return (value, VENCIDO)
+        return (value, VIGENTE)
+
+    def _add_link(self, link_id, emp_id, k_id, link_status, data_expiracao, today: date) -> None:
+        pos = self._position(emp_id)
+        bit = 1 << pos
+        keys = self._status_keys(link_status, data_expiracao, today)
+        for key in keys:
+            posting = (k_id, key)
+            self.postings[posting] = self.postings.get(posting, 0) | bit
+        self.links[link_id] = (pos, k_id, keys)
+
+    def _remove_link(self, link_id) -> None:
+        entry = self.links.pop(link_id, None)
+        if not entry:
+            return
+        pos, k_id, keys = entry
+        mask = ~(1 << pos)
+        for key in keys:
+            posting = (k_id, key)
+            if posting in self.postings:
+                self.postings[posting] &= mask
+
+    def _refresh_links(self, db: Session, link_ids: Set[str]) -> None:
+        ids = [UUID(link_id) for link_id in link_ids]
+        for link_id in ids:
+            self._remove_link(link_id)
+        rows = (
+            db.query(
+                EmployeeKnowledge.id,
+                EmployeeKnowledge.employee_id,
+                EmployeeKnowledge.knowledge_id,
+                EmployeeKnowledge.status,
+                EmployeeKnowledge.data_expiracao,
+            )
+            .filter(EmployeeKnowledge.id.in_(ids))
+            .all()
+        )
+        today = date.today()
+        for link_id, emp_id, k_id, link_status, data_expiracao in rows:
+            self._add_link(link_id, emp_id, k_id, link_status, data_expiracao, today)
+
+    def _refresh_employees(self, db: Session, employee_ids: Set[str]) -> None:
+        ids = [UUID(emp_id) for emp_id in employee_ids]
+        rows = (
+            db.query(Employee.id, Employee.nome_completo, Employee.status, Employee.area_id, Employee.team_id)
+            .filter(Employee.id.in_(ids))
+            .all()
+        )
+        found = set()
+        for emp_id, nome, emp_status, area_id, team_id in rows:
+            found.add(emp_id)
+            self._set_employee(emp_id, nome, emp_status, area_id, team_id)
+        for emp_id in set(ids) - found:
+            pos = self.positions.get(emp_id)
+            if pos is not None:
+                self._set_employee(emp_id, "", "REMOVIDO", None, None)
+
+    # ------------------------------------------------------------------ #
+    # Consulta
+    # ------------------------------------------------------------------ #
+
+    def evaluate(self, node: dict) -> int:
+        """Avalia a expressão (dict com and/or/not ou knowledge_id/status)"""
+        if node.get("and") is not None:
+            bits = self.active
+            for child in node["and"]:
+                bits &= self.evaluate(child)
+                if not bits:
+                    break
+            return bits
+        if node.get("or") is not None:
+            bits = 0
+            for child in node["or"]:
+                bits |= self.evaluate(child)
+            return bits
+        if node.get("not") is not None:
+            return self.active & ~self.evaluate(node["not"])
+        return self.postings.get((node["knowledge_id"], node.get("status") or VIGENTE), 0)
+
+    def search(
+        self,
+        expression: dict,
+        area_id: Optional[UUID] = None,
+        team_id: Optional[UUID] = None,
+    ) -> List[Tuple[UUID, str]]:
+        """(id, nome) dos colaboradores que atendem à expressão"""
+        with self._lock:
+            bits = self.evaluate(expression) & self.active
+            if area_id:
+                bits &= self.by_area.get(area_id, 0)
+            if team_id:
+                bits &= self.by_team.get(team_id, 0)
+            # Resolvidos sob o mesmo lock: uma reconstrução troca as listas
+            return [(self.employee_ids[pos], self.employee_names[pos]) for pos in iter_positions(bits)]
+
+
+staffing_index = StaffingIndex()
+subscribe("employee_knowledge", staffing_index.on_invalidate)
+subscribe("employees", staffing_index.on_invalidate)
@@ -0,0 +1,25 @@
+import sys
+import os
+import argparse
+
+# Ajustar sys.path para encontrar o pacote app a partir da raiz do projeto
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.database import SessionLocal
+from app.services.expiry_service import DEFAULT_BATCH_SIZE, ExpiryService
+
+
+def recompute_expiry(batch_size: int = DEFAULT_BATCH_SIZE):
+    db = SessionLocal()
+    try:
+        total = ExpiryService.recompute(db, batch_size=batch_size)
+        print(f"Vínculos com expiração recalculada: {total}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recalcula data_expiracao de todo o catálogo")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+    recompute_expiry(args.batch_size)
@@ -0,0 +1,38 @@
+from datetime import date
+
+from sqlalchemy.dialects import postgresql
+
+from app.models.knowledge import Knowledge, KnowledgeCategoryEnum
+from app.routers.employee_knowledge import _add_months, _compute_expiration
+from app.services.expiry_service import ExpiryService
+
+
+def certification(months):
+    return Knowledge(tipo=KnowledgeCategoryEnum.CERTIFICACAO, validade_meses=months)
+
+
+def test_add_months_clamps_to_end_of_month():
+    assert _add_months(date(2025, 1, 31), 1) == date(2025, 2, 28)
+    assert _add_months(date(2024, 1, 31), 1) == date(2024, 2, 29)
+    assert _add_months(date(2025, 3, 31), 1) == date(2025, 4, 30)
+    assert _add_months(date(2025, 11, 30), 3) == date(2026, 2, 28)
+
+
+def test_compute_expiration_only_for_certifications_with_validity():
+    assert _compute_expiration(certification(1), date(2025, 1, 31)) == date(2025, 2, 28)
+    assert _compute_expiration(certification(12), date(2024, 2, 29)) == date(2025, 2, 28)
+    assert _compute_expiration(certification(None), date(2025, 1, 31)) is None
+    assert _compute_expiration(certification(12), None) is None
+    assert _compute_expiration(Knowledge(tipo=KnowledgeCategoryEnum.CURSO, validade_meses=12), date(2025, 1, 31)) is None
+
+
+def test_expected_expiration_adds_months_as_interval():
+    # make_interval(0, n) soma meses de calendário: no PostgreSQL,
+    # '2025-01-31' + 1 mês = '2025-02-28', como _add_months
+    sql = str(ExpiryService.expected_expiration().compile(dialect=postgresql.dialect()))
+
+    assert "make_interval(" in sql
+    assert "employee_knowledge.data_obtencao + make_interval(" in sql
+    assert "knowledge.validade_meses" in sql
+    assert "AS DATE" in sql
+    assert "ELSE NULL" in sql
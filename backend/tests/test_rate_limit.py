@@ -0,0 +1,67 @@
+import pytest
+
+from app.core.rate_limit import Limit, MemoryBackend, _decide, _estimate
+
+
+def test_estimate_weights_previous_window_by_remaining_fraction():
+    # 25% da janela de 60s decorrida: 75% da anterior ainda conta
+    assert _estimate(previous=40, current=10, window=60, now=615.0, window_start=600) == pytest.approx(40.0)
+
+
+def test_estimate_ignores_previous_window_after_full_window():
+    assert _estimate(previous=40, current=3, window=60, now=660.0, window_start=600) == pytest.approx(3.0)
+
+
+def test_decide_allows_and_reports_remaining_of_tightest_limit():
+    limits = [Limit(requests=100, window=3600), Limit(requests=10, window=60)]
+    decision = _decide(limits, {3600: (0, 5), 60: (0, 5)}, now=3630.0)
+
+    assert decision.allowed
+    assert decision.limit == 10
+    assert decision.remaining == 5
+    assert decision.retry_after == 0
+
+
+def test_decide_blocks_with_retry_after_until_window_ends():
+    limits = [Limit(requests=10, window=60)]
+    # 45s dentro da janela iniciada em 600: 8 * 0.25 + 9 = 11 > 10
+    decision = _decide(limits, {60: (8, 9)}, now=645.0)
+
+    assert not decision.allowed
+    assert decision.remaining == 0
+    assert decision.retry_after == 16  # 660 - 645 + 1
+
+
+def test_memory_backend_blocks_after_limit_and_recovers():
+    backend = MemoryBackend()
+    limits = [Limit(requests=3, window=60)]
+
+    decisions = [backend.hit("ip:1", limits, now=600.0 + i) for i in range(4)]
+    assert [d.allowed for d in decisions] == [True, True, True, False]
+    assert decisions[-1].retry_after == 58  # 660 - 603 + 1
+
+    # Janela seguinte, já no fim: a anterior (4 hits) pesa quase nada
+    assert backend.hit("ip:1", limits, now=719.0).allowed
+    # Outra chave não é afetada
+    assert backend.hit("ip:2", limits, now=603.0).allowed
+
+
+def test_memory_backend_drops_previous_count_after_idle_window():
+    backend = MemoryBackend()
+    limits = [Limit(requests=2, window=60)]
+    for i in range(3):
+        backend.hit("user:1", limits, now=600.0 + i)
+
+    # Pulou uma janela inteira: a contagem antiga não vira "anterior"
+    decision = backend.hit("user:1", limits, now=721.0)
+    assert decision.allowed
+    assert decision.remaining == 1
+
+
+def test_memory_backend_evicts_idle_keys():
+    backend = MemoryBackend(idle_seconds=100)
+    limits = [Limit(requests=5, window=60)]
+    backend.hit("a", limits, now=0.0)
+    backend.hit("b", limits, now=150.0)
+
+    assert len(backend) == 1
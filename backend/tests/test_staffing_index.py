@@ -0,0 +1,103 @@
+from datetime import date, timedelta
+from uuid import uuid4
+
+from app.models.employee_knowledge import StatusEnum as KnowledgeLinkStatus
+from app.services.staffing_index import VENCIDO, StaffingIndex
+
+TODAY = date.today()
+OBTIDO = KnowledgeLinkStatus.OBTIDO
+
+
+class FakeQuery:
+    """Devolve as linhas dadas, ignorando filtros (basta para _refresh_*)"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def filter(self, *criteria):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def query(self, *columns):
+        return FakeQuery(self.rows)
+
+
+def build_index():
+    index = StaffingIndex()
+    index._reset()
+    people = {name: uuid4() for name in ("ana", "bruno", "carla", "davi")}
+    for name, emp_id in people.items():
+        index._set_employee(emp_id, name, "ATIVO", None, None)
+    return index, people
+
+
+def names(index, bits):
+    return {index.employee_names[pos] for pos in range(len(index.employee_ids)) if bits >> pos & 1}
+
+
+def test_evaluate_and_or_not():
+    index, people = build_index()
+    python, sql = uuid4(), uuid4()
+    index._add_link(uuid4(), people["ana"], python, OBTIDO, None, TODAY)
+    index._add_link(uuid4(), people["ana"], sql, OBTIDO, None, TODAY)
+    index._add_link(uuid4(), people["bruno"], python, OBTIDO, None, TODAY)
+    index._add_link(uuid4(), people["carla"], sql, OBTIDO, None, TODAY)
+
+    has_python = {"knowledge_id": python}
+    has_sql = {"knowledge_id": sql}
+
+    assert names(index, index.evaluate({"and": [has_python, has_sql]})) == {"ana"}
+    assert names(index, index.evaluate({"or": [has_python, has_sql]})) == {"ana", "bruno", "carla"}
+    assert names(index, index.evaluate({"not": has_python})) == {"carla", "davi"}
+    assert names(index, index.evaluate({"and": [has_sql, {"not": has_python}]})) == {"carla"}
+
+
+def test_evaluate_separates_expired_certifications():
+    index, people = build_index()
+    aws = uuid4()
+    index._add_link(uuid4(), people["ana"], aws, OBTIDO, TODAY + timedelta(days=30), TODAY)
+    index._add_link(uuid4(), people["bruno"], aws, OBTIDO, TODAY - timedelta(days=1), TODAY)
+
+    assert names(index, index.evaluate({"knowledge_id": aws})) == {"ana"}
+    assert names(index, index.evaluate({"knowledge_id": aws, "status": VENCIDO})) == {"bruno"}
+    assert names(index, index.evaluate({"knowledge_id": aws, "status": OBTIDO.value})) == {"ana", "bruno"}
+
+
+def test_not_excludes_inactive_employees():
+    index, people = build_index()
+    index._set_employee(people["davi"], "davi", "INATIVO", None, None)
+
+    assert names(index, index.evaluate({"not": {"knowledge_id": uuid4()}})) == {"ana", "bruno", "carla"}
+
+
+def test_refresh_links_applies_updates_and_deletions():
+    index, people = build_index()
+    python, sql = uuid4(), uuid4()
+    moved, deleted = uuid4(), uuid4()
+    index._add_link(moved, people["ana"], python, OBTIDO, None, TODAY)
+    index._add_link(deleted, people["bruno"], python, OBTIDO, None, TODAY)
+
+    # O vínculo ``moved`` agora é de SQL; ``deleted`` não existe mais no banco
+    db = FakeSession([(moved, people["ana"], sql, OBTIDO, None)])
+    index._refresh_links(db, {str(moved), str(deleted)})
+
+    assert index.evaluate({"knowledge_id": python}) == 0
+    assert names(index, index.evaluate({"knowledge_id": sql})) == {"ana"}
+    assert deleted not in index.links
+
+
+def test_refresh_employees_drops_removed_employees():
+    index, people = build_index()
+    area = uuid4()
+    db = FakeSession([(people["ana"], "ana", "ATIVO", area, None)])
+    index._refresh_employees(db, {str(people["ana"]), str(people["bruno"])})
+
+    assert names(index, index.by_area[area]) == {"ana"}
+    assert not index.active & (1 << index.positions[people["bruno"]])